@@ -1,15 +1,171 @@
+import argparse
+import os
+import random
+import signal
+import socket
+import threading
 import time
-from dataclasses import dataclass
-from typing import Any
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, ClassVar, Iterator, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from feature_cache import FeatureCache, config_version
+from inference_scheduler import ModelRunner, get_scheduler
+from metrics import CONTENT_TYPE, DURATION_BUCKETS, MetricsRegistry
+from precheck import precheck
 
 SERVER_URL = "http://localhost:8000"
 
+# Keep-alive connections kept per host, enough for every worker thread plus the lease keeper
+HTTP_POOL_SIZE = 32
+
+
+def make_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """Create an HTTP session whose keep-alive connections are shared by all threads.
+
+    Args:
+        pool_size (int, optional): Maximum number of pooled connections per host.
+            Defaults to HTTP_POOL_SIZE.
+
+    Returns:
+        requests.Session: The pooled session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = make_session()
+
+# Worker-side counterparts of the server metrics, see `serve_metrics`
+metrics = MetricsRegistry()
+claimed_total = metrics.counter("si_worker_claimed_total", "Requests claimed by this worker.")
+completed_total = metrics.counter(
+    "si_worker_completed_total", "Results of this worker stored by the server."
+)
+failed_total = metrics.counter("si_worker_failed_total", "Evaluations of this worker that raised.")
+rejected_total = metrics.counter(
+    "si_worker_rejected_total", "Results not stored, by reason.", ("reason",)
+)
+result_posts_total = metrics.counter("si_worker_result_posts_total", "Result batches posted.")
+evaluation_time = metrics.histogram(
+    "si_worker_evaluation_seconds", "Time spent evaluating one pair.", DURATION_BUCKETS
+)
+in_flight = metrics.gauge("si_worker_in_flight", "Claimed requests not finished yet.")
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Expose the worker metrics at `http://<host>:<port>/metrics` from a background thread.
+
+    Args:
+        port (int): Port to listen on.
+        host (str, optional): Interface to listen on. Defaults to "0.0.0.0".
+
+    Returns:
+        ThreadingHTTPServer: The running server; call `shutdown()` to stop it.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # Scrapes are not worth a log line
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
 
 @dataclass
 class SemanticIntegrityTool:
-    """A tool for evaluating the integrity of images."""
+    """A tool for evaluating the integrity of images.
+
+    Tools split their work into an expensive per-image step, `extract` (captioning, embedding,
+    object detection...), and a cheap per-pair step, `compare`. The output of `extract` only
+    depends on the image content and the tool configuration, so it can be cached and reused for
+    every pair the image appears in. The dataclass fields of a tool are its configuration: they
+    must include everything that changes the output of `extract`, such as the model name and
+    version.
+    """
+
+    # Estimated seconds per pair, used to run cheap tools first. Not part of the configuration.
+    estimated_cost: ClassVar[float] = 1.0
+
+    @property
+    def name(self) -> str:
+        """Name of the tool, used as key in the tool details."""
+        return type(self).__name__
+
+    @property
+    def cache_namespace(self) -> str:
+        """Cache namespace, which changes whenever the tool configuration changes."""
+        return config_version(self.name, asdict(self))
+
+    def extract(self, image_path: str) -> Any:
+        """Compute the features of one image.
+
+        Args:
+            image_path (str): Path to the image.
+
+        Returns:
+            Any: The (picklable) features, e.g. a caption, an embedding or detections.
+        """
+        raise NotImplementedError
+
+    def compare(self, reference_features: Any, candidate_features: Any) -> dict[str, Any]:
+        """Compare the features of the reference and candidate images.
+
+        Args:
+            reference_features (Any): Output of `extract` for the reference image.
+            candidate_features (Any): Output of `extract` for the candidate image.
+
+        Returns:
+            dict[str, Any]: Tool details, with at least `prediction` (bool, True if the semantic
+                integrity is preserved) and `confidence` (float in [0, 1]).
+        """
+        raise NotImplementedError
+
+
+@dataclass
+class BatchedTool(SemanticIntegrityTool):
+    """A tool whose per-image model runs on micro-batches gathered from concurrent evaluations.
+
+    Subclasses provide the model through `make_runner`; `extract` hands each image to the
+    process-wide scheduler of that model, which is loaded once per process. Concurrent
+    evaluations (see `Worker`) therefore share batches.
+    """
+
+    max_batch_size: ClassVar[int] = 16
+    max_wait: ClassVar[float] = 0.01
+
+    def make_runner(self) -> ModelRunner:
+        """Create the model backend of this tool.
+
+        Returns:
+            ModelRunner: The runner, loaded by the scheduler on first use.
+        """
+        raise NotImplementedError
+
+    def extract(self, image_path: str) -> Any:
+        scheduler = get_scheduler(
+            self.cache_namespace, self.make_runner, self.max_batch_size, self.max_wait
+        )
+        return scheduler.predict(image_path)
 
 
 @dataclass
@@ -18,12 +174,93 @@ class SemanticIntegrityChecker:
 
     tools: list[SemanticIntegrityTool]
     aggregation_policy: str = "majority"
+    feature_cache: Optional[FeatureCache] = field(default=None, repr=False)
+    precheck: bool = True
+    max_hash_distance: Optional[int] = None
+
+    def features(self, tool: SemanticIntegrityTool, image_path: str) -> Any:
+        """Return the features of an image for a tool, from the cache if possible.
+
+        Args:
+            tool (SemanticIntegrityTool): The tool.
+            image_path (str): Path to the image.
+
+        Returns:
+            Any: Output of `tool.extract` for the image.
+        """
+        if self.feature_cache is None:
+            return tool.extract(image_path)
+        return self.feature_cache.get_or_compute(tool.cache_namespace, image_path, tool.extract)
+
+    def aggregate(self, tool_details: dict[str, dict[str, Any]]) -> bool:
+        """Combine the tool predictions according to `aggregation_policy`.
+
+        Args:
+            tool_details (dict[str, dict[str, Any]]): Details returned by each tool.
+
+        Returns:
+            bool: True if the semantic integrity is preserved. Skipped tools are ignored.
+
+        Raises:
+            ValueError: If the aggregation policy is unknown.
+        """
+        tool_details = {
+            name: details for name, details in tool_details.items() if not details.get("skipped")
+        }
+        predictions = [bool(details["prediction"]) for details in tool_details.values()]
+        if self.aggregation_policy == "majority":
+            return sum(predictions) > len(predictions) / 2
+        if self.aggregation_policy == "mean":
+            # Average probability of integrity, derived from each tool's confidence
+            scores = [
+                details["confidence"] if details["prediction"] else 1 - details["confidence"]
+                for details in tool_details.values()
+            ]
+            return sum(scores) / len(scores) >= 0.5
+        if self.aggregation_policy == "min":
+            return all(predictions)
+        if self.aggregation_policy == "max":
+            return any(predictions)
+        raise ValueError(f"Unknown aggregation policy '{self.aggregation_policy}'.")
+
+    def decided(self, predictions: list[bool], remaining: int) -> Optional[bool]:
+        """Check whether the decision is final, whatever the remaining tools predict.
+
+        Args:
+            predictions (list[bool]): Predictions of the tools run so far.
+            remaining (int): Number of tools not run yet.
+
+        Returns:
+            Optional[bool]: The final decision, or None if the remaining tools can still change
+                it. Always None for the 'mean' policy, whose outcome depends on confidences.
+        """
+        if remaining == 0:
+            return None
+        if self.aggregation_policy == "min" and not all(predictions):
+            return False
+        if self.aggregation_policy == "max" and any(predictions):
+            return True
+        if self.aggregation_policy == "majority":
+            total = len(predictions) + remaining
+            votes = sum(predictions)
+            if votes > total / 2:
+                return True
+            if votes + remaining <= total / 2:
+                return False
+        return None
 
     def evaluate(
         self, reference_image_path: str, candidate_image_path: str
     ) -> tuple[bool, dict[str, dict[str, Any]]]:
         """Evaluate Semantic Integrity.
 
+        Pairs whose candidate is an unmodified copy of the reference are decided by a cheap
+        pre-check. Otherwise the tools run from the cheapest to the most expensive, each
+        extracting the features of both images (through the feature cache, if any) and comparing
+        them. For the 'min', 'max' and 'majority' policies, the cascade stops as soon as the
+        remaining tools cannot change the decision; they are reported with `skipped: True`.
+        Without tools, a mock decision is returned.
+
         Args:
             reference_image_path (str): Reference image path
             candidate_image_path (str): Candidate image path.
@@ -32,6 +269,9 @@ class SemanticIntegrityChecker:
             tuple[bool, dict[str, dict[str, Any]]]: Tuple containing the overall prediction
                 and Tool details.
         """
+        if self.tools:
+            return self._run_cascade(reference_image_path, candidate_image_path)
+
         print(
             """Evaluating integrity with tools...
 Captioning reference_image_path...
@@ -57,17 +297,64 @@ Aggregating tool responses..."""
             },
         }
 
+    def _run_cascade(
+        self, reference_image_path: str, candidate_image_path: str
+    ) -> tuple[bool, dict[str, dict[str, Any]]]:
+        """Run the pre-check and the cost-ordered tools, see `evaluate`."""
+        tools = sorted(self.tools, key=lambda tool: tool.estimated_cost)
+        tool_details: dict[str, dict[str, Any]] = {}
 
-def retrieve_pending_pairs() -> list[tuple[str, str, str]]:
-    """Fetch the list of pending requests (candidate & reference).
+        if self.precheck:
+            decision = precheck(
+                reference_image_path,
+                candidate_image_path,
+                self.feature_cache,
+                self.max_hash_distance,
+            )
+            if decision is not None:
+                tool_details["PreCheck"] = decision
+                for tool in tools:
+                    tool_details[tool.name] = {"skipped": True, "reason": "precheck"}
+                return decision["prediction"], tool_details
 
-    Returns:
-        list[tuple[str, str, str]]: a list of tuples:
-            (candidate_image_path, reference_image_path, status)
+        predictions = []
+        for index, tool in enumerate(tools):
+            reference_features = self.features(tool, reference_image_path)
+            candidate_features = self.features(tool, candidate_image_path)
+            details = tool.compare(reference_features, candidate_features)
+            tool_details[tool.name] = details
+            predictions.append(bool(details["prediction"]))
+
+            decision = self.decided(predictions, len(tools) - index - 1)
+            if decision is not None:
+                for skipped in tools[index + 1 :]:
+                    tool_details[skipped.name] = {"skipped": True, "reason": "short_circuit"}
+                return decision, tool_details
+        return self.aggregate(tool_details), tool_details
+
+
+def retrieve_pending_pairs(page_size: int = 100) -> Iterator[dict[str, Any]]:
+    """Lazily fetch the pending requests (candidate & reference), one page at a time.
+
+    The next page is only requested once the current one has been consumed. Pages are linked by
+    a keyset cursor, so pairs marked processed while iterating do not shift later pages.
+
+    Args:
+        page_size (int, optional): Number of requests fetched per call. Defaults to 100.
+
+    Yields:
+        dict[str, Any]: a pending request with its `id`, `candidate_image_path`,
+            `reference_image_path` and `status`.
     """
-    response = requests.get(f"{SERVER_URL}/requests_pending_semantic_integrity")
-    response.raise_for_status()
-    return response.json()
+    url: Optional[str] = f"{SERVER_URL}/requests_pending_semantic_integrity"
+    params: Optional[dict[str, Any]] = {"status": "pending", "page_size": page_size}
+    while url:
+        response = session.get(url, params=params)
+        response.raise_for_status()
+        page = response.json()
+        yield from page["results"]
+        # The `next` link already carries every query parameter
+        url, params = page["next"], None
 
 
 def post_semantic_integrity_results(
@@ -75,6 +362,7 @@ def post_semantic_integrity_results(
     reference_img: str,
     overall_pred: bool,
     tool_details: dict[str, dict[str, Any]],
+    worker_id: Optional[str] = None,
 ) -> dict[str, Any]:
     """Post evaluation results back to the server to mark them processed.
 
@@ -84,6 +372,8 @@ def post_semantic_integrity_results(
         overall_pred (bool): Overall prediction.
         tool_details (dict[str, dict[str, Any]]): Detailed results from each tool mentioned in
             semantic integtity.
+        worker_id (Optional[str], optional): Worker holding the lease on the pair. Defaults to
+            None, which the server only accepts with ALLOW_UNLEASED_RESULTS=1.
 
     Returns:
         dict[str, Any]: Message and results after posting results.
@@ -94,44 +384,636 @@ def post_semantic_integrity_results(
         "reference_image_path": reference_img,
         "overall_prediction": overall_pred,
         "tool_details": tool_details,
+        "worker_id": worker_id,
     }
-    response = requests.post(endpoint, json=data)
+    response = session.post(endpoint, json=data)
     response.raise_for_status()
     return response.json()
 
 
-def main_loop(interval_seconds: int = 300) -> None:
-    """Main loop to keep checking for pending requests and post the results of semantic integrity.
+def post_semantic_integrity_results_batch(results: list[dict[str, Any]]) -> dict[str, Any]:
+    """Post many evaluation results in one request; the server applies them in one transaction.
 
     Args:
-        interval_seconds (int, optional): Interval seconds. Defaults to 300.
+        results (list[dict[str, Any]]): Results with the keys `candidate_image_path`,
+            `reference_image_path`, `overall_prediction`, `tool_details` and `worker_id`.
+
+    Returns:
+        dict[str, Any]: Number of processed, unknown and conflicting pairs, and the status of
+            each item.
     """
-    checker = SemanticIntegrityChecker(tools=[])
-    while True:
-        print("Checking for pending image pairs...")
+    response = session.post(
+        f"{SERVER_URL}/semantic_integrity_results/batch", json={"results": results}
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def wait_for_pending(timeout: float = 30) -> int:
+    """Long-poll the server until pending requests exist or `timeout` passes.
+
+    Args:
+        timeout (float, optional): Maximum number of seconds the server holds the request.
+            Defaults to 30.
+
+    Returns:
+        int: Number of pending requests, 0 if the wait timed out.
+    """
+    response = session.get(
+        f"{SERVER_URL}/requests_pending_semantic_integrity/wait",
+        params={"timeout": timeout},
+        # Leave the server time to answer before giving up on our side
+        timeout=timeout + 10,
+    )
+    response.raise_for_status()
+    return response.json()["pending"]
+
+
+def default_worker_id() -> str:
+    """Identify this worker process for lease ownership.
+
+    Returns:
+        str: `<hostname>-<pid>`.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def claim_pairs(worker_id: str, limit: int = 1, lease_seconds: float = 60) -> list[dict[str, Any]]:
+    """Atomically claim up to `limit` pending requests for this worker.
+
+    Args:
+        worker_id (str): Identifier of this worker.
+        limit (int, optional): Maximum number of requests to claim. Defaults to 1.
+        lease_seconds (float, optional): Lease duration. Defaults to 60.
+
+    Returns:
+        list[dict[str, Any]]: The claimed requests, now 'running' under this worker's lease.
+    """
+    response = session.post(
+        f"{SERVER_URL}/semantic_integrity_claims",
+        json={"worker_id": worker_id, "limit": limit, "lease_seconds": lease_seconds},
+    )
+    response.raise_for_status()
+    return response.json()["results"]
+
+
+def renew_leases(worker_id: str, ids: list[int], lease_seconds: float = 60) -> list[int]:
+    """Extend the leases held on `ids`.
+
+    Args:
+        worker_id (str): Identifier of this worker.
+        ids (list[int]): Ids of the claimed requests.
+        lease_seconds (float, optional): New lease duration. Defaults to 60.
+
+    Returns:
+        list[int]: The ids that are still held by this worker.
+    """
+    response = session.post(
+        f"{SERVER_URL}/semantic_integrity_claims/heartbeat",
+        json={"worker_id": worker_id, "ids": ids, "lease_seconds": lease_seconds},
+    )
+    response.raise_for_status()
+    return response.json()["renewed"]
+
+
+def mark_failed(request_id: int) -> dict[str, Any]:
+    """Move a claimed request to 'failed' after its evaluation raised.
+
+    Args:
+        request_id (int): Id of the claimed request.
+
+    Returns:
+        dict[str, Any]: The updated request.
+    """
+    response = session.patch(
+        f"{SERVER_URL}/semantic_integrity_status/{request_id}", json={"status": "failed"}
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+class Backoff:
+    """Exponential backoff with full jitter, reset after every success."""
+
+    def __init__(self, base: float = 0.5, cap: float = 60.0):
+        """Initialize the backoff.
+
+        Args:
+            base (float, optional): Delay after the first failure, in seconds. Defaults to 0.5.
+            cap (float, optional): Maximum delay, in seconds. Defaults to 60.
+        """
+        self.base = base
+        self.cap = cap
+        self.failures = 0
+
+    def next_delay(self) -> float:
+        """Register a failure and return how long to wait before retrying.
+
+        Returns:
+            float: Delay in seconds.
+        """
+        self.failures += 1
+        return random.uniform(0, min(self.cap, self.base * 2 ** (self.failures - 1)))
+
+    def reset(self) -> None:
+        """Register a success."""
+        self.failures = 0
+
+
+class ResultBuffer:
+    """Buffer evaluation results and post them in batches from a background thread.
+
+    A batch is sent as soon as `max_items` results are buffered or the oldest one has waited
+    `max_delay` seconds, whichever comes first. Failed posts are retried with backoff; after
+    `max_attempts` failures the batch is dropped, so that its leases expire and the requests are
+    requeued. `on_flushed(request_id, status)` is called for every result once its fate is known,
+    with the status reported by the server ('processed', 'not_found' or 'conflict') or 'error'.
+    """
+
+    def __init__(
+        self,
+        max_items: int = 50,
+        max_delay: float = 1.0,
+        max_attempts: int = 5,
+        on_flushed: Optional[Callable[[int, str], None]] = None,
+        worker_id: Optional[str] = None,
+    ):
+        """Start the flushing thread.
+
+        Args:
+            max_items (int, optional): Number of buffered results that triggers a flush; also the
+                maximum batch size. Defaults to 50.
+            max_delay (float, optional): Maximum number of seconds a result stays buffered.
+                Defaults to 1.0.
+            max_attempts (int, optional): Attempts per batch before it is dropped. Defaults to 5.
+            on_flushed (Optional[Callable[[int, str], None]], optional): Called with the request
+                id and the final status of every result. Defaults to None.
+            worker_id (Optional[str], optional): Worker holding the leases, sent with every
+                result. Defaults to None.
+        """
+        self.max_items = max(1, max_items)
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.on_flushed = on_flushed
+        self.worker_id = worker_id
+        self.requests_sent = 0
+        # Each item is (request_id, payload, time it was buffered)
+        self._items: list[tuple[int, dict[str, Any], float]] = []
+        self._condition = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="result-buffer", daemon=True)
+        self._thread.start()
+
+    def add(
+        self,
+        request_id: int,
+        candidate_img: str,
+        reference_img: str,
+        overall_pred: bool,
+        tool_details: dict[str, dict[str, Any]],
+    ) -> None:
+        """Buffer the result of one request.
+
+        Blocks while four full batches are already waiting, so that a slow server throttles
+        the evaluations instead of growing the buffer without bound.
+
+        Args:
+            request_id (int): Id of the claimed request.
+            candidate_img (str): Candidate image path.
+            reference_img (str): Reference image path
+            overall_pred (bool): Overall prediction.
+            tool_details (dict[str, dict[str, Any]]): Detailed results from each tool.
+
+        Raises:
+            RuntimeError: If the buffer has been closed.
+        """
+        payload = {
+            "candidate_image_path": candidate_img,
+            "reference_image_path": reference_img,
+            "overall_prediction": overall_pred,
+            "tool_details": tool_details,
+            "worker_id": self.worker_id,
+        }
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._items) < 4 * self.max_items or self._closing)
+            if self._closing:
+                raise RuntimeError("The result buffer is closed.")
+            self._items.append((request_id, payload, time.monotonic()))
+            # Wake the flusher to start the delay of a new batch, or to send a full one
+            if len(self._items) == 1 or len(self._items) >= self.max_items:
+                self._condition.notify_all()
+
+    def _take_batch(self) -> list[tuple[int, dict[str, Any], float]]:
+        """Wait until a batch is due and remove it from the buffer (empty once closed)."""
+        with self._condition:
+            while True:
+                if len(self._items) >= self.max_items or (self._closing and self._items):
+                    break
+                if self._closing:
+                    return []
+                if self._items:
+                    due = self._items[0][2] + self.max_delay - time.monotonic()
+                    if due <= 0:
+                        break
+                    self._condition.wait(due)
+                else:
+                    self._condition.wait()
+            batch = self._items[: self.max_items]
+            del self._items[: self.max_items]
+            self._condition.notify_all()
+            return batch
+
+    def _send(self, batch: list[tuple[int, dict[str, Any], float]]) -> list[str]:
+        """Post one batch, retrying with backoff.
+
+        Returns:
+            list[str]: The status of each item.
+        """
+        backoff = Backoff()
+        while True:
+            try:
+                response = post_semantic_integrity_results_batch([item[1] for item in batch])
+                self.requests_sent += 1
+                result_posts_total.inc()
+                return [item["status"] for item in response["results"]]
+            except requests.RequestException as ex:
+                if backoff.failures + 1 >= self.max_attempts:
+                    print(f"Dropping {len(batch)} results after {self.max_attempts} attempts:", ex)
+                    return ["error"] * len(batch)
+                print("Error posting results, retrying:", ex)
+                time.sleep(backoff.next_delay())
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            statuses = self._send(batch)
+            if self.on_flushed is not None:
+                for (request_id, _, _), status in zip(batch, statuses):
+                    self.on_flushed(request_id, status)
+
+    def close(self) -> None:
+        """Flush the remaining results and stop the background thread."""
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def __enter__(self) -> "ResultBuffer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class LeaseKeeper:
+    """Renew the leases of claimed requests in a background thread while they are evaluated."""
+
+    def __init__(self, worker_id: str, ids: list[int], lease_seconds: float = 60):
+        """Start tracking the leases on `ids`.
+
+        Args:
+            worker_id (str): Identifier of this worker.
+            ids (list[int]): Ids of the claimed requests.
+            lease_seconds (float, optional): Lease duration. Defaults to 60.
+        """
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._held = set(ids)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+
+    def add(self, ids: list[int]) -> None:
+        """Start renewing the leases of newly claimed requests.
+
+        Args:
+            ids (list[int]): Ids of the claimed requests.
+        """
+        with self._lock:
+            self._held.update(ids)
+
+    def holds(self, request_id: int) -> bool:
+        """Check whether the lease on `request_id` is still held.
+
+        Args:
+            request_id (int): Id of a claimed request.
+
+        Returns:
+            bool: False once the server reported the lease as lost.
+        """
+        with self._lock:
+            return request_id in self._held
+
+    def release(self, request_id: int) -> None:
+        """Stop renewing the lease of a finished request.
+
+        Args:
+            request_id (int): Id of a claimed request.
+        """
+        with self._lock:
+            self._held.discard(request_id)
+
+    def _run(self) -> None:
+        # Renew well before expiry so that one failed heartbeat is not fatal
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                ids = sorted(self._held)
+            if not ids:
+                continue
+            try:
+                renewed = set(renew_leases(self.worker_id, ids, self.lease_seconds))
+            except requests.RequestException as ex:
+                print("Error renewing leases:", ex)
+                continue
+            with self._lock:
+                self._held &= renewed | (self._held - set(ids))
+
+    def __enter__(self) -> "LeaseKeeper":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class Worker:
+    """Claim pending requests and evaluate them concurrently on a bounded pool.
+
+    The worker keeps at most `max_in_flight` claimed requests, claims only as many as it has
+    free slots, and keeps their leases alive until their results are posted. Results are
+    buffered and posted in batches. All HTTP calls share the pooled keep-alive `session`.
+    Errors are retried with exponential backoff. `stop()` stops claiming, lets the in-flight
+    evaluations finish and flushes their results.
+    """
+
+    def __init__(
+        self,
+        checker: "SemanticIntegrityChecker",
+        worker_id: Optional[str] = None,
+        concurrency: int = 4,
+        max_in_flight: Optional[int] = None,
+        lease_seconds: float = 60,
+        long_poll_seconds: float = 30,
+        interval_seconds: float = 300,
+        use_processes: bool = False,
+        result_batch_size: int = 50,
+        result_flush_seconds: float = 1.0,
+    ):
+        """Initialize the worker.
+
+        Args:
+            checker (SemanticIntegrityChecker): Checker evaluating each pair.
+            worker_id (Optional[str], optional): Identifier of this worker. Defaults to None
+                (`<hostname>-<pid>`).
+            concurrency (int, optional): Number of evaluations running in parallel. Defaults to 4.
+            max_in_flight (Optional[int], optional): Maximum number of claimed but unfinished
+                requests. Defaults to None (`concurrency`).
+            lease_seconds (float, optional): Lease duration of claimed requests. Defaults to 60.
+            long_poll_seconds (float, optional): Maximum duration of one long-poll.
+                Defaults to 30.
+            interval_seconds (float, optional): Polling interval if long-polling is unavailable.
+                Defaults to 300.
+            use_processes (bool, optional): Run evaluations in worker processes instead of
+                threads, for CPU-bound tools. `checker` must then be picklable. Defaults to False.
+            result_batch_size (int, optional): Number of results posted per batch. Defaults to 50.
+            result_flush_seconds (float, optional): Maximum number of seconds a result waits
+                before being posted. Defaults to 1.0.
+        """
+        self.checker = checker
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = concurrency
+        self.max_in_flight = max_in_flight or concurrency
+        self.lease_seconds = lease_seconds
+        self.long_poll_seconds = long_poll_seconds
+        self.interval_seconds = interval_seconds
+        self.use_processes = use_processes
+        self.result_batch_size = result_batch_size
+        self.result_flush_seconds = result_flush_seconds
+
+        self.processed = 0
+        self.failed = 0
+        self._in_flight = 0
+        self._slots = threading.Condition()
+        self._stop = threading.Event()
+        self._backoff = Backoff()
+        self._evaluator: Optional[Executor] = None
+
+    def stop(self) -> None:
+        """Stop claiming new requests; `run` returns once the in-flight ones are done."""
+        self._stop.set()
+        with self._slots:
+            self._slots.notify_all()
+
+    def _wait_for_free_slot(self) -> int:
+        """Block until at least one slot is free (or the worker stops).
+
+        Returns:
+            int: Number of free slots.
+        """
+        with self._slots:
+            self._slots.wait_for(
+                lambda: self._in_flight < self.max_in_flight or self._stop.is_set()
+            )
+            return self.max_in_flight - self._in_flight
+
+    def _finish(self, _future=None) -> None:
+        """Free the slot of a finished request."""
+        with self._slots:
+            self._in_flight -= 1
+            in_flight.inc(-1)
+            self._slots.notify_all()
+
+    def _sleep(self, seconds: float) -> None:
+        """Sleep, waking up early on `stop()`."""
+        self._stop.wait(seconds)
+
+    def _evaluate(self, reference_img: str, candidate_img: str) -> tuple:
+        """Evaluate one pair on the configured evaluator."""
+        if self._evaluator is None:
+            return self.checker.evaluate(reference_img, candidate_img)
+        return self._evaluator.submit(self.checker.evaluate, reference_img, candidate_img).result()
+
+    def _process(self, item: dict[str, Any], lease: LeaseKeeper, results: ResultBuffer) -> None:
+        """Evaluate one claimed request and buffer its result.
+
+        The lease is kept until the buffer has posted the result, see `_flushed`.
+        """
+        request_id = item["id"]
+        candidate_img = item["candidate_image_path"]
+        reference_img = item["reference_image_path"]
+        buffered = False
         try:
-            pending_list = retrieve_pending_pairs()
-            print(f"Found {len(pending_list)} pending pairs.")
-            for item in pending_list:
-                candidate_img = item["candidate_image_path"]
-                reference_img = item["reference_image_path"]
-                print(f"Evaluating: candidate={candidate_img}, reference={reference_img}")
-
-                # Evaluate the images
-                overall, tool_details = checker.evaluate(reference_img, candidate_img)
-
-                # Post the results
-                print(f"Posting results for candidate={candidate_img}, reference={reference_img}")
-                resp = post_semantic_integrity_results(
-                    candidate_img, reference_img, overall, tool_details
-                )
-                print("Server response:", resp)
+            if not lease.holds(request_id):
+                print(f"Lease lost for request {request_id}, skipping.")
+                return
+            print(f"Evaluating: candidate={candidate_img}, reference={reference_img}")
+            started = time.monotonic()
+            try:
+                overall, tool_details = self._evaluate(reference_img, candidate_img)
+            except Exception as ex:
+                print(f"Evaluation of request {request_id} failed:", ex)
+                self.failed += 1
+                failed_total.inc()
+                mark_failed(request_id)
+                return
+            finally:
+                evaluation_time.observe(time.monotonic() - started)
+            results.add(request_id, candidate_img, reference_img, overall, tool_details)
+            buffered = True
         except Exception as ex:
-            print("Error during processing:", ex)
+            print(f"Error processing request {request_id}:", ex)
+        finally:
+            if not buffered:
+                lease.release(request_id)
+
+    def _flushed(self, lease: LeaseKeeper, request_id: int, status: str) -> None:
+        """Release the lease of a request once its result has been posted."""
+        lease.release(request_id)
+        if status == "processed":
+            self.processed += 1
+            completed_total.inc()
+        else:
+            rejected_total.inc(reason=status)
+            print(f"Result of request {request_id} was not stored: {status}")
+
+    def _wait_for_work(self) -> None:
+        """Block until new work may be available: long-poll, falling back to polling."""
+        with self._slots:
+            busy = self._in_flight > 0
+        if busy:
+            # Some evaluations are still running, come back as soon as one finishes
+            with self._slots:
+                self._slots.wait(timeout=self.long_poll_seconds)
+            return
+        try:
+            wait_for_pending(self.long_poll_seconds)
+        except requests.RequestException as ex:
+            print("Long-polling unavailable:", ex)
+            print(f"Sleeping for {self.interval_seconds} seconds...\n")
+            self._sleep(self.interval_seconds)
+
+    def run(self) -> None:
+        """Claim and evaluate requests until `stop()` is called."""
+        print(f"Worker {self.worker_id} started with {self.concurrency} evaluators.")
+        if self.use_processes:
+            self._evaluator = ProcessPoolExecutor(max_workers=self.concurrency)
+        try:
+            # Exit order matters: drain the evaluations, flush their results, then stop the leases
+            with LeaseKeeper(self.worker_id, [], self.lease_seconds) as lease, ResultBuffer(
+                self.result_batch_size,
+                self.result_flush_seconds,
+                on_flushed=lambda request_id, status: self._flushed(lease, request_id, status),
+                worker_id=self.worker_id,
+            ) as results, ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix="si-worker"
+            ) as pool:
+                while not self._stop.is_set():
+                    free = self._wait_for_free_slot()
+                    if self._stop.is_set():
+                        break
+                    try:
+                        claimed = claim_pairs(self.worker_id, free, self.lease_seconds)
+                        self._backoff.reset()
+                    except requests.RequestException as ex:
+                        delay = self._backoff.next_delay()
+                        print(f"Error claiming requests, retrying in {delay:.1f}s:", ex)
+                        self._sleep(delay)
+                        continue
+
+                    if not claimed:
+                        self._wait_for_work()
+                        continue
+
+                    print(f"Claimed {len(claimed)} pending pairs.")
+                    lease.add([item["id"] for item in claimed])
+                    with self._slots:
+                        self._in_flight += len(claimed)
+                    claimed_total.inc(len(claimed))
+                    in_flight.inc(len(claimed))
+                    for item in claimed:
+                        pool.submit(self._process, item, lease, results).add_done_callback(
+                            self._finish
+                        )
+                print("Stopping: waiting for in-flight evaluations...")
+        finally:
+            if self._evaluator is not None:
+                self._evaluator.shutdown()
+                self._evaluator = None
+        print(f"Worker stopped: {self.processed} processed, {self.failed} failed.")
+
+
+def main_loop(
+    interval_seconds: int = 300,
+    worker_id: Optional[str] = None,
+    batch_size: int = 1,
+    lease_seconds: float = 60,
+    long_poll_seconds: float = 30,
+) -> None:
+    """Main loop to keep claiming pending requests and post the results of semantic integrity.
+
+    Requests are claimed under a lease, so several workers can poll the same server without
+    evaluating the same pair twice. When idle, the worker long-polls the server and resumes as
+    soon as new work is added. If long-polling fails, it falls back to sleeping
+    `interval_seconds` between polls.
+
+    Args:
+        interval_seconds (int, optional): Fallback polling interval. Defaults to 300.
+        worker_id (Optional[str], optional): Identifier of this worker. Defaults to None
+            (`<hostname>-<pid>`).
+        batch_size (int, optional): Number of requests evaluated concurrently. Defaults to 1.
+        lease_seconds (float, optional): Lease duration of claimed requests. Defaults to 60.
+        long_poll_seconds (float, optional): Maximum duration of one long-poll. Defaults to 30.
+    """
+    checker = SemanticIntegrityChecker(tools=[])
+    Worker(
+        checker,
+        worker_id=worker_id,
+        concurrency=batch_size,
+        lease_seconds=lease_seconds,
+        long_poll_seconds=long_poll_seconds,
+        interval_seconds=interval_seconds,
+    ).run()
+
+
+def main() -> None:
+    """Run a worker until SIGINT/SIGTERM, then finish the in-flight evaluations and exit."""
+    global SERVER_URL  # pylint: disable=global-statement
+
+    parser = argparse.ArgumentParser(description="Semantic integrity worker.")
+    parser.add_argument("--server-url", default=SERVER_URL)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    parser.add_argument("--lease-seconds", type=float, default=60)
+    parser.add_argument("--interval-seconds", type=float, default=60)
+    parser.add_argument("--processes", action="store_true", help="Evaluate in worker processes.")
+    parser.add_argument("--result-batch-size", type=int, default=50)
+    parser.add_argument("--result-flush-seconds", type=float, default=1.0)
+    parser.add_argument("--feature-cache-dir", default=None, help="Persist tool outputs here.")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve /metrics here.")
+    args = parser.parse_args()
+
+    SERVER_URL = args.server_url.rstrip("/")
 
-        print(f"Sleeping for {interval_seconds} seconds...\n")
-        time.sleep(interval_seconds)
+    checker = SemanticIntegrityChecker(tools=[], feature_cache=FeatureCache(args.feature_cache_dir))
+    worker = Worker(
+        checker,
+        concurrency=args.concurrency,
+        max_in_flight=args.max_in_flight,
+        lease_seconds=args.lease_seconds,
+        interval_seconds=args.interval_seconds,
+        use_processes=args.processes,
+        result_batch_size=args.result_batch_size,
+        result_flush_seconds=args.result_flush_seconds,
+    )
+    if args.metrics_port is not None:
+        serve_metrics(args.metrics_port)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop())
+    worker.run()
 
 
 if __name__ == "__main__":
-    main_loop(interval_seconds=60)
+    main()
@@ -0,0 +1,223 @@
+"""feature_cache.py: Cache per-image tool outputs (captions, embeddings, detections)."""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+# Bump when the on-disk format changes, invalidating every persisted entry
+CACHE_FORMAT_VERSION = 1
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    """Compute the SHA-256 digest of a file's content.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        str: Hex digest of the content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def config_version(name: str, config: dict[str, Any]) -> str:
+    """Derive the cache namespace of a tool from its name and configuration.
+
+    Any change to the configuration (model name, weights version, thresholds...) yields a new
+    namespace, so entries computed by an older model are never returned.
+
+    Args:
+        name (str): Name of the tool.
+        config (dict[str, Any]): JSON-serializable configuration that determines the output.
+
+    Returns:
+        str: Namespace of the form `<name>-<config hash>`.
+    """
+    payload = json.dumps(
+        {"format": CACHE_FORMAT_VERSION, "name": name, "config": config},
+        sort_keys=True,
+        default=str,
+    )
+    return f"{name}-{hashlib.sha256(payload.encode()).hexdigest()[:16]}"
+
+
+class FeatureCache:
+    """Two-tier cache of per-image features keyed by (tool namespace, image content hash).
+
+    Lookups hit an in-memory LRU first, then an optional directory of pickled entries shared
+    between processes and runs. Concurrent requests for the same missing entry wait for a single
+    computation, so expensive inference runs at most once per unique image and tool version.
+
+    The disk tier uses pickle and must only point to a directory written by trusted processes.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: int = 1024):
+        """Initialize the cache.
+
+        Args:
+            cache_dir (Optional[str], optional): Directory of the persistent tier.
+                Defaults to None (memory only).
+            max_entries (int, optional): Maximum number of entries kept in memory, and of image
+                digests remembered. Defaults to 1024.
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], Any] = OrderedDict()
+        self._in_flight: dict[tuple[str, str], Future] = {}
+        # Absolute path -> (mtime, size, digest), least recently used first
+        self._digests: OrderedDict[str, tuple[int, int, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def image_digest(self, path: str) -> str:
+        """Return the content hash of an image, rehashing only when the file changed.
+
+        Args:
+            path (str): Path to the image.
+
+        Returns:
+            str: Hex SHA-256 digest of the file content.
+        """
+        stat = os.stat(path)
+        path = os.path.abspath(path)
+        with self._lock:
+            known = self._digests.get(path)
+            if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+                self._digests.move_to_end(path)
+                return known[2]
+        digest = file_digest(path)
+        with self._lock:
+            self._digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+            self._digests.move_to_end(path)
+            while len(self._digests) > self.max_entries:
+                self._digests.popitem(last=False)
+        return digest
+
+    def get_or_compute(self, namespace: str, path: str, compute: Callable[[str], Any]) -> Any:
+        """Return the cached features of an image, computing them on a miss.
+
+        Args:
+            namespace (str): Tool namespace, see `config_version`.
+            path (str): Path to the image.
+            compute (Callable[[str], Any]): Computes the features from the image path. Its
+                result must be picklable when a cache directory is set.
+
+        Returns:
+            Any: The features.
+        """
+        key = (namespace, self.image_digest(path))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return self._entries[key]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+        if not owner:
+            return future.result()
+
+        try:
+            found, value = self._load(key)
+            if not found:
+                value = compute(path)
+                self._store(key, value)
+        except BaseException as ex:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(ex)
+            raise
+
+        with self._lock:
+            if found:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            del self._in_flight[key]
+        future.set_result(value)
+        return value
+
+    def _path(self, key: tuple[str, str]) -> str:
+        """Location of an entry in the persistent tier."""
+        namespace, digest = key
+        return os.path.join(self.cache_dir, namespace, digest[:2], f"{digest}.pkl")
+
+    def _load(self, key: tuple[str, str]) -> tuple[bool, Any]:
+        """Read an entry from the persistent tier.
+
+        Returns:
+            tuple[bool, Any]: Whether the entry exists, and its value.
+        """
+        if self.cache_dir is None:
+            return False, None
+        try:
+            with open(self._path(key), "rb") as f:
+                return True, pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        # A truncated or foreign pickle can fail in many ways; all of them are a miss
+        except (
+            pickle.UnpicklingError,
+            EOFError,
+            AttributeError,
+            ValueError,
+            ImportError,
+            IndexError,
+        ) as ex:
+            print(f"Ignoring corrupt cache entry {self._path(key)}:", ex)
+            return False, None
+
+    def _store(self, key: tuple[str, str], value: Any) -> None:
+        """Write an entry to the persistent tier atomically."""
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Worker processes get an empty memory tier and share the persistent one
+        return {"cache_dir": self.cache_dir, "max_entries": self.max_entries}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def stats(self) -> dict[str, int]:
+        """Report the cache effectiveness.
+
+        Returns:
+            dict[str, int]: Memory hits, disk hits, misses and entries held in memory.
+        """
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,263 @@
+"""inference_scheduler.py: Group per-image inference calls into micro-batches."""
+
+import argparse
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from metrics import Histogram
+
+
+class ModelRunner:
+    """Backend of a semantic integrity tool, running a model on batches of images.
+
+    A runner is created once per process (see `get_scheduler`), loads its model in `load` and
+    is then only called from the scheduler thread, so it does not need to be thread-safe.
+    """
+
+    def load(self) -> None:
+        """Load the model. Called once, before the first batch."""
+
+    def predict_batch(self, image_paths: list[str]) -> list[Any]:
+        """Run the model on a batch of images.
+
+        Args:
+            image_paths (list[str]): Paths to the images.
+
+        Returns:
+            list[Any]: One output per image, in the same order.
+        """
+        raise NotImplementedError
+
+
+class StubModelRunner(ModelRunner):
+    """Offline stand-in for a model: a fixed cost per batch plus a smaller cost per image.
+
+    The outputs are derived from the image path, so they are deterministic.
+    """
+
+    def __init__(self, batch_seconds: float = 0.05, item_seconds: float = 0.005):
+        """Initialize the stub.
+
+        Args:
+            batch_seconds (float, optional): Simulated fixed cost of one batch. Defaults to 0.05.
+            item_seconds (float, optional): Simulated cost of each image. Defaults to 0.005.
+        """
+        self.batch_seconds = batch_seconds
+        self.item_seconds = item_seconds
+        self.loads = 0
+        self.batches = 0
+
+    def load(self) -> None:
+        self.loads += 1
+
+    def predict_batch(self, image_paths: list[str]) -> list[Any]:
+        self.batches += 1
+        time.sleep(self.batch_seconds + self.item_seconds * len(image_paths))
+        return [hashlib.sha256(path.encode()).hexdigest()[:16] for path in image_paths]
+
+
+class MicroBatchScheduler:
+    """Collect images submitted by concurrent evaluations into micro-batches for one runner.
+
+    A batch is dispatched as soon as it holds `max_batch_size` images, or when the oldest image
+    has waited `max_wait` seconds. Each caller gets a `Future` resolved with its own output.
+    """
+
+    def __init__(self, runner: ModelRunner, max_batch_size: int = 16, max_wait: float = 0.01):
+        """Load the runner and start the dispatching thread.
+
+        Args:
+            runner (ModelRunner): The model backend.
+            max_batch_size (int, optional): Maximum number of images per batch. Defaults to 16.
+            max_wait (float, optional): Maximum number of seconds an image waits for others to
+                join its batch. Defaults to 0.01.
+        """
+        self.runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.batch_sizes = Histogram(
+            "si_inference_batch_size", "Images per micro-batch.", [1, 2, 4, 8, 16, 32, 64, 128]
+        )
+        self.queue_wait_seconds = Histogram(
+            "si_inference_queue_wait_seconds",
+            "Time images wait for their micro-batch.",
+            [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25],
+        )
+        # Each queued item is (image path, future, time it was submitted)
+        self._queue: deque[tuple[str, Future, float]] = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        runner.load()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image_path: str) -> Future:
+        """Queue one image for inference.
+
+        Args:
+            image_path (str): Path to the image.
+
+        Returns:
+            Future: Resolved with the runner output for this image.
+
+        Raises:
+            RuntimeError: If the scheduler has been closed.
+        """
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The scheduler is closed.")
+            self._queue.append((image_path, future, time.monotonic()))
+            self._condition.notify()
+        return future
+
+    def predict(self, image_path: str) -> Any:
+        """Run inference on one image, batched with concurrent calls.
+
+        Args:
+            image_path (str): Path to the image.
+
+        Returns:
+            Any: The runner output for this image.
+        """
+        return self.submit(image_path).result()
+
+    def _next_batch(self) -> list[tuple[str, Future, float]]:
+        """Wait until a batch is due and take it from the queue (empty once closed)."""
+        with self._condition:
+            while True:
+                if len(self._queue) >= self.max_batch_size or (self._closed and self._queue):
+                    break
+                if self._closed:
+                    return []
+                if self._queue:
+                    due = self._queue[0][2] + self.max_wait - time.monotonic()
+                    if due <= 0:
+                        break
+                    self._condition.wait(due)
+                else:
+                    self._condition.wait()
+            size = min(self.max_batch_size, len(self._queue))
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            started = time.monotonic()
+            self.batch_sizes.observe(len(batch))
+            for _, _, submitted in batch:
+                self.queue_wait_seconds.observe(started - submitted)
+            try:
+                outputs = self.runner.predict_batch([path for path, _, _ in batch])
+                if len(outputs) != len(batch):
+                    raise RuntimeError(
+                        f"Runner returned {len(outputs)} outputs for {len(batch)} images."
+                    )
+            except Exception as ex:  # pylint: disable=broad-except
+                for _, future, _ in batch:
+                    future.set_exception(ex)
+                continue
+            for (_, future, _), output in zip(batch, outputs):
+                future.set_result(output)
+
+    def close(self) -> None:
+        """Run the queued images, then stop the dispatching thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def stats(self) -> dict[str, Any]:
+        """Report the batch-size and queue-wait histograms.
+
+        Returns:
+            dict[str, Any]: The histograms, see `Histogram.snapshot`.
+        """
+        return {
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_seconds": self.queue_wait_seconds.snapshot(),
+        }
+
+
+_schedulers: dict[str, MicroBatchScheduler] = {}
+_schedulers_pid = os.getpid()
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(
+    name: str,
+    runner_factory: Callable[[], ModelRunner],
+    max_batch_size: int = 16,
+    max_wait: float = 0.01,
+) -> MicroBatchScheduler:
+    """Return the scheduler of a runner, creating it (and loading the model) once per process.
+
+    Args:
+        name (str): Key of the runner, e.g. the model name and version.
+        runner_factory (Callable[[], ModelRunner]): Creates the runner on first use.
+        max_batch_size (int, optional): See `MicroBatchScheduler`. Defaults to 16.
+        max_wait (float, optional): See `MicroBatchScheduler`. Defaults to 0.01.
+
+    Returns:
+        MicroBatchScheduler: The scheduler shared by all threads of this process.
+    """
+    global _schedulers_pid  # pylint: disable=global-statement
+    with _schedulers_lock:
+        if _schedulers_pid != os.getpid():
+            # Forked child: the scheduler threads of the parent do not exist here
+            _schedulers.clear()
+            _schedulers_pid = os.getpid()
+        scheduler = _schedulers.get(name)
+        if scheduler is None:
+            scheduler = MicroBatchScheduler(runner_factory(), max_batch_size, max_wait)
+            _schedulers[name] = scheduler
+        return scheduler
+
+
+def scheduler_stats() -> dict[str, dict[str, Any]]:
+    """Report the histograms of every scheduler of this process.
+
+    Returns:
+        dict[str, dict[str, Any]]: Statistics per runner name.
+    """
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {name: scheduler.stats() for name, scheduler in schedulers.items()}
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Compare unbatched and micro-batched inference on the stub model."""
+    parser = argparse.ArgumentParser(description="Micro-batching demo with a stub model.")
+    parser.add_argument("--images", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait", type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    paths = [f"image_{i}.jpg" for i in range(args.images)]
+    for max_batch_size in (1, args.max_batch_size):
+        scheduler = MicroBatchScheduler(StubModelRunner(), max_batch_size, args.max_wait)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(scheduler.predict, paths))
+        elapsed = time.perf_counter() - start
+        scheduler.close()
+        stats = scheduler.stats()
+        mean_batch = stats["batch_size"]["sum"] / stats["batch_size"]["count"]
+        mean_wait = stats["queue_wait_seconds"]["sum"] / stats["queue_wait_seconds"]["count"]
+        print(
+            f"max_batch_size={max_batch_size:3d}: {args.images / elapsed:8.1f} images/s, "
+            f"mean batch {mean_batch:5.1f}, mean queue wait {mean_wait * 1000:6.1f} ms"
+        )
+        print("  batch sizes:", stats["batch_size"]["buckets"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,912 @@
+"""job_store.py: SQLite storage for semantic integrity requests used by the mock server."""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from feature_cache import file_digest
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_PROCESSED = "processed"
+STATUS_FAILED = "failed"
+
+# Outcomes of a result that was not stored, see `JobStore.complete_many`
+RESULT_NOT_FOUND = "not_found"
+RESULT_CONFLICT = "conflict"
+
+# Priorities of the requests: higher values are claimed first
+PRIORITY_BULK = -10
+PRIORITY_NORMAL = 0
+PRIORITY_INTERACTIVE = 10
+
+# Owner of requests submitted without a user
+DEFAULT_USER = "anonymous"
+
+# Status machine documented in README_API_docs.md
+ALLOWED_TRANSITIONS = {
+    STATUS_PENDING: {STATUS_RUNNING},
+    STATUS_RUNNING: {STATUS_PROCESSED, STATUS_FAILED},
+}
+
+TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    candidate_image_path TEXT NOT NULL,
+    reference_image_path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    overall_prediction INTEGER,
+    tool_details TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    claimed_at REAL,
+    queued_at REAL,
+    candidate_digest TEXT,
+    reference_digest TEXT,
+    duplicate_of INTEGER,
+    user TEXT NOT NULL DEFAULT 'anonymous',
+    priority INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS user_shares (
+    user TEXT PRIMARY KEY,
+    weight REAL NOT NULL DEFAULT 1,
+    max_running INTEGER,
+    max_pending INTEGER,
+    pass REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS scheduler_state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+# Columns added after the first release, created on databases that predate them
+ADDED_COLUMNS = {
+    "lease_owner": "TEXT",
+    "lease_expires_at": "REAL",
+    "candidate_digest": "TEXT",
+    "reference_digest": "TEXT",
+    "duplicate_of": "INTEGER",
+    "claimed_at": "REAL",
+    "queued_at": "REAL",
+    "user": "TEXT NOT NULL DEFAULT 'anonymous'",
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+}
+
+INDEX_SCHEMA = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_pair
+    ON requests (candidate_image_path, reference_image_path);
+CREATE INDEX IF NOT EXISTS idx_requests_status ON requests (status, id);
+CREATE INDEX IF NOT EXISTS idx_requests_lease ON requests (status, lease_expires_at);
+CREATE INDEX IF NOT EXISTS idx_requests_digest
+    ON requests (candidate_digest, reference_digest, status);
+CREATE INDEX IF NOT EXISTS idx_requests_duplicate ON requests (duplicate_of);
+CREATE INDEX IF NOT EXISTS idx_requests_user_queue ON requests (user, status, priority DESC, id);
+"""
+
+# Result stored for pairs whose candidate has the same content as the reference
+IDENTICAL_CONTENT_DETAILS = {
+    "PreCheck": {"prediction": True, "confidence": 1.0, "method": "identical_content"}
+}
+
+
+def image_digest(path: str) -> Optional[str]:
+    """Compute the content digest of an image if it is accessible.
+
+    Args:
+        path (str): Path to the image.
+
+    Returns:
+        Optional[str]: Hex SHA-256 digest, or None if the file does not exist.
+    """
+    if not os.path.isfile(path):
+        return None
+    return file_digest(path)
+
+
+class InvalidTransitionError(ValueError):
+    """Raised when a status change is not allowed by the status machine."""
+
+
+class BackpressureError(RuntimeError):
+    """Raised when a user already has as many pending requests as allowed."""
+
+
+class JobStore:
+    """Store semantic integrity requests in SQLite (WAL mode).
+
+    Pairs are unique on (candidate, reference) and indexed by status, so lookups and status
+    updates are O(log n) and every change is a single transaction. Each thread gets its own
+    connection; SQLite serializes concurrent writers.
+
+    Claims serve the highest priority first. Within a priority, users share the workers in
+    proportion to their weight (start-time fair queuing): every claim advances the user's pass
+    by 1 / weight, and the user with the smallest pass is served next. A user who was idle
+    rejoins at the current virtual time instead of catching up on the service it did not use.
+    """
+
+    def __init__(self, db_path: str):
+        """Open (and create if needed) the database at `db_path`.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(TABLE_SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(requests)")}
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE requests ADD COLUMN {column} {column_type}")
+            conn.executescript(INDEX_SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO user_shares (user) SELECT DISTINCT user FROM requests"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the connection of the calling thread, opening it on first use.
+
+        Returns:
+            sqlite3.Connection: Connection to the job database.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def is_empty(self) -> bool:
+        """Check whether the store holds no request at all.
+
+        Returns:
+            bool: True if there are no requests.
+        """
+        return self._connect().execute("SELECT 1 FROM requests LIMIT 1").fetchone() is None
+
+    def add_pair(
+        self,
+        candidate_image_path: str,
+        reference_image_path: str,
+        candidate_digest: Optional[str] = None,
+        reference_digest: Optional[str] = None,
+        user: str = DEFAULT_USER,
+        priority: int = PRIORITY_NORMAL,
+    ) -> tuple[bool, str]:
+        """Add a pair unless it is already known, resolving content duplicates right away.
+
+        A pair whose candidate has the same content as its reference is stored as processed
+        (integrity preserved). A pair whose digests match an already processed pair reuses its
+        result. A pair whose digests match a pair still being evaluated is stored as pending
+        with `duplicate_of` set: it is never claimed and receives the result of that pair.
+
+        Args:
+            candidate_image_path (str): Candidate image path.
+            reference_image_path (str): Reference image path.
+            candidate_digest (Optional[str], optional): Content digest of the candidate image.
+                Defaults to None (unknown, only paths are compared).
+            reference_digest (Optional[str], optional): Content digest of the reference image.
+                Defaults to None.
+            user (str, optional): Owner of the request. Defaults to DEFAULT_USER.
+            priority (int, optional): Priority, e.g. PRIORITY_INTERACTIVE for single-image
+                verifications or PRIORITY_BULK for batch submissions. Defaults to PRIORITY_NORMAL.
+
+        Returns:
+            tuple[bool, str]: Whether the pair was added, and the current status of the pair.
+
+        Raises:
+            BackpressureError: If the user already has `max_pending` pending requests.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # A resubmission is answered before the quota check and leaves the pair untouched
+            existing = self._existing_status(conn, candidate_image_path, reference_image_path)
+            if existing is not None:
+                conn.commit()
+                return False, existing
+            share = conn.execute(
+                "SELECT max_pending FROM user_shares WHERE user = ?", (user,)
+            ).fetchone()
+            if share is not None and share["max_pending"] is not None:
+                pending = conn.execute(
+                    "SELECT COUNT(*) FROM requests WHERE user = ? AND status = ?",
+                    (user, STATUS_PENDING),
+                ).fetchone()[0]
+                if pending >= share["max_pending"]:
+                    raise BackpressureError(
+                        f"User '{user}' already has {pending} pending requests "
+                        f"(limit {share['max_pending']})."
+                    )
+            status = self._insert(
+                conn,
+                candidate_image_path,
+                reference_image_path,
+                STATUS_PENDING,
+                candidate_digest,
+                reference_digest,
+                time.time(),
+                user,
+                priority,
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return True, status
+
+    @staticmethod
+    def _existing_status(
+        conn: sqlite3.Connection, candidate_image_path: str, reference_image_path: str
+    ) -> Optional[str]:
+        """Return the status of an already stored pair, or None if the pair is new."""
+        row = conn.execute(
+            "SELECT status FROM requests "
+            "WHERE candidate_image_path = ? AND reference_image_path = ?",
+            (candidate_image_path, reference_image_path),
+        ).fetchone()
+        return row["status"] if row is not None else None
+
+    @staticmethod
+    def _insert(
+        conn: sqlite3.Connection,
+        candidate_image_path: str,
+        reference_image_path: str,
+        status: str,
+        candidate_digest: Optional[str],
+        reference_digest: Optional[str],
+        now: float,
+        user: str = DEFAULT_USER,
+        priority: int = PRIORITY_NORMAL,
+    ) -> Optional[str]:
+        """Insert a pair inside the caller's transaction, resolving content duplicates.
+
+        An already stored pair is left untouched: neither its primary's priority nor the
+        fair-share pass of `user` change.
+
+        Returns:
+            Optional[str]: The status of the new pair, or None if the pair already existed.
+        """
+        if JobStore._existing_status(conn, candidate_image_path, reference_image_path) is not None:
+            return None
+        prediction, details, duplicate_of = None, None, None
+        if status == STATUS_PENDING:
+            identical = candidate_image_path == reference_image_path or (
+                candidate_digest is not None and candidate_digest == reference_digest
+            )
+            if identical:
+                status, prediction = STATUS_PROCESSED, 1
+                details = json.dumps(IDENTICAL_CONTENT_DETAILS)
+            elif candidate_digest is not None and reference_digest is not None:
+                processed = conn.execute(
+                    "SELECT id, overall_prediction, tool_details FROM requests "
+                    "WHERE candidate_digest = ? AND reference_digest = ? AND status = ? "
+                    "ORDER BY id LIMIT 1",
+                    (candidate_digest, reference_digest, STATUS_PROCESSED),
+                ).fetchone()
+                if processed is not None:
+                    status, duplicate_of = STATUS_PROCESSED, processed["id"]
+                    prediction, details = processed["overall_prediction"], processed["tool_details"]
+                else:
+                    # Wait for the pair that is evaluated already, if any
+                    primary = conn.execute(
+                        "SELECT id FROM requests WHERE candidate_digest = ? "
+                        "AND reference_digest = ? AND status IN (?, ?) AND duplicate_of IS NULL "
+                        "AND NOT (candidate_image_path = ? AND reference_image_path = ?) "
+                        "ORDER BY id LIMIT 1",
+                        (
+                            candidate_digest,
+                            reference_digest,
+                            STATUS_PENDING,
+                            STATUS_RUNNING,
+                            candidate_image_path,
+                            reference_image_path,
+                        ),
+                    ).fetchone()
+                    if primary is not None:
+                        duplicate_of = primary["id"]
+                        # The waiting pair must not be delayed by a lower priority primary
+                        conn.execute(
+                            "UPDATE requests SET priority = MAX(priority, ?) WHERE id = ?",
+                            (priority, duplicate_of),
+                        )
+
+        if status == STATUS_PENDING and duplicate_of is None:
+            JobStore._activate_user(conn, user)
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO requests (candidate_image_path, reference_image_path, status, "
+            "overall_prediction, tool_details, created_at, updated_at, queued_at, "
+            "candidate_digest, reference_digest, duplicate_of, user, priority) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                candidate_image_path,
+                reference_image_path,
+                status,
+                prediction,
+                details,
+                now,
+                now,
+                now,
+                candidate_digest,
+                reference_digest,
+                duplicate_of,
+                user,
+                priority,
+            ),
+        )
+        return status if cursor.rowcount else None
+
+    @staticmethod
+    def _activate_user(conn: sqlite3.Connection, user: str) -> None:
+        """Register a user and, if it had no claimable request, move its pass to the current
+        virtual time so that idle periods do not accumulate credit."""
+        conn.execute("INSERT OR IGNORE INTO user_shares (user) VALUES (?)", (user,))
+        idle = (
+            conn.execute(
+                "SELECT 1 FROM requests WHERE user = ? AND status = ? AND duplicate_of IS NULL "
+                "LIMIT 1",
+                (user, STATUS_PENDING),
+            ).fetchone()
+            is None
+        )
+        if idle:
+            conn.execute(
+                "UPDATE user_shares SET pass = MAX(pass, COALESCE((SELECT value FROM "
+                "scheduler_state WHERE key = 'virtual_time'), 0)) WHERE user = ?",
+                (user,),
+            )
+
+    @staticmethod
+    def _resolve_duplicates(conn: sqlite3.Connection, primary_id: int, now: float) -> int:
+        """Give the pending duplicates of a finished pair its status and result.
+
+        Returns:
+            int: Number of resolved duplicates.
+        """
+        cursor = conn.execute(
+            "UPDATE requests SET (status, overall_prediction, tool_details) = "
+            "(SELECT status, overall_prediction, tool_details FROM requests WHERE id = ?), "
+            "updated_at = ? WHERE duplicate_of = ? AND status = ?",
+            (primary_id, now, primary_id, STATUS_PENDING),
+        )
+        return cursor.rowcount
+
+    @staticmethod
+    def _promote_duplicate(conn: sqlite3.Connection, primary_id: int) -> None:
+        """Make the oldest pending duplicate of a failed pair claimable, in its place."""
+        row = conn.execute(
+            "SELECT id FROM requests WHERE duplicate_of = ? AND status = ? ORDER BY id LIMIT 1",
+            (primary_id, STATUS_PENDING),
+        ).fetchone()
+        if row is None:
+            return
+        conn.execute("UPDATE requests SET duplicate_of = NULL WHERE id = ?", (row["id"],))
+        conn.execute(
+            "UPDATE requests SET duplicate_of = ? WHERE duplicate_of = ? AND status = ?",
+            (row["id"], primary_id, STATUS_PENDING),
+        )
+
+    def count(self, status: Optional[str] = None) -> int:
+        """Count the requests, optionally only those having the given status.
+
+        Args:
+            status (Optional[str], optional): Status to filter on. Defaults to None (all).
+
+        Returns:
+            int: Number of matching requests.
+        """
+        if status is None:
+            return self._connect().execute("SELECT COUNT(*) FROM requests").fetchone()[0]
+        return (
+            self._connect()
+            .execute("SELECT COUNT(*) FROM requests WHERE status = ?", (status.lower(),))
+            .fetchone()[0]
+        )
+
+    def count_by_status(self) -> dict[str, int]:
+        """Count the requests of every status.
+
+        Returns:
+            dict[str, int]: Number of requests per status.
+        """
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM requests GROUP BY status")
+        return {row[0]: row[1] for row in rows}
+
+    def oldest_pending_created_at(self) -> Optional[float]:
+        """Return when the oldest claimable request was added.
+
+        Returns:
+            Optional[float]: Its creation timestamp, or None if nothing is pending.
+        """
+        return (
+            self._connect()
+            .execute(
+                "SELECT MIN(created_at) FROM requests WHERE status = ? AND duplicate_of IS NULL",
+                (STATUS_PENDING,),
+            )
+            .fetchone()[0]
+        )
+
+    def count_claimable(self) -> int:
+        """Count the pending requests workers can claim, i.e. excluding waiting duplicates.
+
+        Returns:
+            int: Number of claimable requests.
+        """
+        return (
+            self._connect()
+            .execute(
+                "SELECT COUNT(*) FROM requests WHERE status = ? AND duplicate_of IS NULL",
+                (STATUS_PENDING,),
+            )
+            .fetchone()[0]
+        )
+
+    def page(
+        self,
+        status: Optional[str] = None,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        offset: int = 0,
+    ) -> tuple[list[dict[str, Any]], bool, bool]:
+        """Return one page of requests in id order using keyset pagination.
+
+        With `after_id` the page starts right after that id, with `before_id` it ends right
+        before it. Both walk the (status, id) index, so deep pages cost the same as the first one.
+        `offset` is only meant for clients using page numbers.
+
+        Args:
+            status (Optional[str], optional): Status to filter on. Defaults to None (all).
+            limit (int, optional): Maximum number of requests per page. Defaults to 100.
+            after_id (Optional[int], optional): Return requests with a larger id. Defaults to None.
+            before_id (Optional[int], optional): Return requests with a smaller id.
+                Defaults to None.
+            offset (int, optional): Number of requests to skip. Defaults to 0.
+
+        Returns:
+            tuple[list[dict[str, Any]], bool, bool]: The requests of the page, whether a next
+                page exists and whether a previous page exists.
+        """
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status.lower())
+
+        backwards = before_id is not None and after_id is None
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+        elif backwards:
+            conditions.append("id < ?")
+            params.append(before_id)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "DESC" if backwards else "ASC"
+        # Fetch one extra row to learn whether there is more in the walking direction
+        rows = self._connect().execute(
+            f"SELECT * FROM requests {where} ORDER BY id {order} LIMIT ? OFFSET ?",
+            (*params, limit + 1, offset),
+        )
+        records = [self._to_dict(row) for row in rows]
+        has_more = len(records) > limit
+        records = records[:limit]
+
+        if backwards:
+            records.reverse()
+            return records, True, has_more
+        return records, has_more, after_id is not None or offset > 0
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict[str, Any]:
+        """Convert a database row into a plain request dictionary.
+
+        Args:
+            row (sqlite3.Row): Row of the requests table.
+
+        Returns:
+            dict[str, Any]: The request, with the stored result decoded.
+        """
+        record = dict(row)
+        if record["overall_prediction"] is not None:
+            record["overall_prediction"] = bool(record["overall_prediction"])
+        if record["tool_details"] is not None:
+            record["tool_details"] = json.loads(record["tool_details"])
+        return record
+
+    def complete(
+        self,
+        candidate_image_path: str,
+        reference_image_path: str,
+        overall_prediction: bool,
+        tool_details: dict[str, Any],
+        worker_id: Optional[str] = None,
+        allow_unleased: bool = False,
+    ) -> bool:
+        """Store the result of a pair leased by `worker_id` and mark it processed.
+
+        Args:
+            candidate_image_path (str): Candidate image path.
+            reference_image_path (str): Reference image path.
+            overall_prediction (bool): Overall prediction.
+            tool_details (dict[str, Any]): Detailed results from each tool.
+            worker_id (Optional[str], optional): Worker holding the lease. Defaults to None.
+            allow_unleased (bool, optional): Accept a result without `worker_id` for a pending or
+                running pair, see `complete_many`. Defaults to False.
+
+        Returns:
+            bool: True if the pair was updated, False if it was not found or not leased by
+                `worker_id`.
+        """
+        result = {
+            "candidate_image_path": candidate_image_path,
+            "reference_image_path": reference_image_path,
+            "overall_prediction": overall_prediction,
+            "tool_details": tool_details,
+            "worker_id": worker_id,
+        }
+        return self.complete_many([result], allow_unleased)[0][0] == STATUS_PROCESSED
+
+    def complete_many(
+        self, results: list[dict[str, Any]], allow_unleased: bool = False
+    ) -> list[tuple[str, Optional[dict[str, Any]]]]:
+        """Store many results in a single transaction and mark their pairs processed.
+
+        All updates are committed together, so a batch costs one write to the database instead
+        of one per result. A result is only stored if its pair is running under a lease held by
+        the `worker_id` of the result. Expired leases are requeued first, so a worker that lost
+        its lease cannot overwrite the pair once another worker has claimed it. Results without
+        a `worker_id` are rejected unless `allow_unleased` is set; they are then accepted for any
+        pending or running pair, like before leases existed.
+
+        Args:
+            results (list[dict[str, Any]]): Results with the keys `candidate_image_path`,
+                `reference_image_path`, `overall_prediction`, `tool_details` and `worker_id`.
+            allow_unleased (bool, optional): Accept results without `worker_id`.
+                Defaults to False.
+
+        Returns:
+            list[tuple[str, Optional[dict[str, Any]]]]: For each result, its outcome and a
+                request: STATUS_PROCESSED with the request as it was before being completed
+                (e.g. with its lease owner and claim time), RESULT_CONFLICT with the request as
+                it is (another worker holds it, or it is no longer running), or
+                RESULT_NOT_FOUND with None.
+        """
+        now = time.time()
+        outcomes: list[tuple[str, Optional[dict[str, Any]]]] = []
+        with self._connect() as conn:
+            self._requeue_expired(conn, now)
+            for result in results:
+                row = conn.execute(
+                    "SELECT * FROM requests "
+                    "WHERE candidate_image_path = ? AND reference_image_path = ?",
+                    (result["candidate_image_path"], result["reference_image_path"]),
+                ).fetchone()
+                if row is None:
+                    outcomes.append((RESULT_NOT_FOUND, None))
+                    continue
+                worker_id = result.get("worker_id")
+                if worker_id is not None:
+                    accepted = row["status"] == STATUS_RUNNING and row["lease_owner"] == worker_id
+                else:
+                    accepted = allow_unleased and row["status"] in (STATUS_PENDING, STATUS_RUNNING)
+                if not accepted:
+                    outcomes.append((RESULT_CONFLICT, self._to_dict(row)))
+                    continue
+                outcomes.append((STATUS_PROCESSED, self._to_dict(row)))
+                conn.execute(
+                    "UPDATE requests SET status = ?, overall_prediction = ?, tool_details = ?, "
+                    "updated_at = ?, lease_owner = NULL, lease_expires_at = NULL WHERE id = ?",
+                    (
+                        STATUS_PROCESSED,
+                        int(result["overall_prediction"]),
+                        json.dumps(result["tool_details"]),
+                        now,
+                        row["id"],
+                    ),
+                )
+                self._resolve_duplicates(conn, row["id"], now)
+        return outcomes
+
+    def requeue_expired(self, now: Optional[float] = None) -> int:
+        """Move running requests whose lease has expired back to pending.
+
+        Args:
+            now (Optional[float], optional): Current time. Defaults to None (`time.time()`).
+
+        Returns:
+            int: Number of requeued requests.
+        """
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            return self._requeue_expired(conn, now)
+
+    @staticmethod
+    def _requeue_expired(conn: sqlite3.Connection, now: float) -> int:
+        """Requeue expired leases inside the caller's transaction.
+
+        `queued_at` restarts, so that the next claim measures only the time spent waiting again.
+        """
+        cursor = conn.execute(
+            "UPDATE requests SET status = ?, lease_owner = NULL, lease_expires_at = NULL, "
+            "updated_at = ?, queued_at = ? WHERE status = ? AND lease_expires_at < ?",
+            (STATUS_PENDING, now, now, STATUS_RUNNING, now),
+        )
+        return cursor.rowcount
+
+    def claim(self, worker_id: str, limit: int, lease_seconds: float) -> list[dict[str, Any]]:
+        """Atomically move up to `limit` pending requests to running under a lease.
+
+        Expired leases are requeued first. Requests are then picked by priority and weighted
+        fair queuing across users, skipping users that already have `max_running` requests
+        running. The selection and the update run in one write transaction, so two workers can
+        never claim the same request.
+
+        Args:
+            worker_id (str): Identifier of the claiming worker.
+            limit (int): Maximum number of requests to claim.
+            lease_seconds (float): Lease duration; the worker must heartbeat before it expires.
+
+        Returns:
+            list[dict[str, Any]]: The claimed requests, in the order they were picked.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._requeue_expired(conn, now)
+            ids = self._pick_fair(conn, limit)
+            placeholders = ",".join("?" * len(ids))
+            conn.execute(
+                "UPDATE requests SET status = ?, lease_owner = ?, lease_expires_at = ?, "
+                f"updated_at = ?, claimed_at = ? WHERE id IN ({placeholders})",
+                (STATUS_RUNNING, worker_id, now + lease_seconds, now, now, *ids),
+            )
+            rows = {
+                row["id"]: row
+                for row in conn.execute(f"SELECT * FROM requests WHERE id IN ({placeholders})", ids)
+            }
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return [self._to_dict(rows[request_id]) for request_id in ids]
+
+    @staticmethod
+    def _pick_fair(conn: sqlite3.Connection, limit: int) -> list[int]:
+        """Pick up to `limit` claimable requests inside the caller's write transaction.
+
+        Each round serves the user whose next request has the highest priority, breaking ties
+        by the smallest pass, and advances that user's pass by 1 / weight. Only users with
+        claimable requests are read, and at most `limit` requests per user, through the
+        (user, status, priority, id) index. Only the pass of the users served is written back.
+
+        Returns:
+            list[int]: Ids of the picked requests.
+        """
+        shares = {
+            row["user"]: dict(row)
+            for row in conn.execute(
+                "SELECT * FROM user_shares WHERE EXISTS (SELECT 1 FROM requests "
+                "WHERE requests.user = user_shares.user AND status = ? AND duplicate_of IS NULL)",
+                (STATUS_PENDING,),
+            )
+        }
+        # Head of each user's queue as (priority, id), in claim order
+        queues: dict[str, list[tuple[int, int]]] = {}
+        budgets: dict[str, int] = {}
+        for user, share in shares.items():
+            user_queue = [
+                (row["priority"], row["id"])
+                for row in conn.execute(
+                    "SELECT priority, id FROM requests WHERE user = ? AND status = ? "
+                    "AND duplicate_of IS NULL ORDER BY priority DESC, id LIMIT ?",
+                    (user, STATUS_PENDING, limit),
+                )
+            ]
+            if not user_queue:
+                continue
+            budget = limit
+            if share["max_running"] is not None:
+                running = conn.execute(
+                    "SELECT COUNT(*) FROM requests WHERE user = ? AND status = ?",
+                    (user, STATUS_RUNNING),
+                ).fetchone()[0]
+                budget = share["max_running"] - running
+            if budget > 0:
+                queues[user], budgets[user] = user_queue, budget
+
+        picked, served, virtual_time = [], set(), None
+        while len(picked) < limit and queues:
+            user = min(queues, key=lambda u: (-queues[u][0][0], shares[u]["pass"], queues[u][0][1]))
+            picked.append(queues[user].pop(0)[1])
+            served.add(user)
+            virtual_time = shares[user]["pass"]
+            shares[user]["pass"] += 1 / shares[user]["weight"]
+            budgets[user] -= 1
+            if not queues[user] or budgets[user] == 0:
+                del queues[user]
+
+        if picked:
+            conn.executemany(
+                "UPDATE user_shares SET pass = ? WHERE user = ?",
+                [(shares[user]["pass"], user) for user in served],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO scheduler_state (key, value) VALUES ('virtual_time', ?)",
+                (virtual_time,),
+            )
+        return picked
+
+    def set_user_share(
+        self,
+        user: str,
+        weight: float = 1.0,
+        max_running: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ) -> dict[str, Any]:
+        """Configure the share and the backpressure limits of a user.
+
+        Args:
+            user (str): The user.
+            weight (float, optional): Relative share of the workers. Defaults to 1.0.
+            max_running (Optional[int], optional): Maximum number of running requests.
+                Defaults to None (unlimited).
+            max_pending (Optional[int], optional): Maximum number of pending requests; further
+                submissions raise `BackpressureError`. Defaults to None (unlimited).
+
+        Returns:
+            dict[str, Any]: The stored configuration.
+
+        Raises:
+            ValueError: If the weight is not positive.
+        """
+        if weight <= 0:
+            raise ValueError("The weight of a user must be positive.")
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO user_shares (user) VALUES (?)", (user,))
+            conn.execute(
+                "UPDATE user_shares SET weight = ?, max_running = ?, max_pending = ? "
+                "WHERE user = ?",
+                (weight, max_running, max_pending, user),
+            )
+            row = conn.execute("SELECT * FROM user_shares WHERE user = ?", (user,)).fetchone()
+        return dict(row)
+
+    def heartbeat(self, worker_id: str, ids: list[int], lease_seconds: float) -> list[int]:
+        """Extend the leases that `worker_id` still holds on `ids`.
+
+        Args:
+            worker_id (str): Identifier of the worker holding the leases.
+            ids (list[int]): Ids of the claimed requests.
+            lease_seconds (float): New lease duration, counted from now.
+
+        Returns:
+            list[int]: Ids whose lease was renewed. Missing ids were requeued or completed.
+        """
+        if not ids:
+            return []
+        now = time.time()
+        placeholders = ",".join("?" * len(ids))
+        with self._connect() as conn:
+            # An expired lease cannot be renewed, the request goes back to the queue instead
+            self._requeue_expired(conn, now)
+            conn.execute(
+                "UPDATE requests SET lease_expires_at = ?, updated_at = ? "
+                f"WHERE id IN ({placeholders}) AND status = ? AND lease_owner = ?",
+                (now + lease_seconds, now, *ids, STATUS_RUNNING, worker_id),
+            )
+            rows = conn.execute(
+                f"SELECT id FROM requests WHERE id IN ({placeholders}) AND status = ? "
+                "AND lease_owner = ? ORDER BY id",
+                (*ids, STATUS_RUNNING, worker_id),
+            )
+            return [row[0] for row in rows]
+
+    def set_status(self, request_id: int, status: str) -> dict[str, Any]:
+        """Change the status of a request, enforcing the allowed transitions.
+
+        Args:
+            request_id (int): Id of the request.
+            status (str): New status.
+
+        Returns:
+            dict[str, Any]: The updated request.
+
+        Raises:
+            KeyError: If no request has this id.
+            InvalidTransitionError: If the transition is not allowed.
+        """
+        status = status.lower()
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM requests WHERE id = ?", (request_id,)).fetchone()
+            if row is None:
+                raise KeyError(request_id)
+            if status not in ALLOWED_TRANSITIONS.get(row["status"], set()):
+                raise InvalidTransitionError(
+                    f"Transition '{row['status']}' -> '{status}' is not allowed."
+                )
+            # Guard on the old status so that a concurrent change cannot be overwritten
+            cursor = conn.execute(
+                "UPDATE requests SET status = ?, updated_at = ?, lease_owner = NULL, "
+                "lease_expires_at = NULL WHERE id = ? AND status = ?",
+                (status, now, request_id, row["status"]),
+            )
+            if cursor.rowcount != 1:
+                raise InvalidTransitionError(f"Request {request_id} changed concurrently.")
+            if status == STATUS_PROCESSED:
+                self._resolve_duplicates(conn, request_id, now)
+            elif status == STATUS_FAILED:
+                self._promote_duplicate(conn, request_id)
+            updated = conn.execute("SELECT * FROM requests WHERE id = ?", (request_id,)).fetchone()
+        return self._to_dict(updated)
+
+    def import_text_file(
+        self, path: str, digest: Optional[Callable[[str], Optional[str]]] = None
+    ) -> int:
+        """Import requests from the legacy text file in a single transaction.
+
+        Lines have the form `candidate_image_path, reference_image_path, status`. Pairs that are
+        already stored are left untouched. Pending pairs are deduplicated by content like in
+        `add_pair`.
+
+        Args:
+            path (str): Path to the text file, e.g. 'pending_requests.txt'.
+            digest (Optional[Callable[[str], Optional[str]]], optional): Computes the content
+                digest of an image path. Defaults to None (only paths are compared).
+
+        Returns:
+            int: Number of imported pairs.
+        """
+        records = []
+        with open(path, "r") as f:
+            for line in f:
+                parts = [p.strip() for p in line.split(",")]
+                if len(parts) == 3:
+                    records.append(tuple(parts))
+
+        now = time.time()
+        imported = 0
+        with self._connect() as conn:
+            for candidate, reference, status in records:
+                candidate_digest = digest(candidate) if digest is not None else None
+                reference_digest = digest(reference) if digest is not None else None
+                status = self._insert(
+                    conn,
+                    candidate,
+                    reference,
+                    status.lower(),
+                    candidate_digest,
+                    reference_digest,
+                    now,
+                )
+                imported += status is not None
+        return imported
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Import a legacy `pending_requests.txt` into a job database."""
+    parser = argparse.ArgumentParser(description="Import pending requests into SQLite.")
+    parser.add_argument("text_file", help="Legacy file, e.g. pending_requests.txt")
+    parser.add_argument("--db", default="pending_requests.db", help="Target SQLite database")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.text_file):
+        parser.error(f"File not found: {args.text_file}")
+
+    imported = JobStore(args.db).import_text_file(args.text_file, digest=image_digest)
+    print(f"Imported {imported} requests from {args.text_file} into {args.db}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+"""load_test.py: Drive a local mock server with synthetic requests and stub workers."""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, ClassVar, Optional
+
+import requests
+
+import client_mock
+from client_mock import SemanticIntegrityChecker, SemanticIntegrityTool, Worker
+from job_store import STATUS_FAILED, STATUS_PROCESSED, JobStore
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HOST = "127.0.0.1"
+
+
+@dataclass
+class StubTool(SemanticIntegrityTool):
+    """Tool that sleeps instead of running a model and never reads the images."""
+
+    extract_seconds: float = 0.01
+    failure_rate: float = 0.0
+
+    estimated_cost: ClassVar[float] = 0.0
+
+    def extract(self, image_path: str) -> Any:
+        time.sleep(self.extract_seconds)
+        if random.random() < self.failure_rate:
+            raise RuntimeError(f"Injected failure on {image_path}.")
+        return hashlib.sha256(image_path.encode()).hexdigest()
+
+    def compare(self, reference_features: Any, candidate_features: Any) -> dict[str, Any]:
+        return {"prediction": reference_features != candidate_features, "confidence": 1.0}
+
+
+def percentiles(values: list[float]) -> dict[str, Optional[float]]:
+    """Summarize a distribution with nearest-rank percentiles.
+
+    Args:
+        values (list[float]): The samples.
+
+    Returns:
+        dict[str, Optional[float]]: `p50`, `p95`, `p99`, `mean` and `max`, None without samples.
+    """
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[max(0, int(q * len(ordered) + 0.5) - 1)]
+
+    return {
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "mean": sum(ordered) / len(ordered),
+        "max": ordered[-1],
+    }
+
+
+def free_port() -> int:
+    """Ask the OS for an unused localhost port."""
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+class ProcessSampler:
+    """Sample the CPU time, memory, threads and open files of a process from /proc."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        """Initialize the sampler.
+
+        Args:
+            pid (int): Process to watch.
+            interval (float, optional): Seconds between samples. Defaults to 0.5.
+        """
+        self.pid = pid
+        self.interval = interval
+        self.samples: list[dict[str, float]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="proc-sampler", daemon=True)
+
+    def sample(self) -> Optional[dict[str, float]]:
+        """Read the current usage of the process.
+
+        Returns:
+            Optional[dict[str, float]]: `time`, `cpu_seconds`, `rss_bytes`, `threads` and
+                `open_fds`, or None if the process is gone.
+        """
+        try:
+            with open(f"/proc/{self.pid}/stat", encoding="ascii") as f:
+                # Fields after the parenthesized command name; utime and stime are 14 and 15
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{self.pid}/status", encoding="ascii") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+            open_fds = len(os.listdir(f"/proc/{self.pid}/fd"))
+        except (FileNotFoundError, ProcessLookupError):
+            return None
+        return {
+            "time": time.monotonic(),
+            "cpu_seconds": (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"),
+            "rss_bytes": int(status["VmRSS"].split()[0]) * 1024,
+            "threads": int(status["Threads"]),
+            "open_fds": open_fds,
+        }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            sample = self.sample()
+            if sample is not None:
+                self.samples.append(sample)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "ProcessSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        sample = self.sample()
+        if sample is not None:
+            self.samples.append(sample)
+
+    def summary(self) -> dict[str, Optional[float]]:
+        """Summarize the samples.
+
+        Returns:
+            dict[str, Optional[float]]: CPU seconds used and mean CPU utilization over the
+                sampled period, peak resident memory, peak threads and peak open files.
+        """
+        if len(self.samples) < 2:
+            return {}
+        first, last = self.samples[0], self.samples[-1]
+        cpu_seconds = last["cpu_seconds"] - first["cpu_seconds"]
+        return {
+            "cpu_seconds": cpu_seconds,
+            "cpu_percent": 100 * cpu_seconds / max(last["time"] - first["time"], 1e-9),
+            "peak_rss_mb": max(s["rss_bytes"] for s in self.samples) / 2**20,
+            "peak_threads": max(s["threads"] for s in self.samples),
+            "peak_open_fds": max(s["open_fds"] for s in self.samples),
+        }
+
+
+@contextlib.contextmanager
+def local_server(db_path: str, port: int, workdir: str, verbose: bool = False):
+    """Start `server_mock` with uvicorn on localhost and stop it on exit.
+
+    Args:
+        db_path (str): Database of the server.
+        port (int): Port to listen on.
+        workdir (str): Working directory of the server, so that no `pending_requests.txt`
+            is imported.
+        verbose (bool, optional): Show the server logs. Defaults to False.
+
+    Yields:
+        subprocess.Popen: The server process.
+    """
+    env = dict(os.environ, PENDING_REQUESTS_DB=db_path)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [HERE, env.get("PYTHONPATH")]))
+    command = [sys.executable, "-m", "uvicorn", "server_mock:app", "--host", HOST]
+    command += ["--port", str(port), "--log-level", "info" if verbose else "warning"]
+    output = None if verbose else subprocess.DEVNULL
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=output, stderr=output)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"The server exited with code {process.returncode}.")
+            try:
+                requests.get(f"http://{HOST}:{port}/metrics", timeout=1).raise_for_status()
+                break
+            except requests.RequestException:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        yield process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_worker(
+    server_url: str,
+    concurrency: int,
+    extract_seconds: float,
+    failure_rate: float,
+    stop: Any,
+    stats: Any,
+    verbose: bool,
+) -> None:
+    """Run one stub worker process until `stop` is set, then report its counters.
+
+    Args:
+        server_url (str): URL of the server.
+        concurrency (int): Evaluations running in parallel.
+        extract_seconds (float): Simulated cost of each image.
+        failure_rate (float): Probability that an evaluation raises.
+        stop (multiprocessing.Event): Set to stop the worker.
+        stats (multiprocessing.Queue): Receives the counters of the worker.
+        verbose (bool): Keep the worker logs.
+    """
+    if not verbose:
+        sys.stdout = open(os.devnull, "w", encoding="utf-8")  # pylint: disable=consider-using-with
+    client_mock.SERVER_URL = server_url
+    checker = SemanticIntegrityChecker(
+        tools=[StubTool(extract_seconds, failure_rate)], precheck=False
+    )
+    worker = Worker(checker, concurrency=concurrency, long_poll_seconds=1, interval_seconds=1)
+    threading.Thread(target=lambda: (stop.wait(), worker.stop()), daemon=True).start()
+    worker.run()
+    stats.put(
+        {
+            "claimed": client_mock.claimed_total.value(),
+            "completed": client_mock.completed_total.value(),
+            "failed": client_mock.failed_total.value(),
+            "rejected": sum(value for _, _, value in client_mock.rejected_total.samples()),
+            "result_posts": client_mock.result_posts_total.value(),
+        }
+    )
+
+
+def submit_requests(
+    server_url: str, count: int, submitters: int, rate: float, user_count: int
+) -> dict[str, Any]:
+    """Submit synthetic pairs from several threads, optionally at a fixed overall rate.
+
+    Args:
+        server_url (str): URL of the server.
+        count (int): Number of pairs.
+        submitters (int): Number of submitting threads.
+        rate (float): Submissions per second over all threads, 0 for as fast as possible.
+        user_count (int): Number of distinct users the pairs are spread over.
+
+    Returns:
+        dict[str, Any]: Number of accepted submissions, errors by kind and submission latencies.
+    """
+    next_index = iter(range(count))
+    lock = threading.Lock()
+    latencies: list[float] = []
+    errors: Counter = Counter()
+    start = time.monotonic()
+
+    def submit() -> None:
+        session = requests.Session()
+        while True:
+            with lock:
+                index = next(next_index, None)
+            if index is None:
+                return
+            if rate > 0:
+                time.sleep(max(0.0, start + index / rate - time.monotonic()))
+            payload = {
+                "candidate_image_path": f"load/candidate_{index}.jpg",
+                "reference_image_path": f"load/reference_{index}.jpg",
+                "user": f"user_{index % user_count}",
+            }
+            sent = time.monotonic()
+            try:
+                response = session.post(
+                    f"{server_url}/requests_pending_semantic_integrity", json=payload, timeout=30
+                )
+                error = None if response.ok else f"http_{response.status_code}"
+            except requests.RequestException as ex:
+                error = type(ex).__name__
+            with lock:
+                latencies.append(time.monotonic() - sent)
+                if error is not None:
+                    errors[error] += 1
+
+    threads = [threading.Thread(target=submit) for _ in range(submitters)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        "submitted": count - sum(errors.values()),
+        "errors": dict(errors),
+        "seconds": time.monotonic() - start,
+        "latency_seconds": percentiles(latencies),
+    }
+
+
+def collect_latencies(store: JobStore) -> dict[str, list[float]]:
+    """Read the queue and end-to-end latencies of the finished requests.
+
+    Args:
+        store (JobStore): Database of the server.
+
+    Returns:
+        dict[str, list[float]]: `end_to_end` (submission to stored result), `queue` (submission
+            to claim) and the `created_at` / `finished_at` timestamps.
+    """
+    latencies: dict[str, list[float]] = {
+        "end_to_end": [],
+        "queue": [],
+        "created_at": [],
+        "finished_at": [],
+    }
+    for status in (STATUS_PROCESSED, STATUS_FAILED):
+        after_id = None
+        while True:
+            records, has_next, _ = store.page(status, limit=1000, after_id=after_id)
+            for record in records:
+                latencies["end_to_end"].append(record["updated_at"] - record["created_at"])
+                latencies["created_at"].append(record["created_at"])
+                latencies["finished_at"].append(record["updated_at"])
+                if record["claimed_at"] is not None:
+                    latencies["queue"].append(record["claimed_at"] - record["created_at"])
+            if not has_next:
+                break
+            after_id = records[-1]["id"]
+    return latencies
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    """Run one load test.
+
+    Args:
+        args (argparse.Namespace): Parsed command line, see `main`.
+
+    Returns:
+        dict[str, Any]: The report.
+    """
+    workdir = tempfile.mkdtemp(prefix="si-load-")
+    db_path = os.path.join(workdir, "load.db")
+    port = args.port or free_port()
+    server_url = f"http://{HOST}:{port}"
+    context = multiprocessing.get_context("spawn")
+    stop, stats = context.Event(), context.Queue()
+
+    with local_server(db_path, port, workdir, args.verbose) as server:
+        workers = [
+            context.Process(
+                target=run_worker,
+                args=(
+                    server_url,
+                    args.concurrency,
+                    args.extract_seconds,
+                    args.failure_rate,
+                    stop,
+                    stats,
+                    args.verbose,
+                ),
+            )
+            for _ in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        store = JobStore(db_path)
+        with ProcessSampler(server.pid) as sampler:
+            started = time.time()
+            submission = submit_requests(
+                server_url, args.requests, args.submitters, args.rate, args.users
+            )
+            deadline = time.monotonic() + args.timeout
+            while True:
+                counts = store.count_by_status()
+                finished = counts.get(STATUS_PROCESSED, 0) + counts.get(STATUS_FAILED, 0)
+                if finished >= submission["submitted"] or time.monotonic() > deadline:
+                    break
+                time.sleep(0.2)
+        stop.set()
+        worker_stats = [stats.get(timeout=60) for _ in workers]
+        for worker in workers:
+            worker.join()
+        server_metrics = requests.get(f"{server_url}/metrics", timeout=10).text
+
+    latencies = collect_latencies(store)
+    finished_at = max(latencies["finished_at"], default=started)
+    elapsed = max(finished_at - started, 1e-9)
+    return {
+        "config": vars(args),
+        "started_at": started,
+        "elapsed_seconds": elapsed,
+        "submission": submission,
+        "requests": {
+            "submitted": submission["submitted"],
+            "processed": counts.get(STATUS_PROCESSED, 0),
+            "failed": counts.get(STATUS_FAILED, 0),
+            "unfinished": submission["submitted"] - finished,
+        },
+        "throughput_per_second": finished / elapsed,
+        "error_rate": (counts.get(STATUS_FAILED, 0) + sum(submission["errors"].values()))
+        / max(args.requests, 1),
+        "end_to_end_latency_seconds": percentiles(latencies["end_to_end"]),
+        "queue_latency_seconds": percentiles(latencies["queue"]),
+        "workers": (
+            {key: sum(s[key] for s in worker_stats) for key in worker_stats[0]}
+            if worker_stats
+            else {}
+        ),
+        "server": sampler.summary(),
+        "server_metrics": server_metrics,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Run a load test on localhost and write its report as JSON."""
+    parser = argparse.ArgumentParser(description="Load test of the mock server and workers.")
+    parser.add_argument("--requests", type=int, default=1000, help="Pairs to submit.")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Evaluations per worker.")
+    parser.add_argument("--submitters", type=int, default=8, help="Submitting threads.")
+    parser.add_argument("--rate", type=float, default=0, help="Submissions/s, 0 for unlimited.")
+    parser.add_argument("--users", type=int, default=1, help="Distinct submitting users.")
+    parser.add_argument("--extract-seconds", type=float, default=0.01)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for results.")
+    parser.add_argument("--port", type=int, default=None, help="Defaults to a free port.")
+    parser.add_argument("--output", default="load_test_results.json")
+    parser.add_argument("--verbose", action="store_true", help="Show server and worker logs.")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    latency = report["end_to_end_latency_seconds"]
+    print(
+        f"{report['requests']['processed']} processed, {report['requests']['failed']} failed, "
+        f"{report['requests']['unfinished']} unfinished in {report['elapsed_seconds']:.1f}s: "
+        f"{report['throughput_per_second']:.1f} requests/s"
+    )
+    if latency["p50"] is not None:
+        print(
+            f"End-to-end latency p50 {latency['p50']:.3f}s, p95 {latency['p95']:.3f}s, "
+            f"p99 {latency['p99']:.3f}s"
+        )
+    print(f"Error rate {report['error_rate']:.2%}, server: {report['server']}")
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""metrics.py: Minimal Prometheus-style metrics shared by the mock server and client."""
+
+import bisect
+import threading
+from typing import Any, Iterator
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Default buckets for durations, from milliseconds to hours
+DURATION_BUCKETS = [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600]
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    """Render labels as `{name="value",...}`."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value, using integers where possible."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """Base class of the metrics: a name, a help text and labelled samples."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        """Initialize the metric.
+
+        Args:
+            name (str): Metric name, e.g. 'si_requests'.
+            documentation (str): Help text.
+            labelnames (tuple[str, ...], optional): Names of the labels. Defaults to ().
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        """Label values in the declared order.
+
+        Raises:
+            ValueError: If the labels do not match the declared label names.
+        """
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}."
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def value(self, **labels: Any) -> float:
+        """Return the current value of one labelled series.
+
+        Returns:
+            float: The value, 0 if the series was never set.
+        """
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        """Yield the (name, labels, value) samples of the metric."""
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """Increase a labelled series.
+
+        Args:
+            amount (float, optional): Increment, must not be negative. Defaults to 1.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        """Set a labelled series.
+
+        Args:
+            value (float): The new value.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """Increase (or decrease, with a negative amount) a labelled series."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Histogram(Metric):
+    """Cumulative histogram with fixed bucket upper bounds."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, bounds: list[float]):
+        """Initialize the histogram.
+
+        Args:
+            name (str): Metric name.
+            documentation (str): Help text.
+            bounds (list[float]): Upper bounds of the buckets. Values above the last bound are
+                only counted in the implicit `+Inf` bucket.
+        """
+        super().__init__(name, documentation)
+        self.bounds = sorted(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record one value.
+
+        Args:
+            value (float): The observed value.
+        """
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return the current state of the histogram.
+
+        Returns:
+            dict[str, Any]: `buckets` (cumulative count per upper bound, including '+Inf'),
+                `count` and `sum` of all observed values.
+        """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        buckets, cumulative = {}, 0
+        for bound, count in zip([*map(str, self.bounds), "+Inf"], counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"buckets": buckets, "count": cumulative, "sum": total}
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        snapshot = self.snapshot()
+        for bound, count in snapshot["buckets"].items():
+            yield f"{self.name}_bucket", {"le": bound}, count
+        yield f"{self.name}_sum", {}, snapshot["sum"]
+        yield f"{self.name}_count", {}, snapshot["count"]
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric to the registry.
+
+        Args:
+            metric (Metric): The metric.
+
+        Returns:
+            Metric: The same metric, for chaining.
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        """Create and register a counter."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        """Create and register a gauge."""
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, bounds: list[float]) -> Histogram:
+        """Create and register a histogram."""
+        return self.register(Histogram(name, documentation, bounds))
+
+    def render(self) -> str:
+        """Render all metrics.
+
+        Returns:
+            str: The exposition in the Prometheus text format (version 0.0.4).
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,141 @@
+"""precheck.py: Cheap checks deciding trivial image pairs before any model runs."""
+
+import hashlib
+from typing import Any, Callable, Optional
+
+from feature_cache import FeatureCache, file_digest
+
+# Namespaces of the pixel digests and perceptual hashes in the feature cache
+PIXELS_NAMESPACE = "pixels-v1"
+DHASH_NAMESPACE = "dhash-v1"
+DHASH_SIZE = 8
+
+
+def _import_pil_image():
+    """Import Pillow on first use; the pre-check degrades to byte comparison without it."""
+    try:
+        from PIL import Image  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return Image
+
+
+def load_pixels(path: str) -> Optional[tuple[str, tuple[int, int], bytes]]:
+    """Decode an image into its mode, size and raw pixel bytes.
+
+    Args:
+        path (str): Path to the image.
+
+    Returns:
+        Optional[tuple[str, tuple[int, int], bytes]]: The decoded pixels, or None if Pillow is
+            not installed.
+    """
+    image_module = _import_pil_image()
+    if image_module is None:
+        return None
+    with image_module.open(path) as image:
+        image = image.convert("RGB")
+        return image.mode, image.size, image.tobytes()
+
+
+def pixel_digest(path: str) -> Optional[str]:
+    """Hash the decoded pixels of an image, so that re-encoded copies of it hash the same.
+
+    Args:
+        path (str): Path to the image.
+
+    Returns:
+        Optional[str]: Hex SHA256 of the mode, size and pixel bytes, or None if Pillow is not
+            installed.
+    """
+    pixels = load_pixels(path)
+    if pixels is None:
+        return None
+    mode, (width, height), data = pixels
+    return hashlib.sha256(f"{mode}:{width}x{height}:".encode() + data).hexdigest()
+
+
+def dhash(path: str, size: int = DHASH_SIZE) -> Optional[int]:
+    """Compute the difference hash of an image: one bit per horizontally adjacent pixel pair.
+
+    Args:
+        path (str): Path to the image.
+        size (int, optional): Side of the hash grid, giving `size * size` bits. Defaults to 8.
+
+    Returns:
+        Optional[int]: The hash, or None if Pillow is not installed.
+    """
+    image_module = _import_pil_image()
+    if image_module is None:
+        return None
+    with image_module.open(path) as image:
+        pixels = list(image.convert("L").resize((size + 1, size)).getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | int(left > right)
+    return value
+
+
+def precheck(
+    reference_image_path: str,
+    candidate_image_path: str,
+    feature_cache: Optional[FeatureCache] = None,
+    max_hash_distance: Optional[int] = None,
+) -> Optional[dict[str, Any]]:
+    """Decide a pair outright if the candidate is an unmodified copy of the reference.
+
+    The checks run from cheapest to most expensive: identical file content, identical decoded
+    pixels, then (only if `max_hash_distance` is set) a perceptual hash distance. A
+    perceptual match tolerates re-encoding but may also hide small semantic edits, which is why
+    it is disabled by default. With a feature cache, pixels and hashes are computed once per
+    image content, however many pairs the image appears in.
+
+    Args:
+        reference_image_path (str): Reference image path.
+        candidate_image_path (str): Candidate image path.
+        feature_cache (Optional[FeatureCache], optional): Cache for file digests, pixel digests
+            and perceptual hashes. Defaults to None.
+        max_hash_distance (Optional[int], optional): Maximum Hamming distance between the
+            difference hashes of images considered identical. Defaults to None (disabled).
+
+    Returns:
+        Optional[dict[str, Any]]: Tool details of the decision (integrity preserved), or None if
+            the pair must be evaluated by the tools.
+    """
+
+    def cached(namespace: str, compute: Callable[[str], Any], path: str) -> Any:
+        if feature_cache is None:
+            return compute(path)
+        return feature_cache.get_or_compute(namespace, path, compute)
+
+    if feature_cache is not None:
+        same_bytes = feature_cache.image_digest(reference_image_path) == feature_cache.image_digest(
+            candidate_image_path
+        )
+    else:
+        same_bytes = file_digest(reference_image_path) == file_digest(candidate_image_path)
+    if same_bytes:
+        return {"prediction": True, "confidence": 1.0, "method": "identical_bytes"}
+
+    reference_pixels = cached(PIXELS_NAMESPACE, pixel_digest, reference_image_path)
+    if reference_pixels is None:
+        return None
+    if reference_pixels == cached(PIXELS_NAMESPACE, pixel_digest, candidate_image_path):
+        return {"prediction": True, "confidence": 1.0, "method": "identical_pixels"}
+
+    if max_hash_distance is None:
+        return None
+    reference_hash = cached(DHASH_NAMESPACE, dhash, reference_image_path)
+    candidate_hash = cached(DHASH_NAMESPACE, dhash, candidate_image_path)
+    distance = bin(reference_hash ^ candidate_hash).count("1")
+    if distance <= max_hash_distance:
+        return {
+            "prediction": True,
+            "confidence": 1.0 - distance / DHASH_SIZE**2,
+            "method": "perceptual_hash",
+            "hash_distance": distance,
+        }
+    return None
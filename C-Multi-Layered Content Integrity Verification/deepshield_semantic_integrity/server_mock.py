@@ -1,18 +1,161 @@
+import asyncio
 import os
-from typing import Any
+import threading
+import time
+from typing import Any, Optional
 
 import uvicorn
-from fastapi import Body, FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import Body, FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from job_store import (
+    DEFAULT_USER,
+    PRIORITY_NORMAL,
+    RESULT_CONFLICT,
+    RESULT_NOT_FOUND,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_PROCESSED,
+    STATUS_RUNNING,
+    BackpressureError,
+    InvalidTransitionError,
+    JobStore,
+    image_digest,
+)
+from metrics import CONTENT_TYPE, DURATION_BUCKETS, MetricsRegistry
 
 app = FastAPI()
 
 PENDING_REQUESTS_FILE = "pending_requests.txt"
+PENDING_REQUESTS_DB = os.environ.get("PENDING_REQUESTS_DB", "pending_requests.db")
+
+store = JobStore(PENDING_REQUESTS_DB)
+
+# One-shot migration of the legacy text file into a fresh database
+if store.is_empty() and os.path.exists(PENDING_REQUESTS_FILE):
+    store.import_text_file(PENDING_REQUESTS_FILE, digest=image_digest)
+
+# Long-poll waiters re-check the store at least this often, to notice expired leases and
+# requests added by other processes
+WAIT_RECHECK_SECONDS = 1.0
+MAX_WAIT_SECONDS = 60.0
+
+# Maximum number of results accepted by one call to the batch endpoint
+MAX_RESULT_BATCH_SIZE = 1000
+
+# Accept results without a `worker_id` for any pending or running pair, for clients that
+# predate leases. Off by default: a worker that lost its lease must not overwrite the pair.
+ALLOW_UNLEASED_RESULTS = os.environ.get("ALLOW_UNLEASED_RESULTS", "") == "1"
+
+# Seconds a user over its pending limit is asked to wait before submitting again
+BACKPRESSURE_RETRY_AFTER = 5
+
+
+class PendingSignal:
+    """Wake up long-poll waiters whenever new pending work may exist.
+
+    Waiters are coroutines awaiting a future on the event loop, so an idle long-poll does not
+    hold a threadpool thread. `notify` may be called from any thread, e.g. from sync endpoints.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._waiters: dict[asyncio.Future, asyncio.AbstractEventLoop] = {}
+
+    @property
+    def version(self) -> int:
+        """Number of notifications so far."""
+        with self._lock:
+            return self._version
+
+    def notify(self) -> None:
+        """Signal that pending work was added."""
+        with self._lock:
+            self._version += 1
+            waiters, self._waiters = self._waiters, {}
+        for future, loop in waiters.items():
+            loop.call_soon_threadsafe(self._wake, future)
+
+    @staticmethod
+    def _wake(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(None)
+
+    async def wait(self, version: int, timeout: float) -> None:
+        """Wait until a notification newer than `version` arrives or `timeout` passes.
+
+        Args:
+            version (int): Version observed before checking the store.
+            timeout (float): Maximum number of seconds to wait.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._version != version:
+                return
+            self._waiters[future] = loop
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._waiters.pop(future, None)
+
+
+pending_signal = PendingSignal()
+
+metrics = MetricsRegistry()
+requests_by_status = metrics.gauge("si_requests", "Requests in the store by status.", ("status",))
+oldest_pending_age = metrics.gauge(
+    "si_oldest_pending_age_seconds", "Age of the oldest claimable pending request."
+)
+time_in_queue = metrics.histogram(
+    "si_time_in_queue_seconds",
+    "Time from becoming pending (submission or requeue) to claim, per claim.",
+    DURATION_BUCKETS,
+)
+processing_time = metrics.histogram(
+    "si_processing_seconds", "Time from claim to stored result.", DURATION_BUCKETS
+)
+claimed_total = metrics.counter("si_claimed_total", "Requests claimed, per worker.", ("worker",))
+completed_total = metrics.counter(
+    "si_completed_total", "Results stored, per worker holding the lease.", ("worker",)
+)
+failed_total = metrics.counter("si_failed_total", "Requests marked failed.")
+
+
+def record_completion(record: dict[str, Any]) -> None:
+    """Update the metrics for a request that just received its result.
+
+    Args:
+        record (dict[str, Any]): The request as it was before completion.
+    """
+    completed_total.inc(worker=record["lease_owner"] or "unclaimed")
+    if record["claimed_at"] is not None:
+        processing_time.observe(time.time() - record["claimed_at"])
 
 
 class PendingRequest(BaseModel):
+    id: int
     candidate_image_path: str
     reference_image_path: str
+    status: str
+    duplicate_of: Optional[int] = None
+    user: str = DEFAULT_USER
+    priority: int = PRIORITY_NORMAL
+
+
+class PendingRequestsPage(BaseModel):
+    count: Optional[int] = None
+    next: Optional[str]
+    previous: Optional[str]
+    current_page: Optional[int]
+    page_size: int
+    results: list[PendingRequest]
 
 
 class SemanticIntegrityResult(BaseModel):
@@ -20,97 +163,182 @@ class SemanticIntegrityResult(BaseModel):
     reference_image_path: str
     overall_prediction: bool
     tool_details: dict
+    worker_id: Optional[str] = None
 
 
-def read_requests_from_file() -> list[tuple[str, str, str]]:
-    """Reads lines of the form:
-       candidate_image_path, reference_image_path, status
+class SemanticIntegrityResultBatch(BaseModel):
+    results: list[SemanticIntegrityResult] = Field(..., max_length=MAX_RESULT_BATCH_SIZE)
+
+
+class BatchItemStatus(BaseModel):
+    candidate_image_path: str
+    reference_image_path: str
+    status: str
+
+
+class BatchResultResponse(BaseModel):
+    processed: int
+    not_found: int
+    conflict: int = 0
+    results: list[BatchItemStatus]
+
+
+class ClaimRequest(BaseModel):
+    worker_id: str
+    limit: int = Field(1, ge=1, le=1000)
+    lease_seconds: float = Field(60.0, gt=0)
 
-    Returns:
-        list[tuple[str, str, str]]: a list of tuples:
-            (candidate_image_path, reference_image_path, status)
-    """
-    if not os.path.exists(PENDING_REQUESTS_FILE):
-        return []
 
-    records = []
-    with open(PENDING_REQUESTS_FILE, "r") as f:
-        lines = [line.strip() for line in f if line.strip()]
+class ClaimResponse(BaseModel):
+    lease_seconds: float
+    results: list[PendingRequest]
 
-    for line in lines:
-        parts = [p.strip() for p in line.split(",")]
-        if len(parts) == 3:
-            candidate_img, reference_img, status = parts
-            records.append((candidate_img, reference_img, status))
-    return records
 
+class HeartbeatRequest(BaseModel):
+    worker_id: str
+    ids: list[int]
+    lease_seconds: float = Field(60.0, gt=0)
 
-def write_requests_to_file(records: list[tuple[str, str, str]]) -> None:
-    """Overwrites the file with records of the form:
-       candidate_image_path, reference_image_path, status
+
+class StatusUpdate(BaseModel):
+    status: str
+
+
+class UserShare(BaseModel):
+    weight: float = Field(1.0, gt=0)
+    max_running: Optional[int] = Field(None, ge=0)
+    max_pending: Optional[int] = Field(None, ge=0)
+
+
+def to_pending_request(record: dict[str, Any]) -> PendingRequest:
+    """Convert a stored request into its API representation.
 
     Args:
-        records (list[tuple[str, str, str]]): a list of tuples:
-            (candidate_image_path, reference_image_path, status)
-    """
-    with open(PENDING_REQUESTS_FILE, "w") as f:
-        for candidate_img, reference_img, status in records:
-            f.write(f"{candidate_img}, {reference_img}, {status}\n")
+        record (dict[str, Any]): Request as returned by the job store.
 
+    Returns:
+        PendingRequest: the request exposed by the API.
+    """
+    return PendingRequest(
+        id=record["id"],
+        candidate_image_path=record["candidate_image_path"],
+        reference_image_path=record["reference_image_path"],
+        status=record["status"],
+        duplicate_of=record["duplicate_of"],
+        user=record["user"],
+        priority=record["priority"],
+    )
+
+
+@app.get("/requests_pending_semantic_integrity", response_model=PendingRequestsPage)
+def get_requests_pending_semantic_integrity(
+    request: Request,
+    status: Optional[str] = Query(STATUS_PENDING),
+    page_size: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = Query(None, description="Return requests after this id."),
+    before: Optional[int] = Query(None, description="Return requests before this id."),
+    page: Optional[int] = Query(None, ge=1, description="Page number, if no cursor is used."),
+    include_count: Optional[bool] = Query(
+        None, description="Count the matching requests. Defaults to the first page only."
+    ),
+) -> PendingRequestsPage:
+    """Get one page of requests, by default those still in 'pending' state.
+
+    Pages are walked with keyset pagination: `next` and `previous` carry the id of the last
+    (resp. first) request of the page as `cursor` (resp. `before`), so deep pages stay as cheap
+    as the first one. `page` is accepted for clients using page numbers.
+
+    Counting scans every matching request, so `count` is only returned on the first page unless
+    `include_count` asks for it explicitly; clients walking the `next` links do not pay for it.
 
-@app.get("/requests_pending_semantic_integrity", response_model=list[PendingRequest])
-def get_requests_pending_semantic_integrity() -> list[PendingRequest]:
-    """Get pending requests.
+    Args:
+        request (Request): Incoming request, used to build the `next`/`previous` links.
+        status (Optional[str], optional): Status filter, an empty value returns every status.
+            Defaults to 'pending'.
+        page_size (int, optional): Number of requests per page. Defaults to 100.
+        cursor (Optional[int], optional): Return requests after this id. Defaults to None.
+        before (Optional[int], optional): Return requests before this id. Defaults to None.
+        page (Optional[int], optional): Page number, used only without cursor. Defaults to None.
+        include_count (Optional[bool], optional): Whether to return the total count. Defaults to
+            None (only on the first page).
 
     Returns:
-        list[PendingRequest]: the set of requests that are still in 'pending' state.
+        PendingRequestsPage: the page of requests, with navigation links and the total count if
+            requested.
     """
-    records = read_requests_from_file()
-    pending = [(c, r) for (c, r, s) in records if s.lower() == "pending"]
-    # Convert to Pydantic model
-    return [PendingRequest(candidate_image_path=c, reference_image_path=r) for (c, r) in pending]
+    status = status or None
+    # Requests whose worker lease ran out are pending again
+    store.requeue_expired()
+    use_page_number = page is not None and cursor is None and before is None
+    offset = (page - 1) * page_size if use_page_number else 0
+    if include_count is None:
+        include_count = cursor is None and before is None and offset == 0
+    records, has_next, has_previous = store.page(
+        status=status, limit=page_size, after_id=cursor, before_id=before, offset=offset
+    )
+
+    base_url = request.url.remove_query_params(["cursor", "before", "page"])
+    next_url = (
+        str(base_url.include_query_params(cursor=records[-1]["id"]))
+        if has_next and records
+        else None
+    )
+    previous_url = (
+        str(base_url.include_query_params(before=records[0]["id"]))
+        if has_previous and records
+        else None
+    )
+
+    return PendingRequestsPage(
+        count=store.count(status) if include_count else None,
+        next=next_url,
+        previous=previous_url,
+        current_page=page if use_page_number else None,
+        page_size=page_size,
+        # Convert to Pydantic model
+        results=[to_pending_request(record) for record in records],
+    )
 
 
 @app.post("/semantic_integrity_results")
 def post_semantic_integrity_results(result: SemanticIntegrityResult) -> dict[str, Any]:
     """Receives the evaluation result for a (candidate_image_path, reference_image_path) pair,
-    then marks that entry as 'processed' in the file.
+    then marks that entry as 'processed' in the store.
+
+    The result must carry the `worker_id` holding the lease on the pair, unless the server runs
+    with ALLOW_UNLEASED_RESULTS=1.
 
     Args:
         result (SemanticIntegrityResult): Results of Semantic Integrity.
 
     Raises:
-        HTTPException: if No pending entry found.
+        HTTPException: 404 if the pair is unknown, 409 if it is not running under a lease held
+            by `worker_id`.
 
     Returns:
         dict[str, Any]: Message and results after posting results.
     """
-    records = read_requests_from_file()
-    found = False
-
-    for i, (cand, ref, status) in enumerate(records):
-        if (
-            cand == result.candidate_image_path
-            and ref == result.reference_image_path
-            and status == "pending"
-        ):
-            # Mark it processed
-            records[i] = (cand, ref, "processed")
-            found = True
-            break
-
-    if not found:
+    # Mark it processed
+    outcome, record = store.complete_many([result.model_dump()], ALLOW_UNLEASED_RESULTS)[0]
+
+    if outcome == RESULT_NOT_FOUND:
         raise HTTPException(
             status_code=404,
             detail=(
-                "No pending entry found matching "
+                "No entry found matching "
                 f"candidate='{result.candidate_image_path}', "
                 f"reference='{result.reference_image_path}'"
             ),
         )
-
-    # Write updated entries back
-    write_requests_to_file(records)
+    if outcome == RESULT_CONFLICT:
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                f"Request {record['id']} is '{record['status']}' and not leased by "
+                f"worker '{result.worker_id}'."
+            ),
+        )
+    record_completion(record)
 
     return {
         "message": (
@@ -125,32 +353,114 @@ def post_semantic_integrity_results(result: SemanticIntegrityResult) -> dict[str
     }
 
 
+@app.post("/semantic_integrity_results/batch", response_model=BatchResultResponse)
+def post_semantic_integrity_results_batch(
+    batch: SemanticIntegrityResultBatch,
+) -> BatchResultResponse:
+    """Receives many evaluation results at once and applies them in a single transaction.
+
+    Unlike the single-result endpoint, rejected results do not fail the request: each item
+    reports its own status ('processed', 'not_found', or 'conflict' if the pair is not running
+    under a lease held by the `worker_id` of the item).
+
+    Args:
+        batch (SemanticIntegrityResultBatch): Results of Semantic Integrity.
+
+    Returns:
+        BatchResultResponse: Number of processed, unknown and conflicting pairs, and the status
+            of each item.
+    """
+    outcomes = store.complete_many(
+        [result.model_dump() for result in batch.results], ALLOW_UNLEASED_RESULTS
+    )
+    items = []
+    for result, (outcome, record) in zip(batch.results, outcomes):
+        if outcome == STATUS_PROCESSED:
+            record_completion(record)
+        items.append(
+            BatchItemStatus(
+                candidate_image_path=result.candidate_image_path,
+                reference_image_path=result.reference_image_path,
+                status=outcome,
+            )
+        )
+    statuses = [outcome for outcome, _ in outcomes]
+    return BatchResultResponse(
+        processed=statuses.count(STATUS_PROCESSED),
+        not_found=statuses.count(RESULT_NOT_FOUND),
+        conflict=statuses.count(RESULT_CONFLICT),
+        results=items,
+    )
+
+
 @app.post("/requests_pending_semantic_integrity")
 def add_file_to_pending(
     candidate_image_path: str = Body(...),
     reference_image_path: str = Body(...),
+    candidate_digest: Optional[str] = Body(None),
+    reference_digest: Optional[str] = Body(None),
+    user: Optional[str] = Body(None),
+    priority: int = Body(PRIORITY_NORMAL),
 ) -> dict[str, str]:
     """Add a new pair of (candidate_image_path, reference_image_path) to pending if not present.
 
+    The content digest of each image is stored with the pair. It is computed from the file if
+    the server can read it, or may be provided by the uploader. Pairs with identical content, or
+    whose content was already evaluated, are resolved immediately and never reach the workers.
+
+    Workers claim higher priorities first and share the rest fairly between users, so a bulk
+    submission does not starve interactive ones. A user with `max_pending` pending requests is
+    asked to retry later.
+
     Args:
         candidate_image_path (str, optional): Candidate image path. Defaults to Body(...).
         reference_image_path (str, optional): Reference image path. Defaults to Body(...).
+        candidate_digest (Optional[str], optional): SHA-256 of the candidate image.
+            Defaults to Body(None) (computed from the file).
+        reference_digest (Optional[str], optional): SHA-256 of the reference image.
+            Defaults to Body(None) (computed from the file).
+        user (Optional[str], optional): Owner of the request.
+            Defaults to Body(None) (DEFAULT_USER).
+        priority (int, optional): Priority of the request, e.g. PRIORITY_INTERACTIVE.
+            Defaults to Body(PRIORITY_NORMAL).
+
+    Raises:
+        HTTPException: 429 if the user has too many pending requests.
 
     Returns:
         dict[str, str]: Message showing successfull request.
     """
     candidate_image_path = candidate_image_path.strip()
     reference_image_path = reference_image_path.strip()
-
-    records = read_requests_from_file()
+    candidate_digest = candidate_digest or image_digest(candidate_image_path)
+    reference_digest = reference_digest or image_digest(reference_image_path)
 
     # Check if already present in any form
-    for cand, ref, status in records:
-        if cand == candidate_image_path and ref == reference_image_path:
-            return {"message": f"This pair already exists with state '{status}'."}
+    try:
+        added, status = store.add_pair(
+            candidate_image_path,
+            reference_image_path,
+            candidate_digest,
+            reference_digest,
+            user=user or DEFAULT_USER,
+            priority=priority,
+        )
+    except BackpressureError as ex:
+        raise HTTPException(
+            status_code=429, detail=str(ex), headers={"Retry-After": str(BACKPRESSURE_RETRY_AFTER)}
+        ) from ex
+    if not added:
+        return {"message": f"This pair already exists with state '{status}'."}
+    if status == STATUS_PROCESSED:
+        return {
+            "message": (
+                f"Added pair candidate='{candidate_image_path}' & "
+                f"reference='{reference_image_path}' as processed: its content was already "
+                "evaluated or the images are identical."
+            )
+        }
+    pending_signal.notify()
 
-    records.append((candidate_image_path, reference_image_path, "pending"))
-    write_requests_to_file(records)
     return {
         "message": (
             f"Added pair candidate='{candidate_image_path}' & reference='{reference_image_path}' "
@@ -159,5 +469,141 @@ def add_file_to_pending(
     }
 
 
+@app.get("/requests_pending_semantic_integrity/wait")
+async def wait_for_pending_requests(
+    timeout: float = Query(30.0, ge=0, le=MAX_WAIT_SECONDS),
+) -> dict[str, int]:
+    """Long-poll: hold the connection until pending requests exist or `timeout` passes.
+
+    Returns immediately if there is pending work already. Otherwise the request is woken up as
+    soon as a pair is added, so workers react within milliseconds instead of their polling
+    interval. Waiting happens on the event loop; only the short store checks run in the
+    threadpool, so idle waiters do not starve the sync endpoints of threads.
+
+    Args:
+        timeout (float, optional): Maximum number of seconds to wait. Defaults to 30.
+
+    Returns:
+        dict[str, int]: the number of pending requests, 0 if the wait timed out.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        # Read the version first so that a notification arriving meanwhile is not missed
+        version = pending_signal.version
+        pending = await run_in_threadpool(count_claimable)
+        remaining = deadline - time.monotonic()
+        if pending or remaining <= 0:
+            return {"pending": pending}
+        await pending_signal.wait(version, min(remaining, WAIT_RECHECK_SECONDS))
+
+
+def count_claimable() -> int:
+    """Requeue expired leases, then count the claimable requests (blocking store access)."""
+    store.requeue_expired()
+    return store.count_claimable()
+
+
+@app.post("/semantic_integrity_claims", response_model=ClaimResponse)
+def claim_requests(claim: ClaimRequest) -> ClaimResponse:
+    """Atomically move up to `limit` pending requests to 'running' for one worker.
+
+    The worker holds a lease of `lease_seconds` on each claimed request and must renew it via
+    `/semantic_integrity_claims/heartbeat`. Requests whose lease expires are requeued as
+    'pending', so a crashed worker never blocks them.
+
+    Args:
+        claim (ClaimRequest): Worker id, maximum number of requests and lease duration.
+
+    Returns:
+        ClaimResponse: the claimed requests (possibly none).
+    """
+    records = store.claim(claim.worker_id, claim.limit, claim.lease_seconds)
+    if records:
+        claimed_total.inc(len(records), worker=claim.worker_id)
+        for record in records:
+            # Measured from the last time the request became pending, so that a requeued
+            # request does not count its earlier running time as queueing
+            queued_at = record["queued_at"] or record["created_at"]
+            time_in_queue.observe(record["claimed_at"] - queued_at)
+    return ClaimResponse(
+        lease_seconds=claim.lease_seconds,
+        results=[to_pending_request(record) for record in records],
+    )
+
+
+@app.post("/semantic_integrity_claims/heartbeat")
+def renew_claims(heartbeat: HeartbeatRequest) -> dict[str, list[int]]:
+    """Renew the leases a worker holds.
+
+    Args:
+        heartbeat (HeartbeatRequest): Worker id, claimed request ids and new lease duration.
+
+    Returns:
+        dict[str, list[int]]: The ids whose lease was renewed. Ids that are missing are no longer
+            held by the worker and should not be processed further.
+    """
+    renewed = store.heartbeat(heartbeat.worker_id, heartbeat.ids, heartbeat.lease_seconds)
+    return {"renewed": renewed}
+
+
+@app.patch("/semantic_integrity_status/{request_id}", response_model=PendingRequest)
+def update_status(request_id: int, update: StatusUpdate) -> PendingRequest:
+    """Update the status of a request: pending -> running, running -> processed/failed.
+
+    Args:
+        request_id (int): Id of the request.
+        update (StatusUpdate): The new status.
+
+    Raises:
+        HTTPException: 404 if the request does not exist, 409 if the transition is not allowed.
+
+    Returns:
+        PendingRequest: the updated request.
+    """
+    try:
+        record = store.set_status(request_id, update.status)
+    except KeyError as ex:
+        raise HTTPException(status_code=404, detail=f"No request with id {request_id}.") from ex
+    except InvalidTransitionError as ex:
+        raise HTTPException(status_code=409, detail=str(ex)) from ex
+    if record["status"] == STATUS_FAILED:
+        failed_total.inc()
+    return to_pending_request(record)
+
+
+@app.put("/semantic_integrity_users/{user}")
+def set_user_share(user: str, share: UserShare) -> dict[str, Any]:
+    """Configure the share of the workers a user gets and its backpressure limits.
+
+    Args:
+        user (str): The user.
+        share (UserShare): Weight relative to the other users, maximum number of running and
+            pending requests.
+
+    Returns:
+        dict[str, Any]: The stored configuration.
+    """
+    config = store.set_user_share(user, share.weight, share.max_running, share.max_pending)
+    return {key: config[key] for key in ("user", "weight", "max_running", "max_pending")}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    """Expose queue and latency metrics in the Prometheus text format.
+
+    Queue depth per status and the age of the oldest pending request are read from the store at
+    scrape time. Histograms and counters cover the lifetime of this server process.
+
+    Returns:
+        PlainTextResponse: The metrics.
+    """
+    counts = store.count_by_status()
+    for status in (STATUS_PENDING, STATUS_RUNNING, STATUS_PROCESSED, STATUS_FAILED, *counts):
+        requests_by_status.set(counts.get(status, 0), status=status)
+    oldest = store.oldest_pending_created_at()
+    oldest_pending_age.set(time.time() - oldest if oldest is not None else 0)
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
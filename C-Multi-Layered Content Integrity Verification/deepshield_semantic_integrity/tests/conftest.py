@@ -0,0 +1,12 @@
+"""conftest.py: Make the flat semantic integrity modules importable from the tests."""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# server_mock opens its store on import; keep it away from the working directory
+os.environ.setdefault(
+    "PENDING_REQUESTS_DB", os.path.join(tempfile.mkdtemp(), "pending_requests.db")
+)
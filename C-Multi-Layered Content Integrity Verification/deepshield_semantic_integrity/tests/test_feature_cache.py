@@ -0,0 +1,119 @@
+"""test_feature_cache.py: Memory and disk tiers of the per-image feature cache."""
+
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from feature_cache import FeatureCache, config_version, file_digest
+
+
+@pytest.fixture
+def images(tmp_path):
+    """Three image files with distinct content."""
+    paths = []
+    for index in range(3):
+        path = tmp_path / f"image_{index}.jpg"
+        path.write_bytes(f"pixels {index}".encode())
+        paths.append(str(path))
+    return paths
+
+
+class CountingExtractor:
+    """Feature extractor that counts its calls."""
+
+    def __init__(self, seconds: float = 0.0):
+        self.seconds = seconds
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, path: str) -> str:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.seconds)
+        return f"features of {os.path.basename(path)}"
+
+
+def test_memory_tier_is_keyed_by_content_and_bounded(images):
+    cache = FeatureCache(max_entries=2)
+    extract = CountingExtractor()
+
+    cache.get_or_compute("tool", images[0], extract)
+    cache.get_or_compute("tool", images[0], extract)
+    cache.get_or_compute("tool", images[1], extract)
+    cache.get_or_compute("tool", images[2], extract)
+    # The least recently used entry was evicted
+    cache.get_or_compute("tool", images[0], extract)
+
+    assert extract.calls == 4
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 0, "misses": 4, "entries": 2}
+
+
+def test_digest_memo_is_bounded_and_follows_file_changes(images):
+    cache = FeatureCache(max_entries=2)
+    for path in images:
+        assert cache.image_digest(path) == file_digest(path)
+    assert len(cache._digests) == 2
+
+    with open(images[2], "ab") as f:
+        f.write(b" edited")
+    assert cache.image_digest(images[2]) == file_digest(images[2])
+    assert len(cache._digests) == 2
+
+
+def test_namespaces_separate_tool_versions(images):
+    cache = FeatureCache()
+    extract = CountingExtractor()
+    for version in ("v1", "v2"):
+        cache.get_or_compute(config_version("tool", {"weights": version}), images[0], extract)
+
+    assert extract.calls == 2
+
+
+def test_disk_tier_is_shared_between_instances(images, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    extract = CountingExtractor()
+    first = FeatureCache(cache_dir).get_or_compute("tool", images[0], extract)
+
+    second_cache = pickle.loads(pickle.dumps(FeatureCache(cache_dir)))
+    second = second_cache.get_or_compute("tool", images[0], extract)
+
+    assert first == second and extract.calls == 1
+    assert second_cache.stats()["disk_hits"] == 1
+
+
+@pytest.mark.parametrize(
+    "content",
+    [b"", b"not a pickle", pickle.dumps("features")[:-3], b"cbuiltins\nmissing\n."],
+    ids=["empty", "garbage", "truncated", "unknown attribute"],
+)
+def test_corrupt_disk_entry_is_a_miss(images, tmp_path, content):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    key = ("tool", cache.image_digest(images[0]))
+    os.makedirs(os.path.dirname(cache._path(key)))
+    with open(cache._path(key), "wb") as f:
+        f.write(content)
+
+    extract = CountingExtractor()
+    assert cache.get_or_compute("tool", images[0], extract) == "features of image_0.jpg"
+    assert extract.calls == 1
+    # The corrupt entry was replaced
+    assert FeatureCache(cache.cache_dir).get_or_compute("tool", images[0], extract) == (
+        "features of image_0.jpg"
+    )
+    assert extract.calls == 1
+
+
+def test_concurrent_misses_compute_once(images):
+    cache = FeatureCache()
+    extract = CountingExtractor(seconds=0.1)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        values = list(
+            pool.map(lambda _: cache.get_or_compute("tool", images[0], extract), range(8))
+        )
+
+    assert extract.calls == 1
+    assert set(values) == {"features of image_0.jpg"}
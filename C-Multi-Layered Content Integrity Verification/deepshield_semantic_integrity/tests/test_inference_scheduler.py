@@ -0,0 +1,98 @@
+"""test_inference_scheduler.py: Micro-batching of the inference scheduler on the stub model."""
+
+import time
+from typing import Optional
+
+import pytest
+
+from inference_scheduler import MicroBatchScheduler, StubModelRunner
+
+
+class RecordingRunner(StubModelRunner):
+    """Stub runner that records the images of every batch."""
+
+    def __init__(self, error: Optional[Exception] = None):
+        super().__init__(batch_seconds=0, item_seconds=0)
+        self.error = error
+        self.batch_paths: list[list[str]] = []
+
+    def predict_batch(self, image_paths: list[str]) -> list:
+        self.batch_paths.append(list(image_paths))
+        if self.error is not None:
+            raise self.error
+        return super().predict_batch(image_paths)
+
+
+def paths(count: int) -> list[str]:
+    """Distinct image paths."""
+    return [f"image_{index}.jpg" for index in range(count)]
+
+
+def test_full_batches_are_dispatched_without_waiting():
+    runner = RecordingRunner()
+    scheduler = MicroBatchScheduler(runner, max_batch_size=4, max_wait=60)
+    try:
+        futures = [scheduler.submit(path) for path in paths(8)]
+        outputs = [future.result(timeout=5) for future in futures]
+    finally:
+        scheduler.close()
+
+    assert runner.loads == 1
+    assert runner.batch_paths == [paths(8)[:4], paths(8)[4:]]
+    assert outputs == StubModelRunner().predict_batch(paths(8))
+
+
+def test_partial_batch_is_dispatched_after_max_wait():
+    runner = RecordingRunner()
+    scheduler = MicroBatchScheduler(runner, max_batch_size=16, max_wait=0.2)
+    try:
+        started = time.monotonic()
+        futures = [scheduler.submit(path) for path in paths(3)]
+        for future in futures:
+            future.result(timeout=5)
+        elapsed = time.monotonic() - started
+    finally:
+        scheduler.close()
+
+    assert elapsed >= 0.2
+    assert runner.batch_paths == [paths(3)]
+    assert scheduler.stats()["batch_size"]["count"] == 1
+
+
+def test_runner_error_fails_every_future_of_the_batch():
+    error = RuntimeError("model crashed")
+    scheduler = MicroBatchScheduler(RecordingRunner(error), max_batch_size=3, max_wait=60)
+    try:
+        futures = [scheduler.submit(path) for path in paths(3)]
+        for future in futures:
+            assert future.exception(timeout=5) is error
+    finally:
+        scheduler.close()
+
+
+def test_wrong_number_of_outputs_fails_the_batch():
+    class ShortRunner(RecordingRunner):
+        def predict_batch(self, image_paths: list[str]) -> list:
+            return super().predict_batch(image_paths)[:-1]
+
+    scheduler = MicroBatchScheduler(ShortRunner(), max_batch_size=2, max_wait=60)
+    try:
+        futures = [scheduler.submit(path) for path in paths(2)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="1 outputs for 2 images"):
+                future.result(timeout=5)
+    finally:
+        scheduler.close()
+
+
+def test_close_drains_the_queue_then_rejects_new_images():
+    runner = RecordingRunner()
+    scheduler = MicroBatchScheduler(runner, max_batch_size=16, max_wait=60)
+    futures = [scheduler.submit(path) for path in paths(5)]
+
+    scheduler.close()
+
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert runner.batch_paths == [paths(5)]
+    with pytest.raises(RuntimeError, match="closed"):
+        scheduler.submit("late.jpg")
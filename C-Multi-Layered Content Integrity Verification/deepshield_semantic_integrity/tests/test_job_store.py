@@ -0,0 +1,279 @@
+"""test_job_store.py: Behavior of the SQLite job store behind the mock server."""
+
+import time
+from typing import Optional
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server_mock
+from job_store import (
+    IDENTICAL_CONTENT_DETAILS,
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    RESULT_CONFLICT,
+    RESULT_NOT_FOUND,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_PROCESSED,
+    STATUS_RUNNING,
+    BackpressureError,
+    InvalidTransitionError,
+    JobStore,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """An empty job store."""
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def result(candidate: str, worker_id: Optional[str] = None, prediction: bool = True) -> dict:
+    """Result payload for the pair (candidate, 'r.jpg')."""
+    return {
+        "candidate_image_path": candidate,
+        "reference_image_path": "r.jpg",
+        "overall_prediction": prediction,
+        "tool_details": {"Tool": {"prediction": prediction}},
+        "worker_id": worker_id,
+    }
+
+
+def passes(store: JobStore) -> dict[str, float]:
+    """Fair-share pass of every registered user."""
+    rows = store._connect().execute("SELECT user, pass FROM user_shares")
+    return {row["user"]: row["pass"] for row in rows}
+
+
+def test_resubmitted_pair_keeps_its_priority_and_does_not_register_the_user(store):
+    store.add_pair("c.jpg", "r.jpg", "dc", "dr", user="alice", priority=PRIORITY_BULK)
+    shares = passes(store)
+
+    added, status = store.add_pair(
+        "c.jpg", "r.jpg", "dc", "dr", user="bob", priority=PRIORITY_INTERACTIVE
+    )
+
+    assert (added, status) == (False, STATUS_PENDING)
+    records, _, _ = store.page()
+    assert [(record["priority"], record["duplicate_of"]) for record in records] == [
+        (PRIORITY_BULK, None)
+    ]
+    assert passes(store) == shares
+
+
+def test_resubmission_at_the_pending_limit_is_not_rejected(store):
+    store.set_user_share("alice", max_pending=1)
+    store.add_pair("c.jpg", "r.jpg", user="alice")
+
+    assert store.add_pair("c.jpg", "r.jpg", user="alice") == (False, STATUS_PENDING)
+    with pytest.raises(BackpressureError):
+        store.add_pair("other.jpg", "r.jpg", user="alice")
+
+
+def test_keyset_pages_walk_forward_and_backward(store):
+    for index in range(7):
+        store.add_pair(f"c{index}.jpg", "r.jpg")
+
+    first, has_next, has_previous = store.page(STATUS_PENDING, limit=3)
+    assert [record["id"] for record in first] == [1, 2, 3]
+    assert (has_next, has_previous) == (True, False)
+
+    # Finishing a pair of an earlier page does not shift the next one
+    store.set_status(1, STATUS_RUNNING)
+    second, has_next, has_previous = store.page(STATUS_PENDING, limit=3, after_id=3)
+    assert [record["id"] for record in second] == [4, 5, 6]
+    assert (has_next, has_previous) == (True, True)
+
+    last, has_next, _ = store.page(STATUS_PENDING, limit=3, after_id=6)
+    assert [record["id"] for record in last] == [7] and not has_next
+
+    back, has_next, has_previous = store.page(STATUS_PENDING, limit=3, before_id=6)
+    assert [record["id"] for record in back] == [3, 4, 5]
+    assert (has_next, has_previous) == (True, True)
+
+    by_offset, _, has_previous = store.page(None, limit=2, offset=2)
+    assert [record["id"] for record in by_offset] == [3, 4] and has_previous
+
+
+def test_expired_lease_is_requeued_and_claimed_by_another_worker(store):
+    store.add_pair("c.jpg", "r.jpg")
+    [first] = store.claim("worker-1", limit=1, lease_seconds=0.05)
+    assert first["status"] == STATUS_RUNNING and first["lease_owner"] == "worker-1"
+    assert store.claim("worker-2", limit=1, lease_seconds=60) == []
+
+    time.sleep(0.1)
+    assert store.heartbeat("worker-1", [first["id"]], 60) == []
+    assert store.count_claimable() == 1
+    [second] = store.claim("worker-2", limit=1, lease_seconds=60)
+
+    assert second["id"] == first["id"] and second["lease_owner"] == "worker-2"
+    # The time in queue of the re-claim starts at the requeue, not at the submission
+    assert second["queued_at"] > first["claimed_at"]
+    assert store.heartbeat("worker-2", [second["id"]], 60) == [second["id"]]
+
+
+def test_identical_content_is_processed_on_submission(store):
+    assert store.add_pair("copy.jpg", "r.jpg", "same", "same") == (True, STATUS_PROCESSED)
+    assert store.add_pair("r.jpg", "r.jpg") == (True, STATUS_PROCESSED)
+
+    records, _, _ = store.page(STATUS_PROCESSED)
+    assert all(record["overall_prediction"] is True for record in records)
+    assert all(record["tool_details"] == IDENTICAL_CONTENT_DETAILS for record in records)
+    assert store.count_claimable() == 0
+
+
+def test_pair_with_processed_digests_reuses_the_result(store):
+    store.add_pair("a.jpg", "r.jpg", "dc", "dr")
+    [claimed] = store.claim("worker-1", limit=1, lease_seconds=60)
+    store.complete_many([result("a.jpg", "worker-1", prediction=False)])
+
+    assert store.add_pair("b.jpg", "r.jpg", "dc", "dr") == (True, STATUS_PROCESSED)
+    records, _, _ = store.page(STATUS_PROCESSED)
+    copy = records[-1]
+    assert copy["duplicate_of"] == claimed["id"]
+    assert copy["overall_prediction"] is False and copy["tool_details"] == {
+        "Tool": {"prediction": False}
+    }
+
+
+def test_pair_with_pending_digests_waits_for_its_primary(store):
+    store.add_pair("a.jpg", "r.jpg", "dc", "dr", priority=PRIORITY_BULK)
+    store.add_pair("b.jpg", "r.jpg", "dc", "dr", priority=PRIORITY_INTERACTIVE)
+
+    claimed = store.claim("worker-1", limit=10, lease_seconds=60)
+    # Only the primary is claimed, at the priority of its most urgent duplicate
+    assert [(record["id"], record["priority"]) for record in claimed] == [(1, PRIORITY_INTERACTIVE)]
+    store.complete_many([result("a.jpg", "worker-1")])
+
+    records, _, _ = store.page(None)
+    assert [(record["status"], record["duplicate_of"]) for record in records] == [
+        (STATUS_PROCESSED, None),
+        (STATUS_PROCESSED, 1),
+    ]
+
+
+def test_failed_primary_promotes_its_oldest_duplicate(store):
+    for candidate in ("a.jpg", "b.jpg", "c.jpg"):
+        store.add_pair(candidate, "r.jpg", "dc", "dr")
+    store.claim("worker-1", limit=1, lease_seconds=60)
+
+    store.set_status(1, STATUS_FAILED)
+
+    [promoted] = store.claim("worker-1", limit=10, lease_seconds=60)
+    assert promoted["id"] == 2 and promoted["duplicate_of"] is None
+    records, _, _ = store.page(STATUS_PENDING)
+    assert [(record["id"], record["duplicate_of"]) for record in records] == [(3, 2)]
+
+
+def test_batch_results_report_each_outcome(store):
+    for candidate in ("a.jpg", "b.jpg", "c.jpg"):
+        store.add_pair(candidate, "r.jpg")
+    store.claim("worker-1", limit=2, lease_seconds=60)
+
+    outcomes = store.complete_many(
+        [
+            result("a.jpg", "worker-1"),
+            result("b.jpg", "worker-2"),
+            result("c.jpg"),
+            result("missing.jpg", "worker-1"),
+            result("a.jpg", "worker-1"),
+        ]
+    )
+
+    assert [outcome for outcome, _ in outcomes] == [
+        STATUS_PROCESSED,
+        RESULT_CONFLICT,
+        RESULT_CONFLICT,
+        RESULT_NOT_FOUND,
+        RESULT_CONFLICT,
+    ]
+    # The record of a stored result is the request as it was when it was completed
+    assert outcomes[0][1]["lease_owner"] == "worker-1"
+    assert store.count_by_status() == {STATUS_PROCESSED: 1, STATUS_RUNNING: 1, STATUS_PENDING: 1}
+
+    # Leaseless results are only accepted when explicitly allowed
+    assert not store.complete("c.jpg", "r.jpg", True, {})
+    assert store.complete("c.jpg", "r.jpg", True, {}, allow_unleased=True)
+
+
+def test_status_transitions_follow_the_status_machine(store):
+    store.add_pair("c.jpg", "r.jpg")
+    with pytest.raises(InvalidTransitionError):
+        store.set_status(1, STATUS_PROCESSED)
+    with pytest.raises(KeyError):
+        store.set_status(99, STATUS_RUNNING)
+
+    assert store.set_status(1, STATUS_RUNNING)["status"] == STATUS_RUNNING
+    assert store.set_status(1, STATUS_FAILED)["status"] == STATUS_FAILED
+
+
+def test_claims_share_workers_by_weight_after_priority(store):
+    store.set_user_share("alice", weight=2)
+    for index in range(6):
+        store.add_pair(f"alice{index}.jpg", "r.jpg", user="alice", priority=PRIORITY_BULK)
+    for index in range(3):
+        store.add_pair(f"bob{index}.jpg", "r.jpg", user="bob", priority=PRIORITY_BULK)
+    store.add_pair("urgent.jpg", "r.jpg", user="carol", priority=PRIORITY_INTERACTIVE)
+
+    claimed = store.claim("worker-1", limit=7, lease_seconds=60)
+
+    assert [record["user"] for record in claimed] == [
+        "carol",
+        "alice",
+        "bob",
+        "alice",
+        "alice",
+        "bob",
+        "alice",
+    ]
+
+
+def test_max_running_caps_the_claims_of_a_user(store):
+    store.set_user_share("alice", max_running=2)
+    for index in range(4):
+        store.add_pair(f"alice{index}.jpg", "r.jpg", user="alice")
+    store.add_pair("bob.jpg", "r.jpg", user="bob")
+
+    claimed = store.claim("worker-1", limit=10, lease_seconds=60)
+
+    assert sorted(record["user"] for record in claimed) == ["alice", "alice", "bob"]
+    assert store.claim("worker-1", limit=10, lease_seconds=60) == []
+
+
+def test_idle_user_rejoins_at_the_current_virtual_time(store):
+    for index in range(4):
+        store.add_pair(f"alice{index}.jpg", "r.jpg", user="alice")
+    store.claim("worker-1", limit=4, lease_seconds=60)
+
+    # Bob was idle: he does not get four claims in a row to catch up
+    for index in range(4):
+        store.add_pair(f"alice{index + 4}.jpg", "r.jpg", user="alice")
+        store.add_pair(f"bob{index}.jpg", "r.jpg", user="bob")
+    claimed = store.claim("worker-1", limit=4, lease_seconds=60)
+
+    assert sorted(record["user"] for record in claimed) == ["alice", "alice", "bob", "bob"]
+
+
+def test_metrics_follow_claims_and_results(store, monkeypatch):
+    monkeypatch.setattr(server_mock, "store", store)
+    client = TestClient(server_mock.app)
+    queued = server_mock.time_in_queue.snapshot()["count"]
+    completed = server_mock.completed_total.value(worker="worker-m")
+
+    for candidate in ("a.jpg", "b.jpg"):
+        client.post(
+            "/requests_pending_semantic_integrity",
+            json={"candidate_image_path": candidate, "reference_image_path": "r.jpg"},
+        ).raise_for_status()
+    client.post("/semantic_integrity_claims", json={"worker_id": "worker-m", "limit": 1})
+    client.post(
+        "/semantic_integrity_results/batch", json={"results": [result("a.jpg", "worker-m")]}
+    )
+    text = client.get("/metrics").text
+
+    assert server_mock.time_in_queue.snapshot()["count"] == queued + 1
+    assert server_mock.completed_total.value(worker="worker-m") == completed + 1
+    assert 'si_requests{status="pending"} 1' in text
+    assert 'si_requests{status="processed"} 1' in text
+    assert 'si_requests{status="running"} 0' in text
@@ -0,0 +1,135 @@
+"""test_precheck.py: Pre-check and early exit of the tool cascade."""
+
+import shutil
+from dataclasses import dataclass, field
+
+import pytest
+from PIL import Image
+
+import precheck as precheck_module
+from client_mock import SemanticIntegrityChecker, SemanticIntegrityTool
+from feature_cache import FeatureCache
+from precheck import precheck
+
+
+@pytest.fixture
+def images(tmp_path) -> dict[str, str]:
+    """A gradient reference, a byte copy, a re-encoded copy, a retouched and a mirrored image."""
+    row = bytes(value for x in range(32) for value in (8 * x, 255 - 8 * x, 128))
+    reference = Image.frombytes("RGB", (32, 32), row * 32)
+    paths = {name: str(tmp_path / f"{name}.png") for name in ("reference", "reencoded", "edited")}
+    reference.save(paths["reference"], compress_level=9)
+    reference.save(paths["reencoded"], compress_level=1)
+    edited = reference.copy()
+    edited.paste((255, 255, 255), (8, 8, 12, 12))
+    edited.save(paths["edited"])
+    paths["other"] = str(tmp_path / "other.png")
+    reference.transpose(Image.FLIP_LEFT_RIGHT).save(paths["other"])
+    paths["copy"] = str(tmp_path / "copy.png")
+    shutil.copyfile(paths["reference"], paths["copy"])
+    return paths
+
+
+@dataclass
+class FixedTool(SemanticIntegrityTool):
+    """Tool with a fixed prediction and cost that records the images it extracts."""
+
+    label: str = "Tool"
+    prediction: bool = True
+    estimated_cost: float = 1.0
+    extracted: list[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return self.label
+
+    def extract(self, image_path: str) -> str:
+        self.extracted.append(image_path)
+        return image_path
+
+    def compare(self, reference_features, candidate_features) -> dict:
+        return {"prediction": self.prediction, "confidence": 0.9}
+
+
+def test_precheck_decides_unmodified_copies_only(images):
+    assert precheck(images["reference"], images["copy"])["method"] == "identical_bytes"
+    assert precheck(images["reference"], images["reencoded"])["method"] == "identical_pixels"
+    assert precheck(images["reference"], images["edited"]) is None
+
+    # A small retouch keeps the perceptual hash close, mirroring flips every bit of it
+    decision = precheck(images["reference"], images["edited"], max_hash_distance=8)
+    assert decision["method"] == "perceptual_hash" and 0 < decision["hash_distance"] <= 8
+    assert precheck(images["reference"], images["other"], max_hash_distance=8) is None
+
+
+def test_pixel_digests_are_cached_per_image_content(images, monkeypatch):
+    decoded = []
+    load_pixels = precheck_module.load_pixels
+
+    def counting_load_pixels(path):
+        decoded.append(path)
+        return load_pixels(path)
+
+    monkeypatch.setattr(precheck_module, "load_pixels", counting_load_pixels)
+    cache = FeatureCache()
+
+    for candidate in ("reencoded", "edited", "other"):
+        precheck(images["reference"], images[candidate], cache)
+    assert sorted(decoded) == sorted(
+        images[name] for name in ("reference", "reencoded", "edited", "other")
+    )
+
+    # The copy has the content of the reference, whose pixels were already hashed
+    decoded.clear()
+    precheck(images["copy"], images["edited"], cache)
+    assert decoded == []
+
+
+def test_precheck_skips_every_tool(images):
+    tools = [FixedTool(label="Cheap", estimated_cost=0.1), FixedTool(label="Expensive")]
+    checker = SemanticIntegrityChecker(tools=tools)
+
+    prediction, details = checker.evaluate(images["reference"], images["reencoded"])
+
+    assert prediction is True and details["PreCheck"]["method"] == "identical_pixels"
+    assert details["Cheap"] == details["Expensive"] == {"skipped": True, "reason": "precheck"}
+    assert all(tool.extracted == [] for tool in tools)
+
+    # Without the pre-check, the tools run on the same pair
+    checker = SemanticIntegrityChecker(tools=tools, precheck=False)
+    _, details = checker.evaluate(images["reference"], images["reencoded"])
+    assert "PreCheck" not in details and details["Cheap"]["prediction"] is True
+
+
+@pytest.mark.parametrize(
+    "policy, predictions, prediction, ran",
+    [
+        ("min", [False, True, True], False, ["Cheap"]),
+        ("max", [True, False, False], True, ["Cheap"]),
+        ("majority", [True, True, False], True, ["Cheap", "Medium"]),
+        ("majority", [False, True, False], False, ["Cheap", "Medium", "Expensive"]),
+        ("mean", [False, False, False], False, ["Cheap", "Medium", "Expensive"]),
+    ],
+)
+def test_cascade_runs_the_cheapest_tools_until_decided(
+    images, policy, predictions, prediction, ran
+):
+    names = ["Cheap", "Medium", "Expensive"]
+    tools = [
+        FixedTool(label=name, prediction=value, estimated_cost=cost)
+        for name, value, cost in zip(names, predictions, [0.1, 1.0, 10.0])
+    ]
+    # The cascade orders the tools by cost, not by their position in the list
+    checker = SemanticIntegrityChecker(tools=tools[::-1], aggregation_policy=policy)
+
+    result, details = checker.evaluate(images["reference"], images["edited"])
+
+    assert result is prediction
+    assert list(details) == names
+    for tool in tools:
+        if tool.name in ran:
+            assert tool.extracted == [images["reference"], images["edited"]]
+            assert details[tool.name]["prediction"] is tool.prediction
+        else:
+            assert tool.extracted == []
+            assert details[tool.name] == {"skipped": True, "reason": "short_circuit"}
@@ -0,0 +1,154 @@
+"""test_worker.py: Run the worker, its leases and its result buffer against the mock server."""
+
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import client_mock
+import server_mock
+from client_mock import ResultBuffer, SemanticIntegrityChecker, Worker
+from job_store import STATUS_PENDING, STATUS_PROCESSED, STATUS_RUNNING, JobStore
+from load_test import StubTool
+
+SERVER_URL = "http://testserver"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Give the mock server an empty store and route the client's HTTP calls to it."""
+    job_store = JobStore(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(server_mock, "store", job_store)
+    with TestClient(server_mock.app, base_url=SERVER_URL) as client:
+        monkeypatch.setattr(client_mock, "session", client)
+        monkeypatch.setattr(client_mock, "SERVER_URL", SERVER_URL)
+        yield job_store
+
+
+def submit(count: int) -> None:
+    """Add `count` distinct pairs through the API."""
+    for index in range(count):
+        response = client_mock.session.post(
+            f"{SERVER_URL}/requests_pending_semantic_integrity",
+            json={
+                "candidate_image_path": f"candidate_{index}.jpg",
+                "reference_image_path": "r.jpg",
+            },
+        )
+        response.raise_for_status()
+
+
+def wait_until(predicate, timeout: float = 10.0) -> None:
+    """Poll `predicate` until it holds, failing the test after `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "Timed out."
+        time.sleep(0.01)
+
+
+def result(worker_id: str, index: int = 0) -> dict:
+    """Result payload of the pair added by `submit` with this index."""
+    return {
+        "candidate_image_path": f"candidate_{index}.jpg",
+        "reference_image_path": "r.jpg",
+        "overall_prediction": True,
+        "tool_details": {"StubTool": {"prediction": True, "confidence": 1.0}},
+        "worker_id": worker_id,
+    }
+
+
+def payload(index: int) -> dict:
+    """Arguments of `ResultBuffer.add` for the pair added by `submit` with this index."""
+    item = result("worker-1", index)
+    return {
+        "candidate_img": item["candidate_image_path"],
+        "reference_img": item["reference_image_path"],
+        "overall_pred": item["overall_prediction"],
+        "tool_details": item["tool_details"],
+    }
+
+
+def test_worker_claims_evaluates_and_completes_in_batches(store):
+    submit(6)
+    checker = SemanticIntegrityChecker(tools=[StubTool(extract_seconds=0)], precheck=False)
+    worker = Worker(
+        checker,
+        worker_id="worker-1",
+        concurrency=2,
+        max_in_flight=6,
+        long_poll_seconds=0.2,
+        result_batch_size=6,
+        result_flush_seconds=0.2,
+    )
+    posts_before = client_mock.result_posts_total.value()
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    try:
+        wait_until(lambda: store.count(STATUS_PROCESSED) == 6)
+    finally:
+        worker.stop()
+        thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert worker.processed == 6 and worker.failed == 0
+    assert client_mock.result_posts_total.value() - posts_before < 6
+    records, _, _ = store.page(STATUS_PROCESSED)
+    assert all(record["lease_owner"] is None for record in records)
+    assert all(record["tool_details"]["StubTool"]["confidence"] == 1.0 for record in records)
+
+
+def test_expired_lease_is_reclaimed_and_stale_result_rejected(store):
+    submit(1)
+    first = client_mock.claim_pairs("worker-1", limit=1, lease_seconds=0.1)
+    assert len(first) == 1 and first[0]["status"] == STATUS_RUNNING
+
+    time.sleep(0.2)
+    assert client_mock.renew_leases("worker-1", [first[0]["id"]]) == []
+    assert store.count(STATUS_PENDING) == 1
+    second = client_mock.claim_pairs("worker-2", limit=1)
+    assert [item["id"] for item in second] == [first[0]["id"]]
+
+    stale = client_mock.post_semantic_integrity_results_batch([result("worker-1")])
+    assert stale["conflict"] == 1 and stale["results"][0]["status"] == "conflict"
+    assert store.count(STATUS_RUNNING) == 1
+
+    fresh = client_mock.post_semantic_integrity_results_batch([result("worker-2")])
+    assert fresh["processed"] == 1
+    assert store.count(STATUS_PROCESSED) == 1
+
+
+def test_result_buffer_flushes_when_full(store):
+    submit(3)
+    client_mock.claim_pairs("worker-1", limit=3)
+    flushed = []
+    with ResultBuffer(
+        max_items=3,
+        max_delay=60,
+        on_flushed=lambda request_id, status: flushed.append(status),
+        worker_id="worker-1",
+    ) as results:
+        for index in range(3):
+            results.add(index + 1, **payload(index))
+        wait_until(lambda: len(flushed) == 3, timeout=5)
+        assert results.requests_sent == 1
+
+    assert flushed == [STATUS_PROCESSED] * 3
+
+
+def test_result_buffer_flushes_after_max_delay(store):
+    submit(1)
+    client_mock.claim_pairs("worker-1", limit=1)
+    flushed = threading.Event()
+    with ResultBuffer(
+        max_items=100,
+        max_delay=0.3,
+        on_flushed=lambda request_id, status: flushed.set(),
+        worker_id="worker-1",
+    ) as results:
+        started = time.monotonic()
+        results.add(1, **payload(0))
+        assert flushed.wait(timeout=5)
+        assert time.monotonic() - started >= 0.3
+
+    assert store.count(STATUS_PROCESSED) == 1
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""bench_alpha.py: Check the predicted distortion and the alpha selection against real embeddings.
+
+For every demo image and both watermarking methods, the PSNR predicted by the distortion model
+is compared with the PSNR of the actual embedding over a range of alphas. Then the largest alpha
+for the target PSNR is selected and embedded, and the time of the selection is compared with
+the time of one embedding.
+
+Usage:
+    python -m benchmarks.bench_alpha [--target-psnr 38] [--repeat 5]
+"""
+
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from benchmarks.bench_luma import median_seconds, psnr
+from watermarking.strategies.dwt_dct import DWT2DCTWatermarkMethod
+from watermarking.strategies.luma_dwt_dct import LumaDWT2DCTWatermarkMethod
+from watermarking.utils.image_io import load_image
+
+ALPHAS = (0.01, 0.05, 0.1, 0.2, 0.5, 0.9)
+
+
+def main() -> None:
+    """Run the comparison on the demo images and print one line per image and method."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", default="demo/data/*_original.jpg")
+    parser.add_argument("--target-psnr", type=float, default=38.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))
+    if not paths:
+        raise SystemExit(f"No images match {args.images}.")
+    rng = np.random.default_rng(1)
+    watermark = rng.choice([-1, 1], size=255)
+    positions = rng.permutation(np.arange(2, 257))
+    methods = {"rgb": DWT2DCTWatermarkMethod(), "luma": LumaDWT2DCTWatermarkMethod()}
+
+    print(
+        f"{'image':16s} {'method':6s} {'max |error| dB':>14s} {'alpha':>7s} {'PSNR dB':>8s}"
+        f" {'select ms':>10s} {'embed ms':>9s}"
+    )
+    for path in paths:
+        image = load_image(path)
+        for name, method in methods.items():
+            # The model is measured against the planes it embeds into, see `DistortionModel`
+            reference = method.embedding_planes(image) * 255 if name == "rgb" else image
+            model = method.distortion_model(image, watermark, positions)
+            errors = [
+                model.psnr(alpha)
+                - psnr(reference, method.embed(image, watermark, positions, alpha)[0])
+                for alpha in ALPHAS
+            ]
+
+            try:
+                alpha = method.select_alpha(image, watermark, positions, args.target_psnr)
+            except ValueError:
+                alpha, achieved = float("nan"), "-"
+            else:
+                watermarked, _ = method.embed(image, watermark, positions, alpha)
+                achieved = f"{psnr(reference, watermarked):.2f}"
+
+            # Time the selection with a target that is always reachable
+            reachable = model.psnr(ALPHAS[-1])
+            select_seconds = median_seconds(
+                lambda m=method, t=reachable: m.select_alpha(image, watermark, positions, t),
+                args.repeat,
+            )
+            embed_seconds = median_seconds(
+                lambda m=method: m.embed(image, watermark, positions, 0.1), args.repeat
+            )
+            print(
+                f"{os.path.basename(path):16s} {name:6s} {np.max(np.abs(errors)):14.3f}"
+                f" {alpha:7.4f} {achieved:>8s} {select_seconds * 1000:10.1f}"
+                f" {embed_seconds * 1000:9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+"""bench_daemon.py: Compare one process per job with jobs sent to the warm daemon.
+
+The cold variant starts a fresh interpreter for every job, which imports the watermarking
+modules, reads and parses the keys and then embeds one image, as `main.py` does. The warm
+variant starts the daemon once and sends the same jobs through `DaemonClient`.
+
+Usage:
+    python -m benchmarks.bench_daemon [--image image.png] [--jobs 10] [--clients 2]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from watermarking.service.client import DaemonClient
+
+COLD_JOB = """
+from watermarking.generator.sha256 import SHA256WatermarkGenerator
+from watermarking.positions.sha256 import SHA256Positions
+from watermarking.strategies.dwt_dct import DWT2DCTWatermarkMethod
+from watermarking.utils.image_io import load_image
+from watermarking.utils.key_manager import KeyStore
+from watermarking.utils.preprocess import normalize_array
+import cv2
+
+private_key, public_key = KeyStore({key_dir!r}).get_keys()
+image = load_image({image!r})
+watermark = SHA256WatermarkGenerator().generate(image, private_key, 255)
+positions = SHA256Positions().generate_positions(public_key, 255)
+watermarked, _ = DWT2DCTWatermarkMethod().embed(image, watermark, positions, 0.1)
+cv2.imwrite({output!r}, cv2.cvtColor(normalize_array(watermarked), cv2.COLOR_RGB2BGR))
+"""
+
+
+def wait_for_socket(path: str, timeout: float = 60.0) -> None:
+    """Wait until the daemon accepts connections.
+
+    Args:
+        path (str): Socket path of the daemon.
+        timeout (float, optional): Seconds to wait. Defaults to 60.
+
+    Raises:
+        TimeoutError: If the daemon does not come up in time.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with DaemonClient(path) as client:
+                client.ping()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"The daemon did not listen on {path} within {timeout}s.")
+
+
+def main() -> None:
+    """Run both variants and report per-job latencies."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", default="image.png")
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=2, help="Concurrent warm clients.")
+    args = parser.parse_args()
+    image = os.path.abspath(args.image)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        key_dir = os.path.join(workdir, "keys")
+        output = os.path.join(workdir, "watermarked.png")
+
+        cold = []
+        for _ in range(args.jobs):
+            start = time.perf_counter()
+            code = COLD_JOB.format(key_dir=key_dir, image=image, output=output)
+            subprocess.run([sys.executable, "-c", code], check=True)
+            cold.append(time.perf_counter() - start)
+
+        socket_path = os.path.join(workdir, "daemon.sock")
+        command = [
+            sys.executable,
+            "-m",
+            "watermarking.service.daemon",
+            "--socket",
+            socket_path,
+            "--key-dir",
+            key_dir,
+            "--registry-dir",
+            os.path.join(workdir, "registry"),
+        ]
+        daemon = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        try:
+            start = time.perf_counter()
+            wait_for_socket(socket_path)
+            startup = time.perf_counter() - start
+
+            warm, work = [], []
+            with DaemonClient(socket_path) as client:
+                for _ in range(args.jobs):
+                    start = time.perf_counter()
+                    client.embed(image, output, register=False)
+                    warm.append(time.perf_counter() - start)
+                    work.append(client.last_response["work_seconds"])
+
+            def send(count: int) -> None:
+                with DaemonClient(socket_path) as client:
+                    for _ in range(count):
+                        client.embed(image, output, register=False)
+
+            threads = [
+                threading.Thread(target=send, args=(args.jobs,)) for _ in range(args.clients)
+            ]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            concurrent_rate = args.jobs * args.clients / (time.perf_counter() - start)
+
+            with DaemonClient(socket_path) as client:
+                client.shutdown()
+        finally:
+            daemon.wait(timeout=30)
+
+    print(f"{args.jobs} embed jobs on {args.image}")
+    print(f"{'fresh process per job':32s} {np.median(cold) * 1000:8.1f} ms median")
+    print(f"{'warm daemon, round trip':32s} {np.median(warm) * 1000:8.1f} ms median")
+    print(f"{'warm daemon, work only':32s} {np.median(work) * 1000:8.1f} ms median")
+    print(f"{'daemon startup (once)':32s} {startup * 1000:8.1f} ms")
+    print(f"{f'{args.clients} concurrent clients':32s} {concurrent_rate:8.2f} jobs/s")
+
+
+if __name__ == "__main__":
+    main()
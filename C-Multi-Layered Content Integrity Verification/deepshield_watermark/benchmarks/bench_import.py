@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""bench_import.py: Measure the import cost of the watermarking core.
+
+Each module is imported in a fresh interpreter so that nothing is cached. The script exits
+with a non-zero status if an import exceeds the time budget or pulls in a heavy dependency.
+
+Usage:
+    python -m benchmarks.bench_import [--budget-seconds 2.0] [--repeat 3]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+# Modules the watermarking core must stay importable with
+CORE_MODULES = [
+    "watermarking.strategies.dwt_dct",
+    "watermarking.generator.sha256",
+    "watermarking.positions.sha256",
+    "watermarking.utils.preprocess",
+]
+
+# Dependencies that must never be loaded by importing the core
+FORBIDDEN_MODULES = ["torch", "torchvision", "PIL", "cv2"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def probe(module: str) -> dict:
+    """Import `module` in a fresh interpreter and report its import time and loaded modules.
+
+    Args:
+        module (str): Dotted module name to import.
+
+    Returns:
+        dict: The import time in seconds and the names of all loaded modules.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main() -> None:
+    """Run the import benchmark and check the loaded-module set."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-seconds", type=float, default=2.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    failed = False
+    for module in CORE_MODULES:
+        runs = [probe(module) for _ in range(args.repeat)]
+        best = min(run["seconds"] for run in runs)
+        loaded = {name.split(".")[0] for name in runs[0]["modules"]}
+        heavy = sorted(loaded.intersection(FORBIDDEN_MODULES))
+
+        status = "ok"
+        if heavy or best > args.budget_seconds:
+            status = "FAIL"
+            failed = True
+        print(f"{module:40s} {best * 1000:8.1f} ms  heavy={heavy or '-'}  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""bench_luma.py: Compare the RGB and the luma-only DWT+DCT watermarking methods.
+
+Both methods watermark the demo images with the same watermark and positions. The table
+reports embed and extract time, the size of the ground truth matrix, the PSNR of the
+watermarked image, and the similarity score after common distortions (the mean over the images,
+with the number of images above the threshold in parentheses).
+
+Usage:
+    python -m benchmarks.bench_luma [--alpha 0.1] [--repeat 5]
+"""
+
+import argparse
+import glob
+import time
+from typing import Callable
+
+import cv2
+import numpy as np
+
+from watermarking.strategies.dwt_dct import DWT2DCTWatermarkMethod
+from watermarking.strategies.luma_dwt_dct import LumaDWT2DCTWatermarkMethod
+from watermarking.utils.image_io import load_image
+from watermarking.utils.preprocess import normalize_array
+
+
+def jpeg(quality: int) -> Callable[[np.ndarray], np.ndarray]:
+    """Re-encode as JPEG with the given quality."""
+
+    def attack(image: np.ndarray) -> np.ndarray:
+        bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        _, encoded = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return cv2.cvtColor(cv2.imdecode(encoded, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+    return attack
+
+
+def noise(sigma: float) -> Callable[[np.ndarray], np.ndarray]:
+    """Add Gaussian noise with a fixed seed."""
+
+    def attack(image: np.ndarray) -> np.ndarray:
+        noisy = image + np.random.default_rng(0).normal(0, sigma, image.shape)
+        return np.clip(np.rint(noisy), 0, 255).astype(np.uint8)
+
+    return attack
+
+
+def rescale(factor: float) -> Callable[[np.ndarray], np.ndarray]:
+    """Downscale and upscale back to the original size."""
+
+    def attack(image: np.ndarray) -> np.ndarray:
+        height, width = image.shape[:2]
+        small = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    return attack
+
+
+ATTACKS: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "none": lambda image: image,
+    "jpeg 90": jpeg(90),
+    "jpeg 75": jpeg(75),
+    "jpeg 50": jpeg(50),
+    "noise 4": noise(4),
+    "brightness +20": lambda image: np.clip(image.astype(int) + 20, 0, 255).astype(np.uint8),
+    "contrast x1.2": lambda image: np.clip(np.rint(image * 1.2 - 25), 0, 255).astype(np.uint8),
+    "blur 3x3": lambda image: cv2.GaussianBlur(image, (3, 3), 0),
+    "rescale 0.5": rescale(0.5),
+}
+
+
+def median_seconds(function: Callable[[], object], repeat: int) -> float:
+    """Median wall-clock time of `repeat` calls."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def psnr(reference: np.ndarray, image: np.ndarray) -> float:
+    """Peak signal-to-noise ratio of two uint8 images in dB."""
+    mse = np.mean((reference.astype(np.float64) - image) ** 2)
+    return float("inf") if mse == 0 else float(10 * np.log10(255.0**2 / mse))
+
+
+def main() -> None:
+    """Run both methods on the demo images and print the comparison."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", default="demo/data/*_original.jpg")
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--threshold", type=float, default=80.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))
+    if not paths:
+        raise SystemExit(f"No images match {args.images}.")
+    images = [load_image(path) for path in paths]
+    rng = np.random.default_rng(1)
+    watermark = rng.choice([-1, 1], size=255)
+    positions = rng.permutation(np.arange(2, 257))
+    methods = {"rgb": DWT2DCTWatermarkMethod(), "luma": LumaDWT2DCTWatermarkMethod()}
+
+    rows: dict[str, dict[str, str]] = {}
+    for name, method in methods.items():
+        embed_seconds, extract_seconds, gt_bytes, psnrs = [], [], [], []
+        scores: dict[str, list[float]] = {attack: [] for attack in ATTACKS}
+        for image in images:
+
+            def embed(image=image, method=method):
+                return method.embed(image, watermark, positions, args.alpha)
+
+            watermarked, ground_truth = embed()
+            watermarked = normalize_array(watermarked)
+            embed_seconds.append(median_seconds(embed, args.repeat))
+            extract_seconds.append(
+                median_seconds(
+                    lambda m=method, w=watermarked: m.extract_watermark_matrix(w), args.repeat
+                )
+            )
+            gt_bytes.append(ground_truth.size * ground_truth.itemsize)
+            psnrs.append(psnr(image, watermarked))
+            for attack, distort in ATTACKS.items():
+                extracted = method.extract_watermark_matrix(distort(watermarked))
+                _, similarity = method.is_similar(extracted, ground_truth, args.threshold)
+                scores[attack].append(similarity)
+
+        rows[name] = {
+            "embed ms": f"{np.mean(embed_seconds) * 1000:.1f}",
+            "extract ms": f"{np.mean(extract_seconds) * 1000:.1f}",
+            "GT KiB": f"{np.mean(gt_bytes) / 1024:.1f}",
+            "PSNR dB": f"{np.mean(psnrs):.2f}",
+        }
+        for attack, values in scores.items():
+            passed = sum(value > args.threshold for value in values)
+            rows[name][attack] = f"{np.mean(values):5.1f} ({passed}/{len(values)})"
+
+    print(f"\n{len(images)} images, alpha {args.alpha}, threshold {args.threshold}")
+    print(f"{'':16s}" + "".join(f"{name:>16s}" for name in methods))
+    for key in rows["rgb"]:
+        print(f"{key:16s}" + "".join(f"{rows[name][key]:>16s}" for name in methods))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""bench_normalize.py: Compare the fused `normalize_array` with the original implementation.
+
+Usage:
+    python -m benchmarks.bench_normalize [--height 1080] [--width 1920] [--repeat 20]
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from watermarking.utils.preprocess import normalize_array
+
+
+def normalize_array_legacy(arr, scale=255, dtype=np.uint8) -> np.ndarray:
+    """The original three-temporary implementation, kept as the baseline."""
+    arr = arr - np.min(arr)
+    arr = (arr / np.max(arr)) * scale
+    return arr.astype(dtype)
+
+
+def best_of(func, repeat: int) -> float:
+    """Return the fastest of `repeat` single runs of `func` in seconds."""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main() -> None:
+    """Time both implementations on the call patterns used by embedding and image loading."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    shape = (args.height, args.width)
+    image = rng.integers(10, 240, size=shape + (3,), dtype=np.uint8)
+    channel64 = rng.normal(size=shape)
+    channel32 = channel64.astype(np.float32)
+
+    cases = [
+        # (name, input, kwargs)
+        ("uint8 image -> uint8", image, {}),
+        ("uint8 channel view -> float64", image[:, :, 0], {"scale": 1, "dtype": np.float64}),
+        ("float64 channel -> uint8", channel64, {}),
+        ("float64 channel -> float64", channel64, {"scale": 1, "dtype": np.float64}),
+        ("float32 channel -> float32", channel32, {"scale": 1, "dtype": np.float32}),
+    ]
+
+    print(f"{'case':32s} {'legacy ms':>10s} {'fused ms':>10s} {'out= ms':>10s} {'speedup':>8s}")
+    for name, arr, kwargs in cases:
+        expected = normalize_array_legacy(arr, **kwargs)
+        assert np.array_equal(normalize_array(arr, **kwargs), expected), name
+
+        out = np.empty_like(expected)
+        scale = kwargs.get("scale", 255)
+
+        legacy = best_of(lambda: normalize_array_legacy(arr, **kwargs), args.repeat)
+        fused = best_of(lambda: normalize_array(arr, **kwargs), args.repeat)
+        in_out = best_of(lambda: normalize_array(arr, scale=scale, out=out), args.repeat)
+        print(
+            f"{name:32s} {legacy * 1e3:10.2f} {fused * 1e3:10.2f} {in_out * 1e3:10.2f} "
+            f"{legacy / fused:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
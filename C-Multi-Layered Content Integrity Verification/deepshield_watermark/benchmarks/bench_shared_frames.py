@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""bench_shared_frames.py: Compare pickled and shared memory image transfer to worker processes.
+
+The same images are sent to a process pool in two ways: pickled (the image travels to the
+worker and the result travels back through a pipe), and through a `SharedFramePool` (the worker
+receives descriptors and writes its result into an output slot). Each mode runs three tasks:
+"copy" (the worker returns its input, measuring the transfer alone), "embed" and "extract". The
+results of both modes must be identical.
+
+Usage:
+    python -m benchmarks.bench_shared_frames [--images 20] [--width 3840] [--height 2160]
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable
+
+import numpy as np
+
+from watermarking.strategies.dwt_dct import DWT2DCTWatermarkMethod
+from watermarking.utils.preprocess import normalize_array
+from watermarking.utils.shared_frames import FrameRef, SharedFramePool, attach
+
+ALPHA = 0.1
+WATERMARK = np.random.default_rng(1).choice([-1, 1], size=255)
+POSITIONS = np.random.default_rng(2).permutation(np.arange(2, 257))
+
+
+def copy_task(image: np.ndarray) -> np.ndarray:
+    """Return the image, so that only the transfer is measured."""
+    return image.copy()
+
+
+def embed_task(image: np.ndarray) -> np.ndarray:
+    """Embed a fixed watermark and return the uint8 image."""
+    watermarked, _ = DWT2DCTWatermarkMethod().embed(image, WATERMARK, POSITIONS, ALPHA)
+    return normalize_array(watermarked)
+
+
+def extract_task(image: np.ndarray) -> np.ndarray:
+    """Extract the watermark matrix."""
+    return DWT2DCTWatermarkMethod().extract_watermark_matrix(image)
+
+
+TASKS: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "copy": copy_task,
+    "embed": embed_task,
+    "extract": extract_task,
+}
+
+
+def run_shared(task: str, image_ref: FrameRef, output_ref: FrameRef) -> None:
+    """Run a task on shared memory slots, writing its result into the output slot."""
+    np.copyto(attach(output_ref), TASKS[task](attach(image_ref)))
+
+
+def output_spec(task: str, shape: tuple[int, ...]) -> tuple[tuple[int, ...], np.dtype]:
+    """Shape and dtype of the result of a task, computed on a small sample."""
+    result = TASKS[task](np.zeros(shape, dtype=np.uint8))
+    return result.shape, result.dtype
+
+
+def throughput(
+    submit: Callable[[int], Future], collect: Callable[[int, Future], None], count: int, window: int
+) -> float:
+    """Keep `window` tasks in flight and return the images per second.
+
+    Args:
+        submit (Callable[[int], Future]): Starts the task of an image.
+        collect (Callable[[int, Future], None]): Receives the finished task of an image.
+        count (int): Number of images.
+        window (int): Tasks in flight.
+
+    Returns:
+        float: Images per second.
+    """
+    pending: deque[tuple[int, Future]] = deque()
+    start = time.perf_counter()
+    for index in range(count):
+        if len(pending) >= window:
+            collect(*pending.popleft())
+        pending.append((index, submit(index)))
+    while pending:
+        collect(*pending.popleft())
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Run every task in both modes and report their throughput."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tasks", default="copy,embed,extract")
+    args = parser.parse_args()
+
+    shape = (args.height, args.width, 3)
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(4)]
+    window = 2 * args.workers
+    print(
+        f"{args.images} images of {args.width}x{args.height} "
+        f"({images[0].nbytes / 2**20:.1f} MiB), {args.workers} workers"
+    )
+
+    # The frame pool must exist before the workers start, see `shared_frames`
+    with SharedFramePool(2 * window) as frames, ProcessPoolExecutor(args.workers) as executor:
+        for task in args.tasks.split(","):
+            out_shape, out_dtype = output_spec(task, shape)
+            pickled_results: dict[int, np.ndarray] = {}
+            shared_results: dict[int, np.ndarray] = {}
+
+            def collect_pickled(index: int, future: Future) -> None:
+                pickled_results[index % len(images)] = future.result()
+
+            pickled = throughput(
+                lambda index: executor.submit(TASKS[task], images[index % len(images)]),
+                collect_pickled,
+                args.images,
+                window,
+            )
+
+            in_flight: dict[int, tuple[FrameRef, FrameRef]] = {}
+
+            def submit_shared(index: int) -> Future:
+                image_ref = frames.put(images[index % len(images)])
+                output_ref = frames.acquire(out_shape, out_dtype)
+                in_flight[index] = (image_ref, output_ref)
+                return executor.submit(run_shared, task, image_ref, output_ref)
+
+            def collect_shared(index: int, future: Future) -> None:
+                image_ref, output_ref = in_flight.pop(index)
+                future.result()
+                shared_results[index % len(images)] = frames.array(output_ref).copy()
+                frames.release(image_ref)
+                frames.release(output_ref)
+
+            shared = throughput(submit_shared, collect_shared, args.images, window)
+
+            for index, result in pickled_results.items():
+                assert np.array_equal(result, shared_results[index]), f"{task} results differ"
+            print(
+                f"{task:8s} pickled {pickled:7.2f} images/s   shared memory {shared:7.2f} images/s"
+                f"   ({shared / pickled:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
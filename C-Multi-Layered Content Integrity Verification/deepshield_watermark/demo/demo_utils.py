@@ -1,13 +1,15 @@
+import os
 from typing import Any
 
-import cv2
 import numpy as np
 from PIL import Image
 
 from watermarking.generator.sha256 import SHA256WatermarkGenerator
 from watermarking.positions.sha256 import SHA256Positions
 from watermarking.strategies.dwt_dct import DWT2DCTWatermarkMethod
-from watermarking.utils.key_manager import generate_keys
+from watermarking.utils.image_io import ImageSource
+from watermarking.utils.image_io import load_image as _load_image
+from watermarking.utils.key_manager import KeyStore
 from watermarking.utils.preprocess import normalize_array
 
 # Initialize watermark generator, positions generator, and watermarking method
@@ -15,25 +17,22 @@ watermark_generator = SHA256WatermarkGenerator()
 watermark_positions_gen = SHA256Positions()
 watermarking_method = DWT2DCTWatermarkMethod()
 
-# Generate public/private key
-private_key, public_key = generate_keys()
+# Public/private key, loaded (or generated) on first use instead of at import time.
+# Set DEEPSHIELD_KEY_DIR to persist and reuse the key pair across runs.
+key_store = KeyStore(key_dir=os.environ.get("DEEPSHIELD_KEY_DIR"))
 
-def load_image(img_path: str) -> np.ndarray:
-    """Load an image from the filesystem, convert it to RGB, and normalize it.
+
+def load_image(img_path: ImageSource) -> np.ndarray:
+    """Load an image from the filesystem (or from its encoded bytes), convert it to RGB, and
+    normalize it.
 
     Args:
-        img_path (str): The file path to the image.
+        img_path (ImageSource): The file path to the image, or the encoded image bytes.
 
     Returns:
         np.ndarray: The normalized image as a NumPy array.
     """
-    # Read an image from filesystem
-    image = cv2.imread(img_path)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)  # Convert to RGB
-    image = Image.fromarray(image)
-    image = image.convert("RGB")
-    image = normalize_array(image)
-    return image
+    return _load_image(img_path)
 
 
 def watermark_image(image: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
@@ -56,6 +55,8 @@ def watermark_image(image: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
     # - The choice of α should balance invisibility and robustness, depending on the application's security and perceptual needs.
     alpha = 0.9
 
+    private_key, public_key = key_store.get_keys()
+
     # Generate the watermark based on the image and private key
     watermark = watermark_generator.generate(
         image=image, private_key=private_key, watermark_length=watermark_length
@@ -1,16 +1,23 @@
 import json
+from typing import Any, Optional
 
 import numpy as np
 from demo.demo_utils import load_image
 from PIL import Image
 
 
-def register_image(watermarked_image: np.ndarray, ground_truth_watermark: np.ndarray) -> bool:
+def register_image(
+    watermarked_image: np.ndarray,
+    ground_truth_watermark: np.ndarray,
+    inclusion_proof: Optional[dict[str, Any]] = None,
+) -> bool:
     """Register a watermarked image given the image array and its ground truth watermark.
 
     Args:
         watermarked_image (np.ndarray): The watermarked image as a NumPy array.
         ground_truth_watermark (np.ndarray): The ground truth watermark as a NumPy array.
+        inclusion_proof (Optional[dict[str, Any]], optional): Serialized `MerkleProof` when the
+            watermark was generated in a signed batch. Defaults to None.
 
     Returns:
         bool: True if the registration is successful, False otherwise.
@@ -1,9 +1,9 @@
-import cv2
 from PIL import Image
 
 from watermarking.generator.sha256 import SHA256WatermarkGenerator
 from watermarking.positions.sha256 import SHA256Positions
 from watermarking.strategies.dwt_dct import DWT2DCTWatermarkMethod
+from watermarking.utils.image_io import load_image
 from watermarking.utils.key_manager import generate_keys
 from watermarking.utils.preprocess import normalize_array
 
@@ -27,14 +27,11 @@ def main() -> None:
     # - A lower α value (e.g., 0.05) results in a less visible watermark, reducing potential distortion but making extraction more difficult.
     # - A higher α value (e.g., 0.2) increases the visibility of the watermark, making it easier to extract but potentially distorting the original image.
     # - The choice of α should balance invisibility and robustness, depending on the application's security and perceptual needs.
+    # - `watermarking_method.select_alpha(image, watermark, watermark_positions, target_psnr)` finds the largest α whose predicted PSNR meets a target.
     alpha = 0.1
 
     # Read an image and insert the watermark inside
-    original_image = cv2.imread("image.png")
-    original_image = cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB)  # Convert to RGB
-    original_image = Image.fromarray(original_image)
-    original_image = original_image.convert("RGB")
-    original_image = normalize_array(original_image)
+    original_image = load_image("image.png")
 
     # Generate the watermark based on the image and private key
     watermark = watermark_generator.generate(
@@ -59,11 +56,7 @@ def main() -> None:
     reconstructed_image.save("watermarked_image.png")
 
     # Load a watermarked image and verify if watermark exists or not
-    candidate_image = cv2.imread("watermarked_image.png")
-    candidate_image = cv2.cvtColor(candidate_image, cv2.COLOR_BGR2RGB)
-    candidate_image = Image.fromarray(candidate_image)
-    candidate_image = candidate_image.convert("RGB")
-    candidate_image = normalize_array(candidate_image)
+    candidate_image = load_image("watermarked_image.png")
 
     extracted_watermark = watermarking_method.extract_watermark_matrix(candidate_image)
 
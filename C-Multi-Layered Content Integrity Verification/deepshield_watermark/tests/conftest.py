@@ -0,0 +1,6 @@
+"""conftest.py: Make the watermarking and benchmarks packages importable from the tests."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,152 @@
+"""test_bulk_register.py: Resume, retry and memory bound of the bulk registration pipeline."""
+
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+from Crypto.PublicKey import RSA
+
+from watermarking.service import bulk_register
+from watermarking.service.bulk_register import BulkRegistrar, list_directory, read_checkpoint
+from watermarking.utils.registry import WatermarkRegistry
+from watermarking.utils.shared_frames import SharedFramePool
+
+WATERMARK_LENGTH = 64
+
+
+@pytest.fixture(scope="module")
+def keys() -> tuple[bytes, bytes]:
+    """A small RSA key pair."""
+    key = RSA.generate(1024)
+    return key.export_key(), key.publickey().export_key()
+
+
+@pytest.fixture
+def images(tmp_path) -> str:
+    """Directory of six small PNG images."""
+    directory = tmp_path / "images"
+    directory.mkdir()
+    rng = np.random.default_rng(0)
+    for index in range(6):
+        image = rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)
+        cv2.imwrite(str(directory / f"image_{index}.png"), image)
+    return str(directory)
+
+
+def registrar(tmp_path, keys, **kwargs) -> BulkRegistrar:
+    """Registrar with two embedding processes, writing to a registry below `tmp_path`."""
+    private_key, public_key = keys
+    kwargs.setdefault("workers", 2)
+    return BulkRegistrar(
+        WatermarkRegistry(str(tmp_path / "registry")),
+        private_key,
+        public_key,
+        watermark_length=WATERMARK_LENGTH,
+        batch_size=2,
+        **kwargs,
+    )
+
+
+class RecordingFramePool(SharedFramePool):
+    """Shared frame pool that keeps track of its instances and of its busiest moment."""
+
+    instances: list["RecordingFramePool"] = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.peak = 0
+        self.instances.append(self)
+
+    def acquire(self, *args, **kwargs):
+        ref = super().acquire(*args, **kwargs)
+        self.peak = max(self.peak, self.in_use)
+        return ref
+
+
+def crash(ref, alpha):
+    # Kill the worker process in the middle of its task
+    os._exit(1)
+
+
+def test_killed_worker_releases_the_slots_of_its_images(tmp_path, keys, images, monkeypatch):
+    monkeypatch.setattr(RecordingFramePool, "instances", [])
+    monkeypatch.setattr(bulk_register, "SharedFramePool", RecordingFramePool)
+    monkeypatch.setattr(bulk_register, "_sign_and_embed_shared", crash)
+    items = list_directory(images, str(tmp_path / "out"))
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+
+    stats = registrar(tmp_path, keys, max_in_flight=3).run(items, checkpoint)
+
+    assert stats.registered == 0
+    assert sorted(stats.failed) == [item.image_id for item in items]
+    assert all(error.startswith("BrokenProcessPool") for error in stats.failed.values())
+    [pool] = RecordingFramePool.instances
+    assert pool.in_use == 0
+    assert not os.path.exists(checkpoint)
+
+
+def test_rerun_resumes_after_the_checkpoint(tmp_path, keys, images):
+    items = list_directory(images, str(tmp_path / "out"))
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+    first = registrar(tmp_path, keys).run(items[:3], checkpoint)
+    assert (first.registered, first.skipped, first.failed) == (3, 0, {})
+    # A crash while appending leaves a line cut short
+    with open(checkpoint, "a", encoding="utf-8") as f:
+        f.write('{"image_id": "image_3", "out')
+
+    second = registrar(tmp_path, keys).run(items, checkpoint)
+
+    assert (second.registered, second.skipped, second.failed) == (3, 3, {})
+    assert read_checkpoint(checkpoint) == {item.image_id for item in items}
+    assert len(WatermarkRegistry(str(tmp_path / "registry"))) == 6
+    assert all(os.path.exists(item.output) for item in items)
+
+
+@pytest.mark.parametrize("transport", bulk_register.TRANSPORTS)
+def test_failed_image_is_retried_by_the_next_run(tmp_path, keys, images, transport):
+    items = list_directory(images, str(tmp_path / "out"))
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+    broken = items[2]
+    with open(broken.source, "rb") as f:
+        content = f.read()
+    with open(broken.source, "wb") as f:
+        f.write(b"not an image")
+
+    first = registrar(tmp_path, keys, transport=transport).run(items, checkpoint)
+    assert first.registered == 5 and list(first.failed) == [broken.image_id]
+    assert first.failed[broken.image_id].startswith("ValueError")
+    assert broken.image_id not in read_checkpoint(checkpoint)
+
+    with open(broken.source, "wb") as f:
+        f.write(content)
+    second = registrar(tmp_path, keys, transport=transport).run(items, checkpoint)
+
+    assert (second.registered, second.skipped, second.failed) == (1, 5, {})
+    assert WatermarkRegistry(str(tmp_path / "registry")).get(broken.image_id) is not None
+
+
+def test_images_in_flight_stay_below_the_bound(tmp_path, keys, images, monkeypatch):
+    # Give the pool spare slots, so that only `max_in_flight` limits the images in flight
+    monkeypatch.setattr(RecordingFramePool, "instances", [])
+    monkeypatch.setattr(
+        bulk_register, "SharedFramePool", lambda slots: RecordingFramePool(4 * slots)
+    )
+    # A slow encoder makes the decoded images pile up
+    imwrite = cv2.imwrite
+
+    def slow_imwrite(*args, **kwargs):
+        time.sleep(0.1)
+        return imwrite(*args, **kwargs)
+
+    monkeypatch.setattr(bulk_register.cv2, "imwrite", slow_imwrite)
+    items = list_directory(images, str(tmp_path / "out"))
+
+    stats = registrar(tmp_path, keys, max_in_flight=3, encode_threads=1).run(
+        items, str(tmp_path / "checkpoint.jsonl")
+    )
+
+    assert stats.registered == 6
+    [pool] = RecordingFramePool.instances
+    assert pool.peak == 3 and pool.in_use == 0
@@ -0,0 +1,26 @@
+"""test_core_imports.py: The watermarking core must import without the heavy dependencies."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.bench_import import CORE_MODULES, FORBIDDEN_MODULES
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("module", CORE_MODULES)
+def test_core_module_does_not_load_heavy_dependencies(module):
+    # A fresh interpreter, since this one may have loaded anything already
+    probe = (
+        f"import sys, {module}\n"
+        "print('\\n'.join(sorted({name.split('.')[0] for name in sys.modules})))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", probe], cwd=PROJECT_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    loaded = set(output.split())
+
+    assert loaded.isdisjoint(FORBIDDEN_MODULES), sorted(loaded.intersection(FORBIDDEN_MODULES))
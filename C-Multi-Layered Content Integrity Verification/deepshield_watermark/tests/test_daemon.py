@@ -0,0 +1,150 @@
+"""test_daemon.py: Protocol of the watermarking daemon and its client over a UNIX socket."""
+
+import base64
+import json
+import socket
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from watermarking.service.client import DaemonClient, DaemonError
+from watermarking.service.daemon import WatermarkDaemon, WatermarkService
+from watermarking.utils.key_manager import KeyStore
+
+
+@pytest.fixture(scope="module")
+def service(tmp_path_factory):
+    """A warm service with a small key pair and an empty registry."""
+    key_dir = str(tmp_path_factory.mktemp("keys"))
+    KeyStore(key_dir, key_size=1024).get_keys()
+    service = WatermarkService(
+        key_dir, str(tmp_path_factory.mktemp("registry")), workers=2, watermark_length=64
+    )
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def socket_path(tmp_path_factory) -> str:
+    """A socket path short enough for AF_UNIX."""
+    return str(tmp_path_factory.mktemp("sock") / "daemon.sock")
+
+
+@pytest.fixture
+def daemon(service, socket_path):
+    """A daemon serving `service` on `socket_path`."""
+    server = WatermarkDaemon(socket_path, service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join(timeout=5)
+
+
+def send_lines(socket_path: str, *lines: bytes) -> list[dict]:
+    """Send raw request lines on one connection and read one response per line."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.settimeout(10)
+        reader = connection.makefile("rb")
+        responses = []
+        for line in lines:
+            connection.sendall(line + b"\n")
+            responses.append(json.loads(reader.readline()))
+        return responses
+
+
+def png_bytes(seed: int = 0) -> bytes:
+    """A small encoded RGB image."""
+    image = np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+def test_malformed_requests_get_an_error_and_keep_the_connection(daemon, socket_path):
+    not_json, not_an_object, unknown, ping = send_lines(
+        socket_path, b"{not json", b"[1, 2]", b'{"op": "fly", "id": 7}', b'{"op": "ping"}'
+    )
+
+    assert not_json["ok"] is False and not_json["error_type"] == "ValueError"
+    assert not_an_object["ok"] is False and "JSON object" in not_an_object["error"]
+    assert unknown == {
+        "id": 7,
+        "ok": False,
+        "error": "Unknown operation 'fly'.",
+        "error_type": "ValueError",
+        "work_seconds": unknown["work_seconds"],
+        "queue_seconds": unknown["queue_seconds"],
+    }
+    assert ping["ok"] is True and "pid" in ping["result"]
+
+
+def test_client_raises_the_errors_of_the_daemon(daemon, socket_path):
+    with DaemonClient(socket_path, timeout=10) as client:
+        with pytest.raises(DaemonError, match="KeyError") as error:
+            client.verify(png_bytes(), image_id="never-registered")
+        assert error.value.error_type == "KeyError"
+
+        with pytest.raises(DaemonError, match="needs 'image'"):
+            client.request("verify")
+
+        # The connection stays usable after an error
+        assert client.ping()["pid"] > 0
+
+
+def test_embedded_image_verifies_against_its_record(daemon, socket_path):
+    with DaemonClient(socket_path, timeout=30) as client:
+        embedded = client.embed(png_bytes(1), image_id="first")
+        assert (embedded["image_id"], embedded["registered"]) == ("first", True)
+
+        result = client.verify(base64.b64decode(embedded["image_b64"]), image_id="first")
+
+    assert result["authentic"] and result["image_id"] == "first"
+
+
+def test_stats_count_only_the_jobs_in_flight(daemon, service, socket_path, monkeypatch):
+    with DaemonClient(socket_path, timeout=10) as client:
+        assert client.stats()["in_flight"] == 0
+
+        started, release = threading.Event(), threading.Event()
+
+        def blocked(request):
+            started.set()
+            release.wait(timeout=10)
+            return {}
+
+        monkeypatch.setitem(service.handlers, "embed", blocked)
+        thread = threading.Thread(target=send_lines, args=(socket_path, b'{"op": "embed"}'))
+        thread.start()
+        try:
+            assert started.wait(timeout=10)
+            assert client.stats()["in_flight"] == 1
+        finally:
+            release.set()
+            thread.join(timeout=10)
+
+        stats = client.stats()
+    assert stats["in_flight"] == 0
+    assert stats["completed"]["stats"] >= 2 and stats["completed"]["embed"] >= 1
+
+
+def test_stale_socket_is_taken_over(service, socket_path):
+    # A socket file left behind by a daemon that did not exit cleanly
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+
+    server = WatermarkDaemon(socket_path, service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with DaemonClient(socket_path, timeout=10) as client:
+            assert client.ping()["pid"] > 0
+        with pytest.raises(RuntimeError, match="already listening"):
+            WatermarkDaemon(socket_path, service)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
@@ -0,0 +1,25 @@
+"""test_key_manager.py: Processes sharing a key directory must agree on one key pair."""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from watermarking.utils.key_manager import PRIVATE_KEY_FILENAME, KeyStore
+
+
+def load_keys(key_dir: str) -> tuple[bytes, bytes]:
+    return KeyStore(key_dir, key_size=1024).get_keys()
+
+
+def test_concurrent_processes_create_a_single_key_pair(tmp_path):
+    key_dir = str(tmp_path / "keys")
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        pairs = list(pool.map(load_keys, [key_dir] * 8))
+
+    assert len(set(pairs)) == 1
+    assert load_keys(key_dir) == pairs[0]
+    assert os.stat(os.path.join(key_dir, PRIVATE_KEY_FILENAME)).st_mode & 0o777 == 0o600
+    # No temporary file is left behind
+    assert sorted(name for name in os.listdir(key_dir) if not name.startswith(".keys")) == [
+        "private.pem",
+        "public.pem",
+    ]
@@ -0,0 +1,95 @@
+"""test_merkle.py: Inclusion proofs of the batched Merkle watermark generator."""
+
+import json
+
+import numpy as np
+import pytest
+from Crypto.PublicKey import RSA
+
+from watermarking.generator.merkle import MerkleProof, MerkleWatermarkGenerator, hash_leaf
+
+WATERMARK_LENGTH = 300
+
+
+@pytest.fixture(scope="module")
+def keys() -> tuple[bytes, bytes]:
+    """A small RSA key pair."""
+    key = RSA.generate(1024)
+    return key.export_key(), key.publickey().export_key()
+
+
+@pytest.fixture(scope="module")
+def images() -> list[np.ndarray]:
+    """A batch of five distinct images, so that one leaf is promoted without a sibling."""
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (8, 8, 3), dtype=np.uint8) for _ in range(5)]
+
+
+@pytest.fixture(scope="module")
+def batch(keys, images) -> tuple[list[np.ndarray], list[MerkleProof]]:
+    """Watermarks and proofs of the batch."""
+    private_key, _ = keys
+    return MerkleWatermarkGenerator().generate_batch(images, private_key, WATERMARK_LENGTH)
+
+
+def test_serialized_proof_verifies_every_image(keys, images, batch):
+    _, public_key = keys
+    generator = MerkleWatermarkGenerator()
+    _, proofs = batch
+
+    for image, proof in zip(images, proofs):
+        restored = MerkleProof.from_dict(json.loads(json.dumps(proof.to_dict())))
+        assert restored == proof
+        assert generator.verify_inclusion(image, restored, public_key)
+
+    # Every proof of the batch shares a single root signature
+    assert len({proof.root_signature for proof in proofs}) == 1
+
+
+def test_tampered_proof_or_image_is_rejected(keys, images, batch):
+    _, public_key = keys
+    generator = MerkleWatermarkGenerator()
+    _, proofs = batch
+    proof = proofs[0]
+
+    side, digest = proof.path[0]
+    flipped = f"{int(digest[0], 16) ^ 1:x}{digest[1:]}"
+    tampered_path = MerkleProof(
+        proof.leaf_index, proof.root, proof.root_signature, list(proof.path)
+    )
+    tampered_path.path[0] = (side, flipped)
+    assert not generator.verify_inclusion(images[0], tampered_path, public_key)
+
+    # A proof of another image does not cover this one
+    assert not generator.verify_inclusion(images[0], proofs[1], public_key)
+
+    modified = images[0].copy()
+    modified[0, 0, 0] ^= 1
+    assert not generator.verify_inclusion(modified, proof, public_key)
+
+    # A root signed with another key is rejected, even when the path is consistent
+    _, other_proofs = MerkleWatermarkGenerator().generate_batch(
+        images, RSA.generate(1024).export_key(), WATERMARK_LENGTH
+    )
+    assert not generator.verify_inclusion(images[0], other_proofs[0], public_key)
+
+
+def test_watermark_is_rederived_from_the_proof(keys, images, batch):
+    private_key, _ = keys
+    watermarks, proofs = batch
+
+    for image, watermark, proof in zip(images, watermarks, proofs):
+        derived = MerkleWatermarkGenerator.derive_watermark(
+            bytes.fromhex(proof.root_signature), hash_leaf(image), proof.path, WATERMARK_LENGTH
+        )
+        np.testing.assert_array_equal(derived, watermark)
+        assert derived.shape == (WATERMARK_LENGTH,) and set(np.unique(derived)) <= {-1, 1}
+
+    # Distinct images of the batch get distinct watermarks
+    assert len({watermark.tobytes() for watermark in watermarks}) == len(images)
+    # A batch of one is what `generate` returns
+    single = MerkleWatermarkGenerator().generate(images[0], private_key, WATERMARK_LENGTH)
+    [batch_of_one], _ = MerkleWatermarkGenerator().generate_batch(
+        [images[0]], private_key, WATERMARK_LENGTH
+    )
+    np.testing.assert_array_equal(single, batch_of_one)
@@ -0,0 +1,47 @@
+"""test_preprocess.py: The blockwise normalize_array matches the plain float64 formula."""
+
+import numpy as np
+import pytest
+
+from watermarking.utils.preprocess import normalize_array
+
+
+def reference_normalize(arr: np.ndarray, scale=255, dtype=np.uint8) -> np.ndarray:
+    arr = arr.astype(np.float64)
+    return ((arr - arr.min()) / (arr.max() - arr.min()) * scale).astype(dtype)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.int32, np.float32, np.float64])
+def test_integer_output_matches_the_float64_formula(dtype):
+    rng = np.random.default_rng(0)
+    high = 255 if dtype == np.uint8 else 60_000
+    arr = rng.integers(3, high, (517, 389, 3)).astype(dtype)
+
+    np.testing.assert_array_equal(normalize_array(arr), reference_normalize(arr))
+
+
+def test_every_uint8_value_of_every_range_matches():
+    values = np.arange(256, dtype=np.uint8)
+    for lo in range(0, 255, 15):
+        for hi in range(lo + 1, 256, 7):
+            arr = values[lo : hi + 1]
+            np.testing.assert_array_equal(normalize_array(arr), reference_normalize(arr))
+
+
+def test_float_output_keeps_float64_precision():
+    arr = np.random.default_rng(1).integers(0, 256, (64, 64), dtype=np.uint8)
+
+    result = normalize_array(arr, scale=1, dtype=np.float64)
+
+    np.testing.assert_array_equal(result, reference_normalize(arr, 1, np.float64))
+
+
+def test_in_place_and_constant_input():
+    arr = np.random.default_rng(2).integers(10, 200, (33, 47, 3), dtype=np.uint8)
+    expected = reference_normalize(arr)
+
+    assert normalize_array(arr, out=arr) is arr
+    np.testing.assert_array_equal(arr, expected)
+    np.testing.assert_array_equal(normalize_array(np.full((4, 4), 7, np.uint8)), 0)
+    with pytest.raises(ValueError):
+        normalize_array(arr, out=np.empty((2, 2), np.uint8))
@@ -0,0 +1,82 @@
+"""test_shared_frames.py: Reference counting, growth and shutdown of the shared frame pool."""
+
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from watermarking.utils.shared_frames import SharedFramePool, attach
+
+
+def negate(ref) -> None:
+    image = attach(ref)
+    np.negative(image, out=image)
+
+
+def test_released_slot_is_recycled_with_its_segment():
+    image = np.arange(12, dtype=np.int16).reshape(3, 4)
+    with SharedFramePool(slots=2) as pool:
+        ref = pool.put(image)
+        np.testing.assert_array_equal(pool.array(ref), image)
+
+        pool.retain(ref)
+        pool.release(ref)
+        assert pool.in_use == 1
+        pool.release(ref)
+        assert pool.in_use == 0
+        with pytest.raises(ValueError, match="not in use"):
+            pool.release(ref)
+
+        # A smaller array fits into the segment of the released slot
+        again = pool.acquire((2, 2), np.int16)
+        assert (again.slot, again.segment) == (ref.slot, ref.segment)
+
+
+def test_worker_writes_are_visible_in_the_parent():
+    image = np.arange(6, dtype=np.float64).reshape(2, 3)
+    with SharedFramePool(slots=1) as pool, ProcessPoolExecutor(max_workers=1) as workers:
+        ref = pool.put(image)
+        workers.submit(negate, ref).result(timeout=30)
+
+        np.testing.assert_array_equal(pool.array(ref), -image)
+
+
+def test_slot_grows_and_unlinks_its_old_segment():
+    with SharedFramePool(slots=1) as pool:
+        small = pool.acquire((4, 4))
+        pool.release(small)
+
+        large = pool.acquire((64, 64, 3))
+
+        assert large.slot == small.slot and large.segment != small.segment
+        assert pool.array(large).nbytes == large.nbytes == 64 * 64 * 3
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=small.segment)
+
+
+def test_acquire_waits_for_a_free_slot_and_close_wakes_it():
+    pool = SharedFramePool(slots=1)
+    pool.acquire((8, 8))
+    with pytest.raises(TimeoutError):
+        pool.acquire((8, 8), timeout=0.05)
+
+    errors = []
+
+    def wait_for_slot() -> None:
+        try:
+            pool.acquire((8, 8))
+        except RuntimeError as ex:
+            errors.append(ex)
+
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    waiter.join(timeout=0.2)
+    assert waiter.is_alive()
+
+    pool.close()
+    waiter.join(timeout=5)
+
+    assert not waiter.is_alive()
+    assert len(errors) == 1 and "closed" in str(errors[0])
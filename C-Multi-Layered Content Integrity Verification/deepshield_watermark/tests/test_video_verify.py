@@ -0,0 +1,115 @@
+"""test_video_verify.py: Frame schedules and the sequential verdict of the video verifier."""
+
+from typing import Optional
+
+import numpy as np
+import pytest
+
+from watermarking.strategies.dwt_dct import DWT2DCTWatermarkMethod
+from watermarking.video.verify import VideoVerifier, every_kth, keyframes, pass_probability
+
+rng = np.random.default_rng(0)
+GROUND_TRUTH = np.zeros((64, 3), dtype=int)
+GROUND_TRUTH[rng.choice(64, 20, replace=False)] = rng.choice([-1, 1], (20, 3))
+
+
+class PassthroughMethod:
+    """Watermarking method whose frames already are the extracted watermark matrices."""
+
+    def extract_watermark_matrix(self, watermarked_image: np.ndarray) -> np.ndarray:
+        return watermarked_image
+
+
+class Video:
+    """Frame source that records the frames read; `failing` frames carry the wrong watermark."""
+
+    def __init__(self, total_frames: int, failing: Optional[set[int]] = None):
+        self.total_frames = total_frames
+        self.failing = failing or set()
+        self.reads: list[int] = []
+
+    def __len__(self) -> int:
+        return self.total_frames
+
+    def read(self, index: int) -> np.ndarray:
+        self.reads.append(index)
+        return -GROUND_TRUTH if index in self.failing else GROUND_TRUTH
+
+
+@pytest.fixture
+def verifier() -> VideoVerifier:
+    """Verifier of videos watermarked with `GROUND_TRUTH`."""
+    return VideoVerifier(GROUND_TRUTH, method=PassthroughMethod())
+
+
+def test_pass_probability_follows_the_beta_posterior():
+    assert pass_probability(0, 0) == pytest.approx(0.5)
+    # With a uniform prior, n passing frames out of n give 1 - 2 ** -(n + 1)
+    assert pass_probability(5, 0) == pytest.approx(1 - 2**-6)
+    assert pass_probability(6, 0) == pytest.approx(1 - 2**-7)
+    assert pass_probability(2, 7) == pytest.approx(1 - pass_probability(7, 2))
+    assert pass_probability(8, 2, min_pass_fraction=0.9) < pass_probability(8, 2)
+
+
+def test_schedules():
+    assert every_kth(10, 3) == [0, 3, 6, 9]
+    assert every_kth(10, 4, offset=2) == [2, 6]
+    assert every_kth(3, 0) == [0, 1, 2]
+    assert keyframes(100, [48, -1, 0, 250, 24, 48, 99]) == [0, 24, 48, 99]
+
+
+def test_similarity_matches_is_similar_without_printing(verifier, capsys):
+    method = DWT2DCTWatermarkMethod()
+    extracted = rng.choice([-1, 1], GROUND_TRUTH.shape)
+    _, expected = method.is_similar(extracted, GROUND_TRUTH, threshold=80)
+    capsys.readouterr()
+
+    assert verifier.similarity(extracted) == pytest.approx(expected)
+    assert verifier.similarity(GROUND_TRUTH) == 100.0
+    assert verifier.similarity(GROUND_TRUTH[:32]) == 0.0
+
+    score = verifier.score_frame(Video(4, failing={1}), 1)
+    assert (score.similarity, score.passed) == (0.0, False)
+    assert capsys.readouterr().out == ""
+
+
+def test_fixed_schedule_verdict(verifier):
+    video = Video(100, failing={10, 20})
+    result = verifier.verify(video, every_kth(len(video), 10))
+
+    assert video.reads == list(range(0, 100, 10))
+    assert result.authentic and result.frames_checked == 10 and result.total_frames == 100
+    assert result.confidence == pytest.approx(pass_probability(8, 2))
+    assert result.mean_similarity == pytest.approx(80.0)
+
+
+@pytest.mark.parametrize("authentic", [True, False])
+def test_adaptive_verification_stops_at_the_required_confidence(verifier, authentic):
+    total_frames = 10_000
+    video = Video(total_frames, failing=set() if authentic else set(range(total_frames)))
+
+    result = verifier.verify_adaptive(video, confidence=0.99, seed=1)
+
+    # 5 agreeing frames give 0.984 and 6 give 0.992, whatever the length of the video
+    assert result.authentic is authentic and result.frames_checked == 6
+    assert result.confidence >= 0.99
+    assert [frame.index for frame in result.frames] == video.reads
+    assert len(set(video.reads)) == 6
+
+
+def test_adaptive_verification_respects_min_and_max_frames(verifier):
+    result = verifier.verify_adaptive(Video(50), confidence=0.99, min_frames=10, seed=1)
+    assert result.frames_checked == 10
+
+    # Alternating outcomes never become conclusive: every frame up to the budget is checked once
+    undecided = Video(50, failing=set(range(0, 50, 2)))
+    result = verifier.verify_adaptive(undecided, confidence=0.99, max_frames=20, seed=1)
+    assert result.frames_checked == 20 and result.confidence < 0.99
+    result = verifier.verify_adaptive(Video(50, failing=set(range(0, 50, 2))), confidence=0.99)
+    assert result.frames_checked == 50
+    assert sorted(frame.index for frame in result.frames) == list(range(50))
+
+    # A seed makes the selection reproducible
+    assert [frame.index for frame in verifier.verify_adaptive(Video(50), seed=7).frames] == [
+        frame.index for frame in verifier.verify_adaptive(Video(50), seed=7).frames
+    ]
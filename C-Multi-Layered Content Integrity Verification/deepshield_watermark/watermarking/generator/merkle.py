@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+
+"""merkle.py: Batched watermark generation by signing the root of a Merkle tree."""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Sequence
+
+import numpy as np
+from Crypto.Hash import SHA256
+from Crypto.Signature import pkcs1_15
+
+from watermarking.generator.sha256 import SHA256WatermarkGenerator, import_key
+
+# Domain separation prefixes so that a leaf can never be mistaken for an inner node
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+@dataclass
+class MerkleProof:
+    """Inclusion proof of one image in a signed Merkle batch.
+
+    Attributes:
+        leaf_index (int): Position of the image inside the batch.
+        root (str): Hex digest of the Merkle root.
+        root_signature (str): Hex encoded RSA signature of the root.
+        path (list[tuple[str, str]]): Sibling hashes from the leaf up to the root. Each entry is
+            ("L" | "R", hex digest) where the side tells on which side the sibling sits.
+    """
+
+    leaf_index: int
+    root: str
+    root_signature: str
+    path: list[tuple[str, str]] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the proof so that it can be stored next to a registry entry.
+
+        Returns:
+            dict[str, Any]: JSON serializable representation of the proof.
+        """
+        return {
+            "leaf_index": self.leaf_index,
+            "root": self.root,
+            "root_signature": self.root_signature,
+            "path": [[side, digest] for side, digest in self.path],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "MerkleProof":
+        """Rebuild a proof from its serialized form.
+
+        Args:
+            data (dict[str, Any]): Output of `MerkleProof.to_dict`.
+
+        Returns:
+            MerkleProof: The deserialized proof.
+        """
+        return cls(
+            leaf_index=int(data["leaf_index"]),
+            root=data["root"],
+            root_signature=data["root_signature"],
+            path=[(side, digest) for side, digest in data["path"]],
+        )
+
+
+def hash_leaf(image: np.ndarray) -> bytes:
+    """Hash the raw bytes of an image into a Merkle leaf.
+
+    Args:
+        image (np.ndarray): Source image data.
+
+    Returns:
+        bytes: SHA256 digest of the leaf.
+    """
+    return SHA256.new(LEAF_PREFIX + image.tobytes()).digest()
+
+
+def hash_node(left: bytes, right: bytes) -> bytes:
+    """Hash two child digests into their parent node.
+
+    Args:
+        left (bytes): Digest of the left child.
+        right (bytes): Digest of the right child.
+
+    Returns:
+        bytes: SHA256 digest of the parent node.
+    """
+    return SHA256.new(NODE_PREFIX + left + right).digest()
+
+
+def build_merkle_tree(leaves: Sequence[bytes]) -> tuple[bytes, list[list[tuple[str, bytes]]]]:
+    """Build a Merkle tree over `leaves` and collect the inclusion path of every leaf.
+
+    A node without a sibling on its level is promoted unchanged to the next level, so no
+    leaf is ever duplicated.
+
+    Args:
+        leaves (Sequence[bytes]): Leaf digests in batch order.
+
+    Returns:
+        tuple[bytes, list[list[tuple[str, bytes]]]]: The root digest and, for each leaf, the list
+            of ("L" | "R", sibling digest) pairs from the leaf up to the root.
+
+    Raises:
+        ValueError: If no leaves are provided.
+    """
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree without leaves.")
+
+    paths: list[list[tuple[str, bytes]]] = [[] for _ in leaves]
+    # Leaf indices covered by every node of the current level
+    members = [[i] for i in range(len(leaves))]
+    level = list(leaves)
+
+    while len(level) > 1:
+        next_level, next_members = [], []
+        for i in range(0, len(level) - 1, 2):
+            left, right = level[i], level[i + 1]
+            for leaf in members[i]:
+                paths[leaf].append(("R", right))
+            for leaf in members[i + 1]:
+                paths[leaf].append(("L", left))
+            next_level.append(hash_node(left, right))
+            next_members.append(members[i] + members[i + 1])
+        if len(level) % 2 == 1:
+            # Promote the odd node without hashing it
+            next_level.append(level[-1])
+            next_members.append(members[-1])
+        level, members = next_level, next_members
+
+    return level[0], paths
+
+
+def root_from_path(leaf: bytes, path: Sequence[tuple[str, str]]) -> bytes:
+    """Fold an inclusion path back into the Merkle root.
+
+    Args:
+        leaf (bytes): Leaf digest of the image.
+        path (Sequence[tuple[str, str]]): ("L" | "R", hex digest) sibling pairs.
+
+    Returns:
+        bytes: The recomputed root digest.
+    """
+    node = leaf
+    for side, sibling_hex in path:
+        sibling = bytes.fromhex(sibling_hex)
+        node = hash_node(sibling, node) if side == "L" else hash_node(node, sibling)
+    return node
+
+
+class MerkleWatermarkGenerator(SHA256WatermarkGenerator):
+    """Amortize one RSA signature over a batch of images.
+
+    The images are hashed into a Merkle tree and only the root is signed. Each watermark is then
+    derived from the root signature together with the image's leaf and inclusion path, so the
+    per-image cost is a handful of SHA256 computations.
+    """
+
+    def __init__(self, verified_roots_cache_size: int = 1024):
+        """Initialize the generator.
+
+        Args:
+            verified_roots_cache_size (int, optional): Number of verified (root, signature, key)
+                triples kept in memory. Defaults to 1024.
+        """
+        self._verified_roots: OrderedDict[tuple[bytes, bytes, bytes], bool] = OrderedDict()
+        self._verified_roots_cache_size = verified_roots_cache_size
+
+    @staticmethod
+    def derive_watermark(
+        root_signature: bytes, leaf: bytes, path: Sequence[tuple[str, str]], watermark_length: int
+    ) -> np.ndarray:
+        """Derive the +1/-1 watermark of one image from the batch signature and its leaf path.
+
+        Args:
+            root_signature (bytes): RSA signature of the Merkle root.
+            leaf (bytes): Leaf digest of the image.
+            path (Sequence[tuple[str, str]]): Inclusion path of the leaf.
+            watermark_length (int): Number of bits desired in the output watermark.
+
+        Returns:
+            np.ndarray: Binary watermark array consisting of +1/-1 values.
+                Shape: (watermark_length,)
+                Dtype: int
+        """
+        encoded_path = "".join(f"{side}{digest}" for side, digest in path).encode("ascii")
+        seed = SHA256.new(root_signature + leaf + encoded_path).digest()
+
+        # Expand the seed in counter mode until enough bits are available
+        n_blocks = -(-watermark_length // 256)
+        stream = b"".join(
+            SHA256.new(seed + counter.to_bytes(4, "big")).digest() for counter in range(n_blocks)
+        )
+        bits = np.unpackbits(np.frombuffer(stream, dtype=np.uint8))[:watermark_length]
+        return np.where(bits == 1, 1, -1).astype(int)
+
+    def generate_batch(
+        self, images: Sequence[np.ndarray], private_key: bytes, watermark_length: int
+    ) -> tuple[list[np.ndarray], list[MerkleProof]]:
+        """Generate watermarks for a batch of images with a single private-key operation.
+
+        Args:
+            images (Sequence[np.ndarray]): Source images.
+            private_key (bytes): RSA private key for digital signatures.
+            watermark_length (int): Number of bits desired in every watermark.
+
+        Returns:
+            tuple[list[np.ndarray], list[MerkleProof]]: One watermark and one inclusion proof per
+                image, in batch order.
+        """
+        leaves = [hash_leaf(image) for image in images]
+        root, paths = build_merkle_tree(leaves)
+
+        root_signature = pkcs1_15.new(import_key(private_key)).sign(SHA256.new(root))
+
+        watermarks, proofs = [], []
+        for index, (leaf, path) in enumerate(zip(leaves, paths)):
+            hex_path = [(side, digest.hex()) for side, digest in path]
+            watermarks.append(
+                self.derive_watermark(root_signature, leaf, hex_path, watermark_length)
+            )
+            proofs.append(
+                MerkleProof(
+                    leaf_index=index,
+                    root=root.hex(),
+                    root_signature=root_signature.hex(),
+                    path=hex_path,
+                )
+            )
+        return watermarks, proofs
+
+    def generate(self, image: np.ndarray, private_key: bytes, watermark_length: int) -> np.ndarray:
+        """Generate the watermark of a single image as a batch of one.
+
+        Args:
+            image (np.ndarray): Source image data.
+            private_key (bytes): RSA private key for digital signatures.
+            watermark_length (int): Number of bits desired in the output watermark.
+
+        Returns:
+            np.ndarray: Binary watermark array consisting of +1/-1 values.
+        """
+        watermarks, _ = self.generate_batch([image], private_key, watermark_length)
+        return watermarks[0]
+
+    def verify_root(self, root: bytes, root_signature: bytes, public_key: bytes) -> bool:
+        """Verify the signature of a Merkle root, caching the outcome per root.
+
+        Args:
+            root (bytes): Merkle root digest.
+            root_signature (bytes): RSA signature of the root.
+            public_key (bytes): RSA public key for digital signatures.
+
+        Returns:
+            bool: True if the signature is valid, False otherwise.
+        """
+        cache_key = (root, root_signature, public_key)
+        if cache_key in self._verified_roots:
+            self._verified_roots.move_to_end(cache_key)
+            return self._verified_roots[cache_key]
+
+        try:
+            pkcs1_15.new(import_key(public_key)).verify(SHA256.new(root), root_signature)
+            is_valid = True
+        except (ValueError, TypeError):
+            is_valid = False
+
+        self._verified_roots[cache_key] = is_valid
+        if len(self._verified_roots) > self._verified_roots_cache_size:
+            self._verified_roots.popitem(last=False)
+        return is_valid
+
+    def verify_inclusion(self, image: np.ndarray, proof: MerkleProof, public_key: bytes) -> bool:
+        """Verify that `image` belongs to a batch whose root was signed with `public_key`.
+
+        Args:
+            image (np.ndarray): Source image data.
+            proof (MerkleProof): Inclusion proof stored with the registry entry.
+            public_key (bytes): RSA public key for digital signatures.
+
+        Returns:
+            bool: True if the proof leads to the signed root, False otherwise.
+        """
+        root = root_from_path(hash_leaf(image), proof.path)
+        if root.hex() != proof.root:
+            return False
+        return self.verify_root(root, bytes.fromhex(proof.root_signature), public_key)
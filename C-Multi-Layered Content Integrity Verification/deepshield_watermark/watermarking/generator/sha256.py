@@ -2,6 +2,7 @@
 
 """sha256.py: Generating Watermarking using SHA256."""
 
+from functools import lru_cache
 from typing import Tuple
 
 import numpy as np
@@ -12,6 +13,21 @@ from Crypto.Signature import pkcs1_15
 from watermarking.generator.base import IWatermarkGenerator
 
 
+@lru_cache(maxsize=16)
+def import_key(key: bytes) -> RSA.RsaKey:
+    """Parse an RSA key, once per distinct key.
+
+    Parsing a PEM private key costs tens of milliseconds, more than hashing a large image.
+
+    Args:
+        key (bytes): The exported RSA key.
+
+    Returns:
+        RSA.RsaKey: The parsed key.
+    """
+    return RSA.import_key(key)
+
+
 class SHA256WatermarkGenerator(IWatermarkGenerator):
     """Use SHA256 hashing + RSA signature to produce a unique signature."""
 
@@ -35,7 +51,7 @@ class SHA256WatermarkGenerator(IWatermarkGenerator):
         hash_obj = SHA256.new(matrix_bytes)
 
         # Load private RSA key from provided bytes for digital signing
-        private_key_rsa = RSA.import_key(private_key)
+        private_key_rsa = import_key(private_key)
 
         # Sign the hash object using PKCS#1 v1.5 padding for security
         signature = pkcs1_15.new(private_key_rsa).sign(hash_obj)
@@ -84,7 +100,7 @@ class SHA256WatermarkGenerator(IWatermarkGenerator):
         """
         signature, image_hash = self.sign(image, private_key)
 
-        public_key_rsa = RSA.import_key(public_key)
+        public_key_rsa = import_key(public_key)
         try:
             pkcs1_15.new(public_key_rsa).verify(image_hash, signature)
             return True
@@ -0,0 +1,525 @@
+#!/usr/bin/env python
+
+"""bulk_register.py: Watermark and register a whole directory or manifest of images.
+
+Each image goes through four stages that run in parallel on different images: decode (a thread
+pool), sign + embed (a process pool, one worker per core, reading and writing the images in
+shared memory), encode (a thread pool writing PNG files behind the embedding) and registration
+(records appended to the registry in batches).
+At most `max_in_flight` images are between decode and registration, which bounds the memory
+regardless of the size of the input. Every registered batch is also appended to a checkpoint
+manifest; a rerun skips the images it lists, so an interrupted ingest resumes where it stopped.
+
+Usage:
+    python -m watermarking.service.bulk_register images/ watermarked/ --registry-dir registry
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Union
+
+import cv2
+import numpy as np
+
+from watermarking.generator.sha256 import SHA256WatermarkGenerator
+from watermarking.positions.sha256 import SHA256Positions
+from watermarking.strategies.dwt_dct import DWT2DCTWatermarkMethod
+from watermarking.utils.image_io import load_image
+from watermarking.utils.key_manager import KeyStore
+from watermarking.utils.preprocess import normalize_array
+from watermarking.utils.registry import RegistryRecord, WatermarkRegistry
+from watermarking.utils.shared_frames import FrameRef, SharedFramePool, attach
+
+# Extensions of the images picked up from an input directory
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+CHECKPOINT_FILENAME = "checkpoint.jsonl"
+
+# How images travel to the embedding processes: copied through shared memory, or pickled
+TRANSPORTS = ("shared", "pickle")
+
+
+@dataclass(frozen=True)
+class BulkItem:
+    """One image to register.
+
+    Attributes:
+        image_id (str): Registry id of the image.
+        source (str): Path of the original image.
+        output (str): Path of the watermarked PNG.
+    """
+
+    image_id: str
+    source: str
+    output: str
+
+
+@dataclass
+class BulkStats:
+    """Progress and throughput of a bulk registration.
+
+    Attributes:
+        registered (int): Images registered by this run.
+        skipped (int): Images skipped because the checkpoint lists them.
+        failed (dict[str, str]): Error message per image id that could not be registered.
+        elapsed_seconds (float): Wall-clock duration of the run.
+        stage_seconds (dict[str, float]): Time spent in each stage, summed over its workers.
+        stage_workers (dict[str, int]): Number of workers of each stage.
+    """
+
+    registered: int = 0
+    skipped: int = 0
+    failed: dict[str, str] = field(default_factory=dict)
+    elapsed_seconds: float = 0.0
+    stage_seconds: dict[str, float] = field(default_factory=dict)
+    stage_workers: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def images_per_second(self) -> float:
+        """Registered images per second over the whole run."""
+        return self.registered / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    def stage_capacity(self) -> dict[str, float]:
+        """Images per second each stage could sustain with all its workers busy.
+
+        The stage with the lowest capacity limits the throughput of the pipeline.
+
+        Returns:
+            dict[str, float]: The capacity per stage.
+        """
+        processed = self.registered + len(self.failed)
+        return {
+            stage: processed * self.stage_workers.get(stage, 1) / seconds
+            for stage, seconds in self.stage_seconds.items()
+            if seconds > 0
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the statistics.
+
+        Returns:
+            dict[str, Any]: The statistics, including the throughput.
+        """
+        return {
+            "registered": self.registered,
+            "skipped": self.skipped,
+            "failed": dict(self.failed),
+            "elapsed_seconds": self.elapsed_seconds,
+            "images_per_second": self.images_per_second,
+            "stage_seconds": dict(self.stage_seconds),
+            "stage_images_per_second": self.stage_capacity(),
+        }
+
+
+def _output_path(output_dir: str, image_id: str) -> str:
+    root = os.path.abspath(output_dir)
+    output = os.path.normpath(os.path.join(root, image_id + ".png"))
+    if os.path.commonpath([root, output]) != root:
+        raise ValueError(f"Image id '{image_id}' points outside of the output directory.")
+    return output
+
+
+def list_directory(input_dir: str, output_dir: str) -> list[BulkItem]:
+    """List the images below a directory, recursively.
+
+    The image id is the path relative to `input_dir` without its extension, so the output
+    directory mirrors the input directory.
+
+    Args:
+        input_dir (str): Directory of the original images.
+        output_dir (str): Directory of the watermarked images.
+
+    Returns:
+        list[BulkItem]: The images, sorted by id.
+
+    Raises:
+        ValueError: If two images only differ in their extension.
+    """
+    items: dict[str, BulkItem] = {}
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            image_id = os.path.splitext(os.path.relpath(source, input_dir))[0]
+            image_id = image_id.replace(os.sep, "/")
+            if image_id in items:
+                raise ValueError(f"Images {items[image_id].source} and {source} share an id.")
+            items[image_id] = BulkItem(image_id, source, _output_path(output_dir, image_id))
+    return [items[image_id] for image_id in sorted(items)]
+
+
+def read_manifest(manifest: str, output_dir: str) -> list[BulkItem]:
+    """Read the images listed in a manifest file.
+
+    Each line is either a path, or a JSON object with "path" and optionally "image_id".
+    Relative paths are relative to the manifest. The id defaults to the file name without its
+    extension.
+
+    Args:
+        manifest (str): Path of the manifest.
+        output_dir (str): Directory of the watermarked images.
+
+    Returns:
+        list[BulkItem]: The images, in manifest order.
+
+    Raises:
+        ValueError: If two lines have the same image id.
+    """
+    base = os.path.dirname(os.path.abspath(manifest))
+    items: list[BulkItem] = []
+    seen: set[str] = set()
+    with open(manifest, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line) if line.startswith("{") else {"path": line}
+            source = os.path.join(base, entry["path"])
+            image_id = entry.get("image_id") or os.path.splitext(os.path.basename(source))[0]
+            if image_id in seen:
+                raise ValueError(f"Image id '{image_id}' appears twice in {manifest}.")
+            seen.add(image_id)
+            items.append(BulkItem(image_id, source, _output_path(output_dir, image_id)))
+    return items
+
+
+def read_checkpoint(path: str) -> set[str]:
+    """Read the ids of the images a previous run registered.
+
+    Args:
+        path (str): Path of the checkpoint manifest.
+
+    Returns:
+        set[str]: The registered image ids; empty if there is no checkpoint yet.
+    """
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            # A line cut short by a crash is not a completed image
+            try:
+                done.add(json.loads(line)["image_id"])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def _terminate_last_line(path: str) -> None:
+    # Appends after a line cut short by a crash must start on a new line
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+# State of a process pool worker, set once by `_init_worker`
+_WORKER: dict[str, Any] = {}
+
+
+def _init_worker(private_key: bytes, positions: np.ndarray, watermark_length: int) -> None:
+    _WORKER.update(
+        generator=SHA256WatermarkGenerator(),
+        method=DWT2DCTWatermarkMethod(),
+        private_key=private_key,
+        positions=positions,
+        watermark_length=watermark_length,
+    )
+
+
+def _sign_and_embed(
+    image: np.ndarray, alpha: float, out: Optional[np.ndarray] = None
+) -> tuple[np.ndarray, np.ndarray, float]:
+    start = time.perf_counter()
+    watermark = _WORKER["generator"].generate(
+        image, _WORKER["private_key"], _WORKER["watermark_length"]
+    )
+    method = _WORKER["method"]
+    plan = method.make_plan(image.shape, watermark, _WORKER["positions"], alpha)
+    watermarked = normalize_array(method.embed_with_plan(image, plan), out=out)
+    return watermarked, watermark, time.perf_counter() - start
+
+
+def _sign_and_embed_shared(ref: FrameRef, alpha: float) -> tuple[None, np.ndarray, float]:
+    # The watermarked image replaces the original in its slot; only the watermark is pickled
+    image = attach(ref)
+    _, watermark, seconds = _sign_and_embed(image, alpha, out=image)
+    return None, watermark, seconds
+
+
+class BulkRegistrar:
+    """Watermark and register many images with all cores busy and bounded memory."""
+
+    def __init__(
+        self,
+        registry: WatermarkRegistry,
+        private_key: bytes,
+        public_key: bytes,
+        alpha: float = 0.1,
+        watermark_length: int = 255,
+        workers: Optional[int] = None,
+        decode_threads: int = 2,
+        encode_threads: int = 2,
+        max_in_flight: Optional[int] = None,
+        batch_size: int = 64,
+        transport: str = "shared",
+    ):
+        """Initialize the pipeline.
+
+        Args:
+            registry (WatermarkRegistry): Registry receiving the records.
+            private_key (bytes): RSA private key signing the images.
+            public_key (bytes): RSA public key deriving the watermark positions.
+            alpha (float, optional): Embedding strength. Defaults to 0.1.
+            watermark_length (int, optional): Watermark length. Defaults to 255.
+            workers (Optional[int], optional): Sign + embed processes. Defaults to None (one
+                per core).
+            decode_threads (int, optional): Decoder threads. Defaults to 2.
+            encode_threads (int, optional): Encoder threads. Defaults to 2.
+            max_in_flight (Optional[int], optional): Images decoded but not yet registered.
+                Defaults to None (twice the number of workers of all stages).
+            batch_size (int, optional): Records per registry append. Defaults to 64.
+            transport (str, optional): One of `TRANSPORTS`. "shared" passes images to the
+                embedding processes through a `SharedFramePool` with one slot per image in
+                flight; "pickle" sends copies. Defaults to "shared".
+
+        Raises:
+            ValueError: If the transport is unknown.
+        """
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport '{transport}', expected one of {TRANSPORTS}.")
+        self.registry = registry
+        self.private_key = private_key
+        self.alpha = alpha
+        self.watermark_length = watermark_length
+        self.workers = workers or os.cpu_count() or 1
+        self.decode_threads = decode_threads
+        self.encode_threads = encode_threads
+        self.max_in_flight = max_in_flight or 2 * (self.workers + decode_threads + encode_threads)
+        self.batch_size = batch_size
+        self.transport = transport
+        self.positions = SHA256Positions().generate_positions(public_key, watermark_length)
+
+    def run(self, items: list[BulkItem], checkpoint: str) -> BulkStats:
+        """Register the images that the checkpoint does not list yet.
+
+        An image that fails in any stage is reported in `BulkStats.failed` and left out of the
+        checkpoint, so the next run retries it.
+
+        Args:
+            items (list[BulkItem]): The images.
+            checkpoint (str): Path of the checkpoint manifest.
+
+        Returns:
+            BulkStats: Counts, failures and per-stage time.
+        """
+        done = read_checkpoint(checkpoint)
+        _terminate_last_line(checkpoint)
+        pending = [item for item in items if item.image_id not in done]
+        stats = BulkStats(
+            skipped=len(items) - len(pending),
+            stage_seconds={"decode": 0.0, "embed": 0.0, "encode": 0.0, "register": 0.0},
+            stage_workers={
+                "decode": self.decode_threads,
+                "embed": self.workers,
+                "encode": self.encode_threads,
+                "register": 1,
+            },
+        )
+        lock = threading.Condition()
+        in_flight = 0
+        batch: list[tuple[BulkItem, RegistryRecord]] = []
+        # Every image in flight holds at most one slot, so acquiring one never blocks
+        frames = SharedFramePool(self.max_in_flight) if self.transport == "shared" else None
+        refs: dict[str, FrameRef] = {}
+
+        def flush() -> None:
+            # Called with the lock held; the checkpoint only lists committed records
+            if not batch:
+                return
+            start = time.perf_counter()
+            self.registry.add_many(record for _, record in batch)
+            lines = "".join(
+                json.dumps({"image_id": item.image_id, "output": item.output}) + "\n"
+                for item, _ in batch
+            )
+            with open(checkpoint, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            stats.registered += len(batch)
+            stats.stage_seconds["register"] += time.perf_counter() - start
+            batch.clear()
+
+        def finish(
+            item: BulkItem,
+            error: Optional[BaseException] = None,
+            record: Optional[RegistryRecord] = None,
+        ) -> None:
+            nonlocal in_flight
+            with lock:
+                ref = refs.pop(item.image_id, None)
+                if ref is not None:
+                    frames.release(ref)
+                if error is not None:
+                    stats.failed[item.image_id] = f"{type(error).__name__}: {error}"
+                else:
+                    batch.append((item, record))
+                    if len(batch) >= self.batch_size:
+                        flush()
+                in_flight -= 1
+                lock.notify_all()
+
+        def decode(item: BulkItem) -> Union[np.ndarray, FrameRef]:
+            start = time.perf_counter()
+            image = load_image(item.source)
+            if frames is not None:
+                ref = frames.put(image)
+                with lock:
+                    refs[item.image_id] = ref
+                image = ref
+            with lock:
+                stats.stage_seconds["decode"] += time.perf_counter() - start
+            return image
+
+        def encode(item: BulkItem, watermarked: np.ndarray) -> None:
+            start = time.perf_counter()
+            os.makedirs(os.path.dirname(item.output) or ".", exist_ok=True)
+            if not cv2.imwrite(item.output, cv2.cvtColor(watermarked, cv2.COLOR_RGB2BGR)):
+                raise ValueError(f"Could not write {item.output}.")
+            with lock:
+                stats.stage_seconds["encode"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with (
+            frames or contextlib.nullcontext(),
+            ThreadPoolExecutor(self.decode_threads, thread_name_prefix="decode") as decoders,
+            ThreadPoolExecutor(self.encode_threads, thread_name_prefix="encode") as encoders,
+            ProcessPoolExecutor(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(self.private_key, self.positions, self.watermark_length),
+            ) as embedders,
+        ):
+            # Fork the embedding processes while no other thread runs. A process forked while a
+            # decoder holds a lock, e.g. the one of the resource tracker, inherits it locked.
+            embedders.submit(os.getpid).result()
+
+            def guarded(item: BulkItem, callback: Callable[[Future], None]):
+                # An error in a callback must still release the slot of its image
+                def target(future: Future) -> None:
+                    try:
+                        if future.exception() is not None:
+                            raise future.exception()
+                        callback(future)
+                    except Exception as ex:  # pylint: disable=broad-except
+                        finish(item, ex)
+
+                return target
+
+            def on_embedded(item: BulkItem, future: Future) -> None:
+                watermarked, watermark, seconds = future.result()
+                if frames is not None:
+                    watermarked = frames.array(refs[item.image_id])
+                with lock:
+                    stats.stage_seconds["embed"] += seconds
+                record = RegistryRecord(
+                    image_id=item.image_id,
+                    shape=tuple(watermarked.shape),
+                    watermark=[int(value) for value in watermark],
+                    watermark_positions=[int(position) for position in self.positions],
+                    alpha=self.alpha,
+                    metadata={"source": item.source, "output": item.output},
+                )
+                encoders.submit(encode, item, watermarked).add_done_callback(
+                    guarded(item, lambda _: finish(item, record=record))
+                )
+
+            def on_decoded(item: BulkItem, future: Future) -> None:
+                embed = _sign_and_embed if frames is None else _sign_and_embed_shared
+                embedded = embedders.submit(embed, future.result(), self.alpha)
+                embedded.add_done_callback(guarded(item, lambda f: on_embedded(item, f)))
+
+            for item in pending:
+                with lock:
+                    lock.wait_for(lambda: in_flight < self.max_in_flight)
+                    in_flight += 1
+                decoders.submit(decode, item).add_done_callback(
+                    guarded(item, lambda f, item=item: on_decoded(item, f))
+                )
+
+            with lock:
+                lock.wait_for(lambda: in_flight == 0)
+                flush()
+
+        stats.elapsed_seconds = time.perf_counter() - start
+        return stats
+
+
+def iter_items(source: str, output_dir: str) -> list[BulkItem]:
+    """List the images of an input directory or manifest file.
+
+    Args:
+        source (str): Directory of images, or a manifest file (see `read_manifest`).
+        output_dir (str): Directory of the watermarked images.
+
+    Returns:
+        list[BulkItem]: The images.
+    """
+    if os.path.isdir(source):
+        return list_directory(source, output_dir)
+    return read_manifest(source, output_dir)
+
+
+def main() -> None:
+    """Register a directory or manifest of images and print the statistics as JSON."""
+    parser = argparse.ArgumentParser(description="Watermark and register many images.")
+    parser.add_argument("input", help="Directory of images, or a manifest file.")
+    parser.add_argument("output_dir", help="Directory of the watermarked PNG images.")
+    parser.add_argument("--registry-dir", default="registry")
+    parser.add_argument("--key-dir", default=os.environ.get("DEEPSHIELD_KEY_DIR"))
+    parser.add_argument("--checkpoint", default=None, help="Defaults to the output directory.")
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--watermark-length", type=int, default=255)
+    parser.add_argument("--workers", type=int, default=None, help="Defaults to one per core.")
+    parser.add_argument("--decode-threads", type=int, default=2)
+    parser.add_argument("--encode-threads", type=int, default=2)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--transport", choices=TRANSPORTS, default="shared")
+    args = parser.parse_args()
+    if args.key_dir is None:
+        parser.error("--key-dir (or DEEPSHIELD_KEY_DIR) is needed to verify the images later.")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint = args.checkpoint or os.path.join(args.output_dir, CHECKPOINT_FILENAME)
+    private_key, public_key = KeyStore(args.key_dir).get_keys()
+    registrar = BulkRegistrar(
+        WatermarkRegistry(args.registry_dir),
+        private_key,
+        public_key,
+        alpha=args.alpha,
+        watermark_length=args.watermark_length,
+        workers=args.workers,
+        decode_threads=args.decode_threads,
+        encode_threads=args.encode_threads,
+        max_in_flight=args.max_in_flight,
+        batch_size=args.batch_size,
+        transport=args.transport,
+    )
+    stats = registrar.run(iter_items(args.input, args.output_dir), checkpoint)
+    print(json.dumps(stats.to_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
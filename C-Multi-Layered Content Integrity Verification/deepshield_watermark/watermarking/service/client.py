@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+"""client.py: Client library and command line for the watermarking daemon.
+
+The client only depends on the standard library, so it starts in milliseconds; the heavy
+lifting happens in the already warm daemon (see `daemon.py`).
+
+Protocol: newline-delimited JSON over a UNIX stream socket. Each request is an object with an
+"op" ("ping", "embed", "verify", "stats" or "shutdown"), an optional "id" that is echoed back,
+and the parameters of the operation. Each response carries "ok", then either "result" or
+"error", plus "work_seconds" (time spent on the job itself) and "queue_seconds" (time waiting
+for a free worker). Requests on one connection are answered in order; open several connections
+to run jobs concurrently.
+"""
+
+import argparse
+import base64
+import json
+import os
+import socket
+import tempfile
+import threading
+from typing import Any, Optional, Union
+
+# Overrides the default socket path of the daemon and its clients
+SOCKET_ENV = "DEEPSHIELD_SOCKET"
+
+ImageArgument = Union[str, os.PathLike, bytes, bytearray, memoryview]
+
+
+def default_socket_path() -> str:
+    """Return the socket path used when none is given.
+
+    Returns:
+        str: `$DEEPSHIELD_SOCKET`, or a per-user path in the temporary directory.
+    """
+    return os.environ.get(SOCKET_ENV) or os.path.join(
+        tempfile.gettempdir(), f"deepshield-watermark-{os.getuid()}.sock"
+    )
+
+
+def encode_image_argument(image: ImageArgument) -> dict[str, str]:
+    """Turn an image argument into request parameters.
+
+    Args:
+        image (ImageArgument): Path to an image readable by the daemon, or the encoded image.
+
+    Returns:
+        dict[str, str]: Either {"image": <absolute path>} or {"image_b64": <base64 bytes>}.
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return {"image_b64": base64.b64encode(bytes(image)).decode("ascii")}
+    # The daemon may run in another working directory
+    return {"image": os.path.abspath(os.fspath(image))}
+
+
+class DaemonError(RuntimeError):
+    """Raised when the daemon reports a failed request."""
+
+    def __init__(self, message: str, error_type: str = "Error"):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
+
+
+class DaemonClient:
+    """Connection to a running watermarking daemon.
+
+    The connection is kept open between requests. A client may be shared between threads, but
+    its requests are then sent one at a time; use one client per thread for concurrency.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = None):
+        """Connect to the daemon.
+
+        Args:
+            socket_path (Optional[str], optional): Path of the daemon socket.
+                Defaults to None (`default_socket_path()`).
+            timeout (Optional[float], optional): Seconds to wait for a response.
+                Defaults to None (wait indefinitely).
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(self.socket_path)
+        self._reader = self._socket.makefile("rb")
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.last_response: dict[str, Any] = {}
+
+    def request(self, op: str, **params: Any) -> dict[str, Any]:
+        """Send one request and wait for its response.
+
+        Args:
+            op (str): The operation.
+            **params (Any): Parameters of the operation; None values are left out.
+
+        Returns:
+            dict[str, Any]: The result of the operation. The full response, including its
+                timings, is kept in `last_response`.
+
+        Raises:
+            DaemonError: If the daemon reports an error.
+            ConnectionError: If the daemon closed the connection.
+        """
+        with self._lock:
+            self._next_id += 1
+            message = {"op": op, "id": self._next_id}
+            message.update({key: value for key, value in params.items() if value is not None})
+            self._socket.sendall(json.dumps(message).encode("utf-8") + b"\n")
+            line = self._reader.readline()
+            if not line:
+                raise ConnectionError("The daemon closed the connection.")
+            response = json.loads(line)
+            self.last_response = response
+
+        if not response.get("ok"):
+            raise DaemonError(response.get("error", ""), response.get("error_type", "Error"))
+        return response.get("result", {})
+
+    def ping(self) -> dict[str, Any]:
+        """Check that the daemon is alive.
+
+        Returns:
+            dict[str, Any]: The process id and uptime of the daemon.
+        """
+        return self.request("ping")
+
+    def embed(
+        self,
+        image: ImageArgument,
+        output: Optional[Union[str, os.PathLike]] = None,
+        image_id: Optional[str] = None,
+        alpha: Optional[float] = None,
+        register: bool = True,
+        metadata: Optional[dict[str, Any]] = None,
+    ) -> dict[str, Any]:
+        """Watermark an image.
+
+        Args:
+            image (ImageArgument): Path to the image, or the encoded image.
+            output (Optional[Union[str, os.PathLike]], optional): Where the daemon writes the
+                watermarked image; the extension selects the codec. Defaults to None (the
+                result holds the PNG encoded image as "image_b64").
+            image_id (Optional[str], optional): Registry id of the image. Defaults to None
+                (a random id).
+            alpha (Optional[float], optional): Embedding strength. Defaults to None (the
+                default of the daemon).
+            register (bool, optional): Add the image to the registry. Defaults to True.
+            metadata (Optional[dict[str, Any]], optional): Stored with the registry record.
+                Defaults to None.
+
+        Returns:
+            dict[str, Any]: "image_id", "shape", "registered", and "output" or "image_b64".
+        """
+        return self.request(
+            "embed",
+            **encode_image_argument(image),
+            output=os.path.abspath(os.fspath(output)) if output is not None else None,
+            image_id=image_id,
+            alpha=alpha,
+            register=register,
+            metadata=metadata,
+        )
+
+    def verify(
+        self,
+        image: ImageArgument,
+        image_id: Optional[str] = None,
+        threshold: Optional[float] = None,
+    ) -> dict[str, Any]:
+        """Verify the watermark of an image against the registry.
+
+        Args:
+            image (ImageArgument): Path to the image, or the encoded image.
+            image_id (Optional[str], optional): Registry id to verify against. Defaults to None
+                (the best matching registered image of the same shape).
+            threshold (Optional[float], optional): Similarity above which the image is
+                authentic. Defaults to None (the default of the daemon).
+
+        Returns:
+            dict[str, Any]: "authentic", "image_id" (None if nothing matched) and "similarity".
+        """
+        return self.request(
+            "verify", **encode_image_argument(image), image_id=image_id, threshold=threshold
+        )
+
+    def stats(self) -> dict[str, Any]:
+        """Read the counters and latency percentiles of the daemon.
+
+        Returns:
+            dict[str, Any]: The statistics.
+        """
+        return self.request("stats")
+
+    def shutdown(self) -> dict[str, Any]:
+        """Ask the daemon to finish its running jobs and exit.
+
+        Returns:
+            dict[str, Any]: An empty result.
+        """
+        return self.request("shutdown")
+
+    def close(self) -> None:
+        """Close the connection."""
+        self._reader.close()
+        self._socket.close()
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def main() -> None:
+    """Send one request to the daemon and print its result as JSON."""
+    parser = argparse.ArgumentParser(description="Talk to the watermarking daemon.")
+    parser.add_argument("--socket", default=None, help="Socket path of the daemon.")
+    parser.add_argument("--timeout", type=float, default=None)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    embed = commands.add_parser("embed", help="Watermark and register an image.")
+    embed.add_argument("image")
+    embed.add_argument("output")
+    embed.add_argument("--id", dest="image_id", default=None)
+    embed.add_argument("--alpha", type=float, default=None)
+    embed.add_argument("--no-register", dest="register", action="store_false")
+
+    verify = commands.add_parser("verify", help="Verify an image against the registry.")
+    verify.add_argument("image")
+    verify.add_argument("--id", dest="image_id", default=None)
+    verify.add_argument("--threshold", type=float, default=None)
+
+    for name in ("ping", "stats", "shutdown"):
+        commands.add_parser(name)
+    args = parser.parse_args()
+
+    with DaemonClient(args.socket, args.timeout) as client:
+        if args.command == "embed":
+            result = client.embed(
+                args.image, args.output, args.image_id, args.alpha, register=args.register
+            )
+        elif args.command == "verify":
+            result = client.verify(args.image, args.image_id, args.threshold)
+        else:
+            result = getattr(client, args.command)()
+        result["work_seconds"] = client.last_response.get("work_seconds")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+#!/usr/bin/env python
+
+"""daemon.py: Long-running local daemon that keeps the watermarking pipeline warm.
+
+Every fresh process pays for the interpreter, the imports, parsing the RSA keys and filling the
+transform caches before it does any work. The daemon pays these costs once at startup, then
+serves embed and verify jobs from `client.py` over a UNIX socket. Jobs run concurrently on a
+bounded pool of worker threads.
+
+Usage:
+    python -m watermarking.service.daemon --key-dir keys --registry-dir registry
+"""
+
+import argparse
+import base64
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import cv2
+import numpy as np
+
+from watermarking.generator.sha256 import SHA256WatermarkGenerator, import_key
+from watermarking.positions.sha256 import SHA256Positions
+from watermarking.service.client import default_socket_path
+from watermarking.strategies.dwt_dct import DWT2DCTWatermarkMethod
+from watermarking.utils.image_io import load_image
+from watermarking.utils.key_manager import KeyStore
+from watermarking.utils.preprocess import normalize_array
+from watermarking.utils.registry import WatermarkRegistry
+from watermarking.utils.zigzag import zigzag_order
+
+# Number of recent jobs per operation kept for the latency percentiles
+LATENCY_WINDOW = 1024
+
+# Cheap status requests, answered on the connection thread rather than by the worker pool
+STATUS_OPS = ("ping", "stats")
+
+
+class DaemonStats:
+    """Thread-safe counters and latency windows of the daemon."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.startup_seconds = 0.0
+        self.in_flight = 0
+        self.completed: dict[str, int] = {}
+        self.failed: dict[str, int] = {}
+        self._work: dict[str, deque] = {}
+        self._queue: dict[str, deque] = {}
+
+    def begin(self) -> None:
+        """Count a job that started running on the worker pool."""
+        with self._lock:
+            self.in_flight += 1
+
+    def end(
+        self, op: str, ok: bool, work_seconds: float, queue_seconds: float, pooled: bool = True
+    ) -> None:
+        """Record a finished job.
+
+        Args:
+            op (str): The operation.
+            ok (bool): Whether the job succeeded.
+            work_seconds (float): Time spent on the job itself.
+            queue_seconds (float): Time the job waited for a worker.
+            pooled (bool, optional): Whether the job ran on the worker pool and was counted by
+                `begin`. Defaults to True.
+        """
+        with self._lock:
+            if pooled:
+                self.in_flight -= 1
+            counters = self.completed if ok else self.failed
+            counters[op] = counters.get(op, 0) + 1
+            self._work.setdefault(op, deque(maxlen=LATENCY_WINDOW)).append(work_seconds)
+            self._queue.setdefault(op, deque(maxlen=LATENCY_WINDOW)).append(queue_seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Serialize the statistics.
+
+        Returns:
+            dict[str, Any]: Uptime, startup time, job counts and, per operation, the p50, p95
+                and p99 of the work and queue times over the last `LATENCY_WINDOW` jobs.
+        """
+
+        def percentiles(samples: deque) -> dict[str, float]:
+            values = np.percentile(np.asarray(samples), [50, 95, 99])
+            return {"p50": float(values[0]), "p95": float(values[1]), "p99": float(values[2])}
+
+        with self._lock:
+            return {
+                "uptime_seconds": time.time() - self.started,
+                "startup_seconds": self.startup_seconds,
+                "in_flight": self.in_flight,  # Jobs on the worker pool
+                "completed": dict(self.completed),
+                "failed": dict(self.failed),
+                "work_seconds": {op: percentiles(s) for op, s in self._work.items()},
+                "queue_seconds": {op: percentiles(s) for op, s in self._queue.items()},
+            }
+
+
+class WatermarkService:
+    """The warm state of the daemon and the jobs it runs.
+
+    Keys are read and parsed, watermark positions derived and the registry indexed once, in
+    the constructor. Embedding plans are made per job since the watermark depends on the
+    image, but the zigzag orders of the transform are cached per shape.
+    """
+
+    def __init__(
+        self,
+        key_dir: Optional[str],
+        registry_dir: str,
+        workers: int = 4,
+        alpha: float = 0.1,
+        watermark_length: int = 255,
+        threshold: float = 80.0,
+        warm_shapes: tuple[tuple[int, int, int], ...] = (),
+    ):
+        """Load everything the jobs need.
+
+        Args:
+            key_dir (Optional[str]): Directory of the RSA key pair; None generates an
+                ephemeral pair, so images embedded by this daemon only verify while it runs.
+            registry_dir (str): Directory of the registry.
+            workers (int, optional): Number of jobs run at the same time. Defaults to 4.
+            alpha (float, optional): Default embedding strength. Defaults to 0.1.
+            watermark_length (int, optional): Watermark length. Defaults to 255.
+            threshold (float, optional): Default similarity threshold of verify jobs.
+                Defaults to 80.
+            warm_shapes (tuple[tuple[int, int, int], ...], optional): Image shapes whose
+                transform caches are filled at startup. Defaults to ().
+        """
+        start = time.perf_counter()
+        self.stats = DaemonStats()
+        self.alpha = alpha
+        self.watermark_length = watermark_length
+        self.threshold = threshold
+
+        self.generator = SHA256WatermarkGenerator()
+        self.method = DWT2DCTWatermarkMethod()
+        self.private_key, self.public_key = KeyStore(key_dir).get_keys()
+        import_key(self.private_key)
+        self.positions = SHA256Positions().generate_positions(self.public_key, watermark_length)
+        self.registry = WatermarkRegistry(registry_dir)
+
+        # A first tiny job initializes the transform code paths, then the zigzag order of
+        # each requested shape is cached by a throwaway extraction
+        self.method.embed(np.zeros((32, 32, 3), dtype=np.uint8), [], np.array([], dtype=int), 0)
+        for shape in warm_shapes:
+            self.method.extract_watermark_matrix(np.zeros(shape, dtype=np.uint8))
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.handlers: dict[str, Callable[[dict[str, Any]], dict[str, Any]]] = {
+            "ping": self.ping,
+            "embed": self.embed,
+            "verify": self.verify,
+            "stats": self.get_stats,
+        }
+        self.stats.startup_seconds = time.perf_counter() - start
+
+    def _read_image(self, request: dict[str, Any]) -> np.ndarray:
+        if "image_b64" in request:
+            return load_image(base64.b64decode(request["image_b64"]))
+        if "image" in request:
+            return load_image(request["image"])
+        raise ValueError("The request needs 'image' (a path) or 'image_b64'.")
+
+    def ping(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Report that the daemon is alive.
+
+        Args:
+            request (dict[str, Any]): The request; it has no parameters.
+
+        Returns:
+            dict[str, Any]: The process id and the uptime.
+        """
+        return {"pid": os.getpid(), "uptime_seconds": time.time() - self.stats.started}
+
+    def embed(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Watermark an image, write it and register it.
+
+        Args:
+            request (dict[str, Any]): "image" or "image_b64", and optionally "output",
+                "image_id", "alpha", "register" and "metadata" (see `DaemonClient.embed`).
+
+        Returns:
+            dict[str, Any]: "image_id", "shape", "registered", and "output" or "image_b64".
+
+        Raises:
+            ValueError: If the image cannot be read or the output cannot be written.
+        """
+        image = self._read_image(request)
+        alpha = float(request.get("alpha", self.alpha))
+
+        watermark = self.generator.generate(image, self.private_key, self.watermark_length)
+        plan = self.method.make_plan(image.shape, watermark, self.positions, alpha)
+        watermarked = normalize_array(self.method.embed_with_plan(image, plan))
+        bgr = cv2.cvtColor(watermarked, cv2.COLOR_RGB2BGR)
+
+        result: dict[str, Any] = {"shape": list(image.shape)}
+        output = request.get("output")
+        if output is not None:
+            if not cv2.imwrite(output, bgr):
+                raise ValueError(f"Could not write the watermarked image to {output}.")
+            result["output"] = output
+        else:
+            ok, encoded = cv2.imencode(".png", bgr)
+            if not ok:
+                raise ValueError("Could not encode the watermarked image.")
+            result["image_b64"] = base64.b64encode(encoded.tobytes()).decode("ascii")
+
+        image_id = request.get("image_id")
+        if request.get("register", True):
+            metadata = dict(request.get("metadata") or {})
+            if "image" in request:
+                metadata.setdefault("source", request["image"])
+            record = self.registry.add(
+                image.shape, watermark, self.positions, alpha, image_id, metadata
+            )
+            image_id = record.image_id
+        result.update(image_id=image_id, registered=bool(request.get("register", True)))
+        return result
+
+    def verify(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Verify the watermark of an image against the registry.
+
+        Args:
+            request (dict[str, Any]): "image" or "image_b64", and optionally "image_id" and
+                "threshold" (see `DaemonClient.verify`).
+
+        Returns:
+            dict[str, Any]: "authentic", "image_id" (None if nothing matched) and "similarity".
+
+        Raises:
+            KeyError: If "image_id" is not registered.
+        """
+        image = self._read_image(request)
+        threshold = float(request.get("threshold", self.threshold))
+        extracted = self.method.extract_watermark_matrix(image)
+
+        image_id = request.get("image_id")
+        if image_id is not None:
+            record = self.registry.get(image_id)
+            if record is None:
+                raise KeyError(f"Image '{image_id}' is not registered.")
+            similarity = record.similarity(extracted) if record.shape == image.shape else 0.0
+        else:
+            record, similarity = self.registry.best_match(extracted, image.shape)
+
+        return {
+            "authentic": similarity > threshold,
+            "image_id": record.image_id if record is not None else None,
+            "similarity": similarity,
+        }
+
+    def get_stats(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Report the statistics of the daemon.
+
+        Args:
+            request (dict[str, Any]): The request; it has no parameters.
+
+        Returns:
+            dict[str, Any]: `DaemonStats.snapshot` plus the registry size and cache usage.
+        """
+        snapshot = self.stats.snapshot()
+        snapshot["registered_images"] = len(self.registry)
+        snapshot["cached_transform_shapes"] = zigzag_order.cache_info().currsize
+        snapshot["workers"] = self.executor._max_workers  # pylint: disable=protected-access
+        return snapshot
+
+    def handle(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Run one request on the worker pool and wait for its response.
+
+        Args:
+            request (dict[str, Any]): The decoded request.
+
+        Returns:
+            dict[str, Any]: The response, see the protocol in `client.py`.
+        """
+        op = request.get("op")
+        handler = self.handlers.get(op)
+        # Status requests bypass the pool so that they answer while it is busy; they are not
+        # counted as in flight, so that an idle daemon reports none
+        pooled = op not in STATUS_OPS
+        submitted = time.perf_counter()
+
+        def job() -> dict[str, Any]:
+            started = time.perf_counter()
+            if pooled:
+                self.stats.begin()
+            response: dict[str, Any] = {"id": request.get("id")}
+            try:
+                if handler is None:
+                    raise ValueError(f"Unknown operation '{op}'.")
+                response.update(ok=True, result=handler(request))
+            except Exception as ex:  # pylint: disable=broad-except
+                response.update(ok=False, error=str(ex), error_type=type(ex).__name__)
+            work_seconds = time.perf_counter() - started
+            name = op if handler is not None else "unknown"
+            self.stats.end(name, response["ok"], work_seconds, started - submitted, pooled)
+            response.update(work_seconds=work_seconds, queue_seconds=started - submitted)
+            return response
+
+        if not pooled:
+            return job()
+        return self.executor.submit(job).result()
+
+    def close(self) -> None:
+        """Wait for the running jobs and stop the worker pool."""
+        self.executor.shutdown(wait=True)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Serve the newline-delimited JSON requests of one connection, in order."""
+
+    server: "WatermarkDaemon"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("A request must be a JSON object.")
+            except ValueError as ex:
+                response = {"ok": False, "error": str(ex), "error_type": "ValueError"}
+            else:
+                if request.get("op") == "shutdown":
+                    response = {"id": request.get("id"), "ok": True, "result": {}}
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                else:
+                    response = self.server.service.handle(request)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class WatermarkDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """UNIX socket server handing the requests of each connection to a `WatermarkService`."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: WatermarkService):
+        """Bind the socket, which only the owner of the process may use.
+
+        Args:
+            socket_path (str): Path of the socket.
+            service (WatermarkService): The warm service.
+
+        Raises:
+            RuntimeError: If another daemon is already listening on `socket_path`.
+        """
+        self.service = service
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                # Left behind by a daemon that did not exit cleanly
+                os.unlink(socket_path)
+            else:
+                raise RuntimeError(f"A daemon is already listening on {socket_path}.")
+            finally:
+                probe.close()
+        previous_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _RequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def parse_shape(value: str) -> tuple[int, int, int]:
+    """Parse an image size given as WIDTHxHEIGHT into an RGB image shape.
+
+    Args:
+        value (str): The size, e.g. "1920x1080".
+
+    Returns:
+        tuple[int, int, int]: The shape (H, W, 3).
+    """
+    width, height = value.lower().split("x")
+    return int(height), int(width), 3
+
+
+def main() -> None:
+    """Start the daemon and serve until SIGINT, SIGTERM or a shutdown request."""
+    parser = argparse.ArgumentParser(description="Serve watermarking jobs from a warm process.")
+    parser.add_argument("--socket", default=None, help="Socket path of the daemon.")
+    parser.add_argument("--key-dir", default=os.environ.get("DEEPSHIELD_KEY_DIR"))
+    parser.add_argument("--registry-dir", default="registry")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--watermark-length", type=int, default=255)
+    parser.add_argument("--threshold", type=float, default=80.0)
+    parser.add_argument(
+        "--warm-size",
+        type=parse_shape,
+        action="append",
+        default=[],
+        help="WIDTHxHEIGHT of images to prepare for at startup; may be repeated.",
+    )
+    args = parser.parse_args()
+
+    service = WatermarkService(
+        key_dir=args.key_dir,
+        registry_dir=args.registry_dir,
+        workers=args.workers,
+        alpha=args.alpha,
+        watermark_length=args.watermark_length,
+        threshold=args.threshold,
+        warm_shapes=tuple(args.warm_size),
+    )
+    server = WatermarkDaemon(args.socket or default_socket_path(), service)
+
+    def stop(*_) -> None:
+        # `shutdown` blocks until `serve_forever` returns, so it cannot run on the main thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(
+        f"Serving on {server.socket_path} with {args.workers} workers "
+        f"(ready in {service.stats.startup_seconds:.2f}s, "
+        f"{len(service.registry)} registered images)",
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,246 @@
 
 """dwt_dct.py: Watermarking Technique - 2DWT+DCT."""
 
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Iterable, Iterator
+
 import numpy as np
+from pywt import dwt_coeff_len
 
 from watermarking.strategies.base import IWatermarkMethod
 from watermarking.utils.preprocess import normalize_array
-from watermarking.utils.watermark_encode_decode import dwt2dct_decode_2d, dwt2dct_encode_2d
+from watermarking.utils.watermark_encode_decode import (
+    diagonals_to_ll2,
+    dwt2dct_decode_2d,
+    dwt2dct_encode_2d,
+    ll2_to_diagonals,
+)
+
+
+@dataclass(frozen=True)
+class EmbeddingPlan:
+    """Everything an embedding needs that does not depend on the pixel values.
+
+    A plan is derived once per resolution and reused for every frame of that resolution: the
+    zigzag order of the transform (cached by shape), the watermark positions and the ground
+    truth watermark matrix.
+
+    Attributes:
+        shape (tuple[int, int, int]): Shape (H, W, C) of the images the plan applies to.
+        watermark (np.ndarray): The watermark sequence.
+        watermark_positions (np.ndarray): Placement indices within the transformed space.
+        alpha (float): Embedding strength.
+        ground_truth_watermark (np.ndarray): Ground truth watermark matrix, as returned by
+            `DWT2DCTWatermarkMethod.embed`.
+    """
+
+    shape: tuple[int, int, int]
+    watermark: np.ndarray
+    watermark_positions: np.ndarray
+    alpha: float
+    ground_truth_watermark: np.ndarray
+
+
+# Side of the pixel block that one coefficient of the level 2 approximation (LL2) spans
+LL2_BLOCK = 4
+
+
+def _pool2(array: np.ndarray, combine: np.ufunc) -> np.ndarray:
+    """Combine every 2 x 2 block along the first two axes, padding like the Haar transform.
+
+    An odd row or column count is padded by repeating the last row or column, as the
+    "symmetric" mode of the wavelet transform does. Pooling twice with `np.add` and dividing by
+    4 gives the level 2 approximation (LL2) of the two level Haar transform.
+    """
+    if array.shape[0] % 2:
+        array = np.concatenate([array, array[-1:]], axis=0)
+    array = combine(array[0::2], array[1::2])
+    if array.shape[1] % 2:
+        array = np.concatenate([array, array[:, -1:]], axis=1)
+    return combine(array[:, 0::2], array[:, 1::2])
+
+
+def _by_plane(blocks: np.ndarray) -> np.ndarray:
+    """Copy (rows, cols, planes) blocks into a contiguous (planes, rows * cols) array."""
+    return np.ascontiguousarray(blocks.reshape(-1, blocks.shape[2]).T)
+
+
+@dataclass(frozen=True)
+class DistortionModel:
+    """Pixel distortion of an embedding as a function of alpha, for one image.
+
+    At a position the even and odd diagonal frequencies `e` and `o` are replaced by their
+    average plus and minus `alpha * w`, a change of `+-((o - e) / 2 + alpha * w)` that is linear
+    in alpha. The inverse DCT and zigzag map it to a change of the level 2 approximation (LL2),
+    and the Haar synthesis spreads every LL2 coefficient evenly over its 4 x 4 pixel block: the
+    pixels change by a quarter of it. The error of the embedding is therefore known from a few
+    sums per block, without the inverse wavelet transform. This includes the final min-max
+    normalization of the RGB method, which only depends on the extremes of each block.
+
+    Errors are measured in the 0-255 scale against the planes the watermark is embedded into,
+    i.e. against the original image for the luma method, and against the min-max normalized
+    channels for the RGB method (the original, for images that use the full range). Clipping
+    is not modeled, and the conversion to integers only by its average error. For image sizes
+    that are not multiples of 4, the pixel sums of the last row and column of blocks are
+    approximated from their mean.
+
+    Attributes:
+        offsets (np.ndarray): LL2 change at alpha 0, shape (rows, cols, planes).
+        slopes (np.ndarray): LL2 change per unit of alpha, shape (rows, cols, planes).
+        block_pixels (np.ndarray): Number of pixels of each block, shape (rows, cols, 1).
+        block_sums (np.ndarray): Sum of the [0, 1] plane values of each block.
+        block_max (np.ndarray): Maximum plane value of each block.
+        block_min (np.ndarray): Minimum plane value of each block.
+        plane_squares (np.ndarray): Sum of the squared plane values, shape (planes,).
+        renormalize (bool): Whether the embedding stretches every plane back to [0, 1].
+        truncate (bool): Whether the embedding truncates to integers rather than rounding.
+    """
+
+    offsets: np.ndarray
+    slopes: np.ndarray
+    block_pixels: np.ndarray
+    block_sums: np.ndarray
+    block_max: np.ndarray
+    block_min: np.ndarray
+    plane_squares: np.ndarray
+    renormalize: bool
+    truncate: bool
+
+    @property
+    def pixels(self) -> int:
+        """Number of pixels (H * W) of the image."""
+        return int(self.block_pixels.sum())
+
+    @cached_property
+    def _moments(self) -> dict[str, np.ndarray]:
+        """Sums over all pixels of every plane, as polynomial coefficients in alpha."""
+        axes = (0, 1)
+        offsets, slopes = self.offsets / LL2_BLOCK, self.slopes / LL2_BLOCK  # Pixel changes
+        weighted_offsets, weighted_slopes = self.block_pixels * offsets, self.block_pixels * slopes
+        return {
+            "change": np.stack([weighted_offsets.sum(axes), weighted_slopes.sum(axes)]),
+            "change_squares": np.stack(
+                [
+                    np.sum(weighted_offsets * offsets, axis=axes),
+                    2 * np.sum(weighted_offsets * slopes, axis=axes),
+                    np.sum(weighted_slopes * slopes, axis=axes),
+                ]
+            ),
+            "plane_change": np.stack(
+                [
+                    np.sum(self.block_sums * offsets, axis=axes),
+                    np.sum(self.block_sums * slopes, axis=axes),
+                ]
+            ),
+            "plane": np.sum(self.block_sums, axis=axes),
+            # Plane by plane, for fast reductions
+            "high": _by_plane(self.block_max + offsets),
+            "low": _by_plane(self.block_min + offsets),
+            "slopes": _by_plane(slopes),
+        }
+
+    def mse(self, alpha: float) -> float:
+        """Predict the mean squared pixel error of an embedding, in the 0-255 scale.
+
+        Args:
+            alpha (float): Embedding strength.
+
+        Returns:
+            float: The predicted mean squared error.
+        """
+        moments = self._moments
+        change_sums = moments["change"][0] + alpha * moments["change"][1]
+        change_squares = moments["change_squares"].T @ [1, alpha, alpha**2]
+        if not self.renormalize:
+            error_sums, squared_error = change_sums, change_squares
+        else:
+            # The output (x + change - low) / (high - low) is affine in x + change
+            step = alpha * moments["slopes"]
+            high = np.max(moments["high"] + step, axis=1)
+            low = np.min(moments["low"] + step, axis=1)
+            gain, shift = 1 / (high - low), -low / (high - low)
+            plane_sums = moments["plane"]
+            plane_change = moments["plane_change"][0] + alpha * moments["plane_change"][1]
+            error_sums = (gain - 1) * plane_sums + gain * change_sums + self.pixels * shift
+            squared_error = (
+                (gain - 1) ** 2 * self.plane_squares
+                + gain**2 * change_squares
+                + self.pixels * shift**2
+                + 2 * (gain - 1) * gain * plane_change
+                + 2 * (gain - 1) * shift * plane_sums
+                + 2 * gain * shift * change_sums
+            )
+
+        values = self.pixels * self.offsets.shape[2]
+        mse = 255.0**2 * float(np.sum(squared_error)) / values
+        if self.truncate:
+            # Truncating an error e gives floor(e): on average e - e_mean + 1/3 squared
+            return mse - 255.0 * float(np.sum(error_sums)) / values + 1 / 3
+        return mse + 1 / 12  # Rounding error, uniform in [-0.5, 0.5)
+
+    def psnr(self, alpha: float) -> float:
+        """Predict the PSNR of an embedding.
+
+        Args:
+            alpha (float): Embedding strength.
+
+        Returns:
+            float: The predicted PSNR in dB.
+        """
+        return float(10 * np.log10(255.0**2 / self.mse(alpha)))
+
+    def max_alpha(
+        self,
+        target_psnr: float,
+        tolerance: float = 1e-4,
+        upper_bound: float = 64.0,
+        samples: int = 16,
+    ) -> float:
+        """Search the largest alpha whose predicted PSNR is at least `target_psnr`.
+
+        The PSNR mostly falls with alpha, but not everywhere: with the min-max normalization of
+        the RGB method, a slightly stronger watermark can narrow the range of the output and
+        lower the error. The search therefore first finds an interval in which the PSNR drops
+        below the target, samples it evenly for the last alpha that meets the target, and then
+        bisects between that sample and the next.
+
+        Args:
+            target_psnr (float): The minimum PSNR in dB.
+            tolerance (float, optional): Width of the final search interval. Defaults to 1e-4.
+            upper_bound (float, optional): Largest alpha returned. Defaults to 64.0.
+            samples (int, optional): Number of evenly spaced alphas tried before the
+                bisection. Defaults to 16.
+
+        Returns:
+            float: The largest such alpha, rounded down to the tolerance.
+
+        Raises:
+            ValueError: If the target PSNR is out of reach for all sampled alphas.
+        """
+        high = 1.0
+        while self.psnr(high) >= target_psnr:
+            if high >= upper_bound:
+                return upper_bound
+            high = min(2 * high, upper_bound)
+
+        candidates = np.linspace(0.0, high, samples + 1)
+        psnrs = [self.psnr(alpha) for alpha in candidates]
+        passing = [alpha for alpha, value in zip(candidates, psnrs) if value >= target_psnr]
+        if not passing:
+            raise ValueError(
+                f"No alpha reaches a PSNR of {target_psnr} dB, at most {max(psnrs):.2f} dB."
+            )
+
+        low = passing[-1]
+        high = low + high / samples
+        while high - low > tolerance:
+            middle = 0.5 * (low + high)
+            if self.psnr(middle) >= target_psnr:
+                low = middle
+            else:
+                high = middle
+        return float(low)
 
 
 class DWT2DCTWatermarkMethod(IWatermarkMethod):
@@ -37,55 +272,227 @@ class DWT2DCTWatermarkMethod(IWatermarkMethod):
                 considering the watermark position.
         """
         assert len(image.shape) == 3, "Expecting 3D [H,W,C] image"
-        _, _, channels = image.shape
+        plan = self.make_plan(image.shape, watermark, watermark_positions, alpha)
+        return self.embed_with_plan(image, plan), plan.ground_truth_watermark
 
-        # Prepare output image (float to avoid rounding issues)
-        watermarked_image = np.zeros_like(image, dtype=np.float64)
+    def make_plan(
+        self,
+        shape: tuple[int, int, int],
+        watermark: np.ndarray,
+        watermark_positions: np.ndarray,
+        alpha: float,
+    ) -> EmbeddingPlan:
+        """Derive the pixel-independent part of an embedding for images of one shape.
+
+        Args:
+            shape (tuple[int, int, int]): Shape (H, W, C) of the images.
+            watermark (np.ndarray): The watermark sequence.
+            watermark_positions (np.ndarray): Placement indices within the transformed space.
+            alpha (float): Embedding strength.
+
+        Returns:
+            EmbeddingPlan: The plan, to be passed to `embed_with_plan`.
+        """
+        height, width, channels = shape
+
+        # The diagonals hold every other coefficient of the level 2 approximation (LL2)
+        rows = dwt_coeff_len(dwt_coeff_len(height, 2, "symmetric"), 2, "symmetric")
+        cols = dwt_coeff_len(dwt_coeff_len(width, 2, "symmetric"), 2, "symmetric")
+        diagonal_length = rows * cols // 2
 
-        ground_truth_per_channel = []
+        # Insert watermark bits at those positions, identically for every channel
+        ground_truth_watermark = np.zeros((diagonal_length, channels), dtype=int)
+        ground_truth_watermark[watermark_positions] = np.asarray(watermark)[:, np.newaxis]
 
+        return EmbeddingPlan(
+            shape=tuple(shape),
+            watermark=watermark,
+            watermark_positions=watermark_positions,
+            alpha=alpha,
+            ground_truth_watermark=ground_truth_watermark,
+        )
+
+    def embed_with_plan(self, image: np.ndarray, plan: EmbeddingPlan) -> np.ndarray:
+        """Embed the watermark of a plan into an image, transforming all channels at once.
+
+        Args:
+            image (np.ndarray): The original host image, of shape `plan.shape`.
+            plan (EmbeddingPlan): Plan made by `make_plan`.
+
+        Returns:
+            np.ndarray: The watermarked image (float64 holding integer values in [0, 255]).
+
+        Raises:
+            ValueError: If the image does not have the shape of the plan.
+        """
+        if image.shape != plan.shape:
+            raise ValueError(f"Image of shape {image.shape} does not match the plan {plan.shape}.")
+        channels = image.shape[2]
+
+        # Apply combined DWT & DCT encoding to decompose the image into frequency components
+        image_channels = self.embedding_planes(image)
+        coeffs, coeffs2, (diag_even_freq, diag_odd_freq) = dwt2dct_encode_2d(image_channels)
+
+        positions = plan.watermark_positions
+        watermark = np.asarray(plan.watermark)[:, np.newaxis]
+
+        diag_even_freq_new = diag_even_freq.copy()
+        diag_odd_freq_new = diag_odd_freq.copy()
+
+        avg_val = 0.5 * (diag_even_freq[positions] + diag_odd_freq[positions])
+
+        # Compute new diagonal values reflecting the embedded watermark with controlled strength
+        diag_even_freq_new[positions] = avg_val + plan.alpha * watermark  # Positive offset
+        diag_odd_freq_new[positions] = avg_val - plan.alpha * watermark  # Negative offset
+
+        # inverse transform
+        output = dwt2dct_decode_2d(
+            coeffs, coeffs2, (diag_even_freq_new, diag_odd_freq_new), image.shape
+        )
+
+        # Prepare output image (float to avoid rounding issues)
+        watermarked_image = np.empty(image.shape, dtype=np.float64)
         for ch in range(channels):
-            image_channel = image[:, :, ch].astype(np.float64)
+            watermarked_image[:, :, ch] = normalize_array(output[:, :, ch])
+        return watermarked_image
 
-            image_channel = normalize_array(image_channel, scale=1, dtype=np.float64)
+    def embedding_planes(self, image: np.ndarray) -> np.ndarray:
+        """Scale the planes the watermark is embedded into to [0, 1].
 
-            # Apply combined DWT & DCT encoding to decompose the image into frequency components
-            coeffs, coeffs2, (diag_even_freq, diag_odd_freq) = dwt2dct_encode_2d(image_channel)
+        Args:
+            image (np.ndarray): The (H, W, C) host image.
 
-            # Make ground-truth array for this channel same length as diag_even_freq
-            gt_ch = np.zeros_like(diag_even_freq, dtype=int)
+        Returns:
+            np.ndarray: Every channel, min-max normalized to [0, 1], shape (H, W, C).
+        """
+        planes = np.empty(image.shape, dtype=np.float64)
+        for ch in range(image.shape[2]):
+            normalize_array(image[:, :, ch], scale=1, out=planes[:, :, ch])
+        return planes
 
-            # Insert watermark bits at those positions
-            gt_ch[watermark_positions] = watermark
+    def distortion_model(
+        self, image: np.ndarray, watermark: np.ndarray, watermark_positions: np.ndarray
+    ) -> DistortionModel:
+        """Prepare the prediction of the distortion of embedding into an image, for any alpha.
 
-            diag_even_freq_new = diag_even_freq.copy()
-            diag_odd_freq_new = diag_odd_freq.copy()
+        This costs a few passes over the image, a fraction of an embedding. Every prediction
+        after that only touches one value per 4 x 4 pixel block.
 
-            avg_val = 0.5 * (
-                diag_even_freq[watermark_positions] + diag_odd_freq[watermark_positions]
-            )
+        Args:
+            image (np.ndarray): The original (H, W, C) host image.
+            watermark (np.ndarray): The watermark sequence.
+            watermark_positions (np.ndarray): Placement indices within the transformed space.
 
-            # Compute new diagonal values reflecting the embedded watermark with controlled strength
-            xp1 = avg_val + alpha * watermark  # Even diagonal with positive offset
-            xp2 = avg_val - alpha * watermark  # Odd diagonal with negative offset
-            # Update frequency coefficients with embedded watermark signals
-            diag_even_freq_new[watermark_positions] = xp1
-            diag_odd_freq_new[watermark_positions] = xp2
+        Returns:
+            DistortionModel: The model, see `DistortionModel.mse` and `DistortionModel.psnr`.
+        """
+        assert len(image.shape) == 3, "Expecting 3D [H,W,C] image"
+        planes = self.embedding_planes(image)
+        height, width = planes.shape[:2]
+
+        # The Haar approximation is a block average: pool the blocks instead of transforming
+        block_totals = _pool2(_pool2(planes, np.add), np.add)
+        rows, cols = block_totals.shape[:2]
+        diag_even_freq, diag_odd_freq = ll2_to_diagonals(block_totals / LL2_BLOCK)
+        block_pixels = np.outer(
+            np.minimum(LL2_BLOCK, height - LL2_BLOCK * np.arange(rows)),
+            np.minimum(LL2_BLOCK, width - LL2_BLOCK * np.arange(cols)),
+        )[:, :, np.newaxis]
+
+        # Change of the diagonal frequencies at alpha 0 and per unit of alpha
+        offset_even = np.zeros_like(diag_even_freq)
+        half_difference = 0.5 * (
+            diag_odd_freq[watermark_positions] - diag_even_freq[watermark_positions]
+        )
+        offset_even[watermark_positions] = half_difference
+        slope_even = np.zeros_like(diag_even_freq)
+        slope_even[watermark_positions] = np.asarray(watermark)[:, np.newaxis]
+
+        return DistortionModel(
+            offsets=diagonals_to_ll2(offset_even, -offset_even, rows, cols),
+            slopes=diagonals_to_ll2(slope_even, -slope_even, rows, cols),
+            block_pixels=block_pixels,
+            # Padded blocks hold repeated pixels, which leaves the mean and extremes unchanged
+            block_sums=block_totals / LL2_BLOCK**2 * block_pixels,
+            block_max=_pool2(_pool2(planes, np.maximum), np.maximum),
+            block_min=_pool2(_pool2(planes, np.minimum), np.minimum),
+            plane_squares=np.einsum("ijk,ijk->k", planes, planes),
+            renormalize=True,
+            truncate=True,  # By the cast of `normalize_array` to uint8
+        )
+
+    def estimate_distortion(
+        self,
+        image: np.ndarray,
+        watermark: np.ndarray,
+        watermark_positions: np.ndarray,
+        alpha: float,
+    ) -> tuple[float, float]:
+        """Predict the distortion of an embedding without running the inverse transform.
 
-            # inverse transform
-            output_channel = dwt2dct_decode_2d(
-                coeffs, coeffs2, (diag_even_freq_new, diag_odd_freq_new), image_channel.shape
-            )
-            output_channel = normalize_array(output_channel)
-            watermarked_image[:, :, ch] = output_channel
+        Args:
+            image (np.ndarray): The original (H, W, C) host image.
+            watermark (np.ndarray): The watermark sequence.
+            watermark_positions (np.ndarray): Placement indices within the transformed space.
+            alpha (float): Embedding strength.
+
+        Returns:
+            tuple[float, float]: The predicted mean squared error (0-255 scale) and PSNR in dB.
+        """
+        model = self.distortion_model(image, watermark, watermark_positions)
+        return model.mse(alpha), model.psnr(alpha)
+
+    def select_alpha(
+        self,
+        image: np.ndarray,
+        watermark: np.ndarray,
+        watermark_positions: np.ndarray,
+        target_psnr: float,
+    ) -> float:
+        """Find the strongest embedding of an image whose predicted PSNR meets a target.
+
+        Args:
+            image (np.ndarray): The original (H, W, C) host image.
+            watermark (np.ndarray): The watermark sequence.
+            watermark_positions (np.ndarray): Placement indices within the transformed space.
+            target_psnr (float): The minimum PSNR in dB.
 
-            # store ground truth + mask
-            ground_truth_per_channel.append(gt_ch)
+        Returns:
+            float: The largest alpha whose predicted PSNR is at least `target_psnr`.
+
+        Raises:
+            ValueError: If the target PSNR is out of reach, see `DistortionModel.max_alpha`.
+        """
+        model = self.distortion_model(image, watermark, watermark_positions)
+        return model.max_alpha(target_psnr)
+
+    def embed_frames(
+        self,
+        frames: Iterable[np.ndarray],
+        watermark: np.ndarray,
+        watermark_positions: np.ndarray,
+        alpha: float,
+    ) -> Iterator[np.ndarray]:
+        """Embed one watermark into a sequence of frames, e.g. a video stream.
 
-        # Convert all to np arrays
-        ground_truth_watermark = np.stack(ground_truth_per_channel, axis=-1)
+        One plan is made per frame resolution and reused for all frames of that resolution.
 
-        return watermarked_image, ground_truth_watermark
+        Args:
+            frames (Iterable[np.ndarray]): The host frames, each of shape (H, W, C).
+            watermark (np.ndarray): The watermark sequence.
+            watermark_positions (np.ndarray): Placement indices within the transformed space.
+            alpha (float): Embedding strength.
+
+        Yields:
+            np.ndarray: The watermarked frames, in order.
+        """
+        plans: dict[tuple[int, ...], EmbeddingPlan] = {}
+        for frame in frames:
+            plan = plans.get(frame.shape)
+            if plan is None:
+                plan = self.make_plan(frame.shape, watermark, watermark_positions, alpha)
+                plans[frame.shape] = plan
+            yield self.embed_with_plan(frame, plan)
 
     def extract(self, image: np.ndarray, watermark_positions: np.ndarray) -> np.ndarray:
         """Extract a previously embedded watermark from a given image.
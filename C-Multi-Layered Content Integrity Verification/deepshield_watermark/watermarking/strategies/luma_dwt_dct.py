@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+"""luma_dwt_dct.py: Watermarking Technique - 2DWT+DCT on the luma plane only."""
+
+import dataclasses
+
+import numpy as np
+
+from watermarking.strategies.dwt_dct import (
+    DistortionModel,
+    DWT2DCTWatermarkMethod,
+    EmbeddingPlan,
+)
+from watermarking.utils.watermark_encode_decode import dwt2dct_decode_2d, dwt2dct_encode_2d
+
+# ITU-R BT.601 weights of R, G and B in the luma Y
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114])
+
+
+def rgb_to_luma(image: np.ndarray) -> np.ndarray:
+    """Compute the BT.601 luma plane of an RGB image.
+
+    Args:
+        image (np.ndarray): The (H, W, 3) RGB image.
+
+    Returns:
+        np.ndarray: The (H, W) float64 luma, in the value range of the image.
+    """
+    return image @ LUMA_WEIGHTS
+
+
+class LumaDWT2DCTWatermarkMethod(DWT2DCTWatermarkMethod):
+    """DWT + DCT watermarking of the luma (Y of YCbCr) plane instead of each RGB channel.
+
+    The image is transformed once instead of three times, and the ground truth watermark
+    matrix has a single column. The chroma planes are left untouched. Since R, G and B all
+    carry Y with a weight of 1, the watermarked image is the original plus the change of the
+    luma in every channel, with no conversion back from YCbCr. Lossy codecs keep the luma at full
+    resolution and subsample the chroma, so the watermark is where they preserve the most.
+
+    Images and ground truth matrices of this method cannot be verified with
+    `DWT2DCTWatermarkMethod`, and vice versa.
+    """
+
+    def make_plan(
+        self,
+        shape: tuple[int, int, int],
+        watermark: np.ndarray,
+        watermark_positions: np.ndarray,
+        alpha: float,
+    ) -> EmbeddingPlan:
+        """Derive the pixel-independent part of an embedding for images of one shape.
+
+        Args:
+            shape (tuple[int, int, int]): Shape (H, W, C) of the images.
+            watermark (np.ndarray): The watermark sequence.
+            watermark_positions (np.ndarray): Placement indices within the transformed space.
+            alpha (float): Embedding strength.
+
+        Returns:
+            EmbeddingPlan: The plan; its ground truth watermark matrix has shape (length, 1).
+        """
+        height, width, _ = shape
+        plan = super().make_plan((height, width, 1), watermark, watermark_positions, alpha)
+        return dataclasses.replace(plan, shape=tuple(shape))
+
+    def embed_with_plan(self, image: np.ndarray, plan: EmbeddingPlan) -> np.ndarray:
+        """Embed the watermark of a plan into the luma of an image.
+
+        Args:
+            image (np.ndarray): The original (H, W, 3) RGB host image, of shape `plan.shape`.
+            plan (EmbeddingPlan): Plan made by `make_plan`.
+
+        Returns:
+            np.ndarray: The watermarked image (float64 holding integer values in [0, 255]).
+
+        Raises:
+            ValueError: If the image does not have the shape of the plan.
+        """
+        if image.shape != plan.shape:
+            raise ValueError(f"Image of shape {image.shape} does not match the plan {plan.shape}.")
+
+        luma = self.embedding_planes(image)[:, :, 0]
+        coeffs, coeffs2, (diag_even_freq, diag_odd_freq) = dwt2dct_encode_2d(luma)
+
+        positions = plan.watermark_positions
+        watermark = np.asarray(plan.watermark)
+
+        diag_even_freq_new = diag_even_freq.copy()
+        diag_odd_freq_new = diag_odd_freq.copy()
+
+        avg_val = 0.5 * (diag_even_freq[positions] + diag_odd_freq[positions])
+        diag_even_freq_new[positions] = avg_val + plan.alpha * watermark  # Positive offset
+        diag_odd_freq_new[positions] = avg_val - plan.alpha * watermark  # Negative offset
+
+        luma_watermarked = dwt2dct_decode_2d(
+            coeffs, coeffs2, (diag_even_freq_new, diag_odd_freq_new), luma.shape
+        )
+
+        # Add the change of the luma to every channel, which keeps Cb and Cr unchanged
+        watermarked_image = image + 255.0 * (luma_watermarked - luma)[:, :, np.newaxis]
+        return np.clip(np.rint(watermarked_image), 0, 255, out=watermarked_image)
+
+    def embedding_planes(self, image: np.ndarray) -> np.ndarray:
+        """Scale the luma, the only plane the watermark is embedded into, to [0, 1].
+
+        The luma is divided by 255 rather than min-max normalized, so that alpha has the same
+        meaning as for the RGB method and the luma change maps back to pixels directly.
+
+        Args:
+            image (np.ndarray): The (H, W, 3) RGB host image.
+
+        Returns:
+            np.ndarray: The luma, shape (H, W, 1).
+        """
+        return (rgb_to_luma(image) / 255.0)[:, :, np.newaxis]
+
+    def distortion_model(
+        self, image: np.ndarray, watermark: np.ndarray, watermark_positions: np.ndarray
+    ) -> DistortionModel:
+        """Prepare the prediction of the distortion of embedding into an image, for any alpha.
+
+        Every channel changes by the change of the luma, so the luma error is the pixel error.
+
+        Args:
+            image (np.ndarray): The original (H, W, 3) RGB host image.
+            watermark (np.ndarray): The watermark sequence.
+            watermark_positions (np.ndarray): Placement indices within the transformed space.
+
+        Returns:
+            DistortionModel: The model, see `DistortionModel.mse` and `DistortionModel.psnr`.
+        """
+        model = super().distortion_model(image, watermark, watermark_positions)
+        # The output is rounded and clipped instead of normalized
+        return dataclasses.replace(model, renormalize=False, truncate=False)
+
+    def extract(self, image: np.ndarray, watermark_positions: np.ndarray) -> np.ndarray:
+        """Extract a previously embedded watermark from the luma of an image.
+
+        Args:
+            image (np.ndarray): The (H, W, 3) RGB image containing the embedded watermark.
+            watermark_positions (np.ndarray): Original placement indices within the transformed
+                space.
+
+        Returns:
+            np.ndarray: The extracted watermark sequence (+1/-1 values).
+        """
+        assert len(image.shape) == 3, f"Image needs to be 3D (H, W, C), got {image.shape}"
+        _, _, (diag_even_freq, diag_odd_freq) = dwt2dct_encode_2d(rgb_to_luma(image))
+        diag_extraction = diag_even_freq[watermark_positions] - diag_odd_freq[watermark_positions]
+        return np.where(diag_extraction >= 0, 1, -1)
+
+    def extract_watermark_matrix(self, watermarked_image: np.ndarray) -> np.ndarray:
+        """Extract the signed watermark values of all positions from the luma.
+
+        Args:
+            watermarked_image (np.ndarray): The (H, W, 3) RGB image that contains the watermark.
+
+        Returns:
+            np.ndarray: The extracted signed watermark values, shape (length, 1), comparable
+                with the ground truth matrix of `make_plan`.
+        """
+        _, _, (diag_even_freq, diag_odd_freq) = dwt2dct_encode_2d(rgb_to_luma(watermarked_image))
+        return np.sign(diag_even_freq - diag_odd_freq).astype(int)[:, np.newaxis]
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+"""image_io.py: Decode images straight into normalized RGB arrays."""
+
+import os
+from typing import Union
+
+import numpy as np
+
+from watermarking.utils.preprocess import min_max, normalize_array
+
+ImageSource = Union[str, os.PathLike, bytes, bytearray, memoryview]
+
+
+def _import_cv2():
+    """Import OpenCV on first use so that the watermarking core does not depend on it."""
+    import cv2  # pylint: disable=import-outside-toplevel
+
+    return cv2
+
+
+def decode_rgb(source: ImageSource) -> np.ndarray:
+    """Decode an image file or an in-memory encoded image into an RGB array.
+
+    Args:
+        source (ImageSource): Path to the image, or its encoded bytes (e.g. an HTTP body).
+
+    Returns:
+        np.ndarray: The decoded image.
+            Shape: (H, W, 3)
+            Dtype: uint8
+
+    Raises:
+        ValueError: If the data cannot be decoded as an image.
+    """
+    cv2 = _import_cv2()
+
+    # Newer OpenCV versions can hand out RGB directly, saving the channel swap
+    rgb_flag = getattr(cv2, "IMREAD_COLOR_RGB", None)
+    flags = rgb_flag if rgb_flag is not None else cv2.IMREAD_COLOR
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        image = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flags)
+        name = "<in-memory image>"
+    else:
+        name = os.fspath(source)
+        image = cv2.imread(name, flags)
+
+    if image is None:
+        raise ValueError(f"Could not decode image from {name}.")
+
+    if rgb_flag is None:
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    return image
+
+
+def is_full_range(image: np.ndarray) -> bool:
+    """Check whether `image` already is a full-range uint8 array, i.e. normalization is a no-op.
+
+    Args:
+        image (np.ndarray): Image to inspect.
+
+    Returns:
+        bool: True if the image is uint8 with a minimum of 0 and a maximum of 255.
+    """
+    if image.dtype != np.uint8 or image.size == 0:
+        return False
+    lo, hi = min_max(image)
+    return lo == 0 and hi == 255
+
+
+def load_image(source: ImageSource) -> np.ndarray:
+    """Load an image as a normalized RGB array with as few full-image copies as possible.
+
+    The decoded array is normalized in place and returned; OpenCV always allocates the decoded
+    image itself, so there is no way to decode into a caller's buffer.
+
+    Args:
+        source (ImageSource): Path to the image, or its encoded bytes.
+
+    Returns:
+        np.ndarray: The RGB image normalized to the range [0, 255] as uint8.
+
+    Raises:
+        ValueError: If the image cannot be decoded.
+    """
+    image = decode_rgb(source)
+
+    if not is_full_range(image):
+        normalize_array(image, out=image)
+    return image
@@ -2,8 +2,26 @@
 
 """keys_manager.py: Generates a pair of RSA keys (private and public) for secure communication."""
 
+import contextlib
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, Optional
+
 from Crypto.PublicKey import RSA
 
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, key creation is only atomic per file
+    fcntl = None
+
+PRIVATE_KEY_FILENAME = "private.pem"
+PUBLIC_KEY_FILENAME = "public.pem"
+# Serializes the creation of a key pair between processes sharing a key directory
+LOCK_FILENAME = ".keys.lock"
+
 
 def generate_keys(key_size: int = 2048) -> tuple[bytes, bytes]:
     """Create a new pair of RSA keys.
@@ -27,3 +45,186 @@ def generate_keys(key_size: int = 2048) -> tuple[bytes, bytes]:
     public_key = key.publickey().export_key()
 
     return private_key, public_key
+
+
+class KeyStore:
+    """Lazily provide a key pair, loading it from a directory on first use.
+
+    If the directory does not contain a key pair yet, one is generated and written there so
+    that later processes reuse it. Creation holds an exclusive lock on the directory and every
+    file is written to a temporary file and renamed into place, so processes starting together
+    agree on a single pair and never read a partially written key. Without a directory the pair
+    only lives in memory.
+    """
+
+    def __init__(self, key_dir: Optional[str] = None, key_size: int = 2048):
+        """Initialize the key store without touching any key material.
+
+        Args:
+            key_dir (Optional[str], optional): Directory holding `private.pem` and `public.pem`.
+                Defaults to None (in-memory only).
+            key_size (int, optional): Bit length used if a new pair must be generated.
+                Defaults to 2048.
+        """
+        self.key_dir = key_dir
+        self.key_size = key_size
+        self._keys: Optional[tuple[bytes, bytes]] = None
+        self._lock = threading.Lock()
+
+    def get_keys(self) -> tuple[bytes, bytes]:
+        """Return the key pair, loading or generating it on the first call.
+
+        Returns:
+            tuple[bytes, bytes]: The private and public key.
+        """
+        if self._keys is None:
+            with self._lock:
+                if self._keys is None:
+                    self._keys = self._load_or_create()
+        return self._keys
+
+    def _load_or_create(self) -> tuple[bytes, bytes]:
+        """Read the key pair from `key_dir`, generating and persisting it if missing.
+
+        Returns:
+            tuple[bytes, bytes]: The private and public key.
+        """
+        if self.key_dir is None:
+            return generate_keys(self.key_size)
+
+        keys = self._read_keys()
+        if keys is not None:
+            return keys
+
+        os.makedirs(self.key_dir, exist_ok=True)
+        with self._creation_lock():
+            # Another process may have created the pair while we waited for the lock
+            keys = self._read_keys()
+            if keys is not None:
+                return keys
+            private_key, public_key = generate_keys(self.key_size)
+            # The private key is renamed last: once it exists, the public key is in place too
+            _write_atomically(os.path.join(self.key_dir, PUBLIC_KEY_FILENAME), public_key, 0o644)
+            # The private key must only be readable by its owner
+            _write_atomically(os.path.join(self.key_dir, PRIVATE_KEY_FILENAME), private_key, 0o600)
+        return private_key, public_key
+
+    def _read_keys(self) -> Optional[tuple[bytes, bytes]]:
+        """Read the key pair from `key_dir`.
+
+        Returns:
+            Optional[tuple[bytes, bytes]]: The private and public key, or None if a file is
+                missing.
+        """
+        private_path = os.path.join(self.key_dir, PRIVATE_KEY_FILENAME)
+        public_path = os.path.join(self.key_dir, PUBLIC_KEY_FILENAME)
+        if not (os.path.exists(private_path) and os.path.exists(public_path)):
+            return None
+        with open(private_path, "rb") as f:
+            private_key = f.read()
+        with open(public_path, "rb") as f:
+            public_key = f.read()
+        return private_key, public_key
+
+    @contextlib.contextmanager
+    def _creation_lock(self) -> Iterator[None]:
+        """Hold an exclusive lock on `key_dir` (released on exit, or if the process dies)."""
+        fd = os.open(os.path.join(self.key_dir, LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+
+def _write_atomically(path: str, data: bytes, mode: int) -> None:
+    """Write `data` to a temporary file next to `path` and rename it over `path`.
+
+    Args:
+        path (str): Destination file.
+        data (bytes): Content of the file.
+        mode (int): Permissions of the file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+class KeyPool:
+    """Pre-generate key pairs in the background so that callers never wait on key generation.
+
+    The pool keeps `size` generations in flight. Every `acquire` hands out the oldest pair and
+    immediately schedules a replacement.
+    """
+
+    def __init__(self, size: int = 4, key_size: int = 2048, use_processes: bool = False):
+        """Start generating the first `size` key pairs.
+
+        Args:
+            size (int, optional): Number of key pairs kept ready or in flight. Defaults to 4.
+            key_size (int, optional): Bit length of the generated keys. Defaults to 2048.
+            use_processes (bool, optional): Generate keys in worker processes instead of threads,
+                which scales with the number of cores. Defaults to False.
+
+        Raises:
+            ValueError: If `size` is smaller than 1.
+        """
+        if size < 1:
+            raise ValueError("The key pool size must be at least 1.")
+
+        self.key_size = key_size
+        self._executor: Executor = (
+            ProcessPoolExecutor(max_workers=size)
+            if use_processes
+            else ThreadPoolExecutor(max_workers=size, thread_name_prefix="keypool")
+        )
+        self._pending: deque[Future] = deque()
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._pending.append(self._executor.submit(generate_keys, key_size))
+
+    def acquire(self, timeout: Optional[float] = None) -> tuple[bytes, bytes]:
+        """Take a key pair out of the pool and schedule a replacement.
+
+        Args:
+            timeout (Optional[float], optional): Seconds to wait if no pair is ready yet.
+                Defaults to None (wait indefinitely).
+
+        Returns:
+            tuple[bytes, bytes]: The private and public key.
+
+        Raises:
+            RuntimeError: If the pool has been closed.
+        """
+        with self._lock:
+            if not self._pending:
+                raise RuntimeError("The key pool is closed.")
+            # Prefer a pair that is already finished over the oldest one
+            future = next((f for f in self._pending if f.done()), self._pending[0])
+            self._pending.remove(future)
+            self._pending.append(self._executor.submit(generate_keys, self.key_size))
+        return future.result(timeout=timeout)
+
+    def close(self) -> None:
+        """Stop the background workers, discarding key pairs that were not handed out."""
+        with self._lock:
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "KeyPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
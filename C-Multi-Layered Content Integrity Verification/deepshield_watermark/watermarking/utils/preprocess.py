@@ -2,22 +2,58 @@
 
 """preprocess.py: Preprocessing utilities for any image."""
 
-import random
-from typing import Literal, Optional
+from typing import Optional
 
 import numpy as np
-import torch
-from PIL import Image, ImageFile
-from torchvision import transforms
 
+# Number of elements processed per block, small enough for the block to stay in cache
+BLOCK_ELEMENTS = 1 << 16
 
-def normalize_array(arr, scale=255, dtype=np.uint8) -> np.ndarray:
+
+def _row_blocks(arr: np.ndarray):
+    """Yield slices along the first axis covering roughly `BLOCK_ELEMENTS` elements each.
+
+    Slicing along the first axis keeps every block a view, even for non-contiguous arrays such
+    as a single channel of an (H, W, C) image.
+    """
+    if arr.ndim == 0:
+        yield Ellipsis
+        return
+    row_size = max(1, arr[0].size)
+    rows_per_block = max(1, BLOCK_ELEMENTS // row_size)
+    for start in range(0, arr.shape[0], rows_per_block):
+        yield slice(start, start + rows_per_block)
+
+
+def min_max(arr: np.ndarray) -> tuple:
+    """Find the minimum and maximum of an array in a single pass over memory.
+
+    Both reductions are run block by block, so the second one reads from cache.
+
+    Args:
+        arr (np.ndarray): The input array. Must not be empty.
+
+    Returns:
+        tuple: The minimum and maximum value as NumPy scalars of the array's dtype.
+    """
+    lo, hi = None, None
+    for block in _row_blocks(arr):
+        chunk = arr[block]
+        chunk_lo, chunk_hi = chunk.min(), chunk.max()
+        lo = chunk_lo if lo is None or chunk_lo < lo else lo
+        hi = chunk_hi if hi is None or chunk_hi > hi else hi
+    return lo, hi
+
+
+def normalize_array(arr, scale=255, dtype=np.uint8, out: Optional[np.ndarray] = None) -> np.ndarray:
     """Normalize an array so that its values range from 0 to the specified scale,
     then converts it to the desired data type.
 
     This function first shifts the minimum value in the array to zero, scales all
     elements such that the maximum element becomes equal to 'scale', and finally
-    casts the entire array to the provided data type.
+    casts the entire array to the provided data type. The steps are fused block by block, so
+    apart from `out` no full-size temporary is allocated. A constant array (maximum equal to
+    minimum) is mapped to zeros.
 
     Args:
         arr (np.ndarray): The input NumPy array to be normalized.
@@ -25,12 +61,50 @@ def normalize_array(arr, scale=255, dtype=np.uint8) -> np.ndarray:
             range. Default is set to 255, typical for image processing applications where pixel
             intensity ranges from 0-255.
         dtype (np.dtype, optional): The target data type after conversion. Common choices include
-            np.uint8 or float types. Default is np.uint8.
+            np.uint8 or float types. Default is np.uint8. Ignored when `out` is given.
+        out (Optional[np.ndarray], optional): Array of the same shape as `arr` that receives the
+            result, cast to its own dtype. May be `arr` itself. Defaults to None.
 
     Returns:
-        np.ndarray: A new NumPy array containing the scaled and converted values of the original
-            array.
+        np.ndarray: The normalized array; `out` if provided, otherwise a new array.
+
+    Raises:
+        ValueError: If `out` does not have the shape of `arr`.
     """
-    arr = arr - np.min(arr)  # Shift to start at 0
-    arr = (arr / np.max(arr)) * scale  # Scale
-    return arr.astype(dtype)
+    arr = np.asarray(arr)
+    if out is None:
+        out = np.empty(arr.shape, dtype=dtype)
+    elif out.shape != arr.shape:
+        raise ValueError(f"Output shape {out.shape} does not match input shape {arr.shape}.")
+
+    if arr.size == 0:
+        return out
+
+    lo, hi = min_max(arr)
+    if hi == lo:
+        # Degenerate (constant) input: avoid the division by zero
+        out.fill(0)
+        return out
+
+    # Compute floating point input in its own precision. Integer input is promoted one
+    # cache-sized block at a time, never as a full-size temporary: 8- and 16-bit integers go to
+    # float32, which holds them exactly and truncates to the same integer output as float64 at
+    # half the memory traffic. Wider integers, or a floating point output, keep float64.
+    if arr.dtype.kind == "f":
+        work_dtype = arr.dtype
+    elif arr.dtype.itemsize <= 2 and out.dtype.kind in "biu":
+        work_dtype = np.dtype(np.float32)
+    else:
+        work_dtype = np.dtype(np.float64)
+    lo, span = work_dtype.type(lo), work_dtype.type(hi) - work_dtype.type(lo)
+
+    scratch = None
+    for block in _row_blocks(arr):
+        chunk = arr[block]
+        if scratch is None or scratch.shape != chunk.shape:
+            scratch = np.empty(chunk.shape, dtype=work_dtype)
+        np.subtract(chunk, lo, out=scratch, casting="unsafe")  # Shift to start at 0
+        np.divide(scratch, span, out=scratch)
+        np.multiply(scratch, scale, out=scratch)  # Scale
+        np.copyto(out[block], scratch, casting="unsafe")
+    return out
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+"""registry.py: Append-only registry of watermarked images and their ground truth watermarks."""
+
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterable, Optional, Union
+
+import numpy as np
+
+RECORDS_FILENAME = "records.jsonl"
+
+
+@dataclass
+class RegistryRecord:
+    """One registered image.
+
+    The ground truth watermark matrix holds the watermark at the watermark positions of every
+    channel and zeros elsewhere, so the watermark, its positions and the image shape are enough
+    to rebuild it (see `DWT2DCTWatermarkMethod.make_plan`) and are far smaller to store.
+
+    Attributes:
+        image_id (str): Identifier of the image.
+        shape (tuple[int, int, int]): Shape (H, W, C) of the watermarked image.
+        watermark (list[int]): The watermark sequence (+1/-1 values).
+        watermark_positions (list[int]): Placement indices within the transformed space.
+        alpha (float): Embedding strength.
+        metadata (dict[str, Any]): Free-form information, e.g. the source path.
+        created (float): Registration time as a UNIX timestamp.
+    """
+
+    image_id: str
+    shape: tuple[int, int, int]
+    watermark: list[int]
+    watermark_positions: list[int]
+    alpha: float
+    metadata: dict[str, Any] = field(default_factory=dict)
+    created: float = field(default_factory=time.time)
+
+    def similarity(self, extracted_watermark: np.ndarray) -> float:
+        """Score an extracted watermark matrix against this record.
+
+        Equivalent to the score of `DWT2DCTWatermarkMethod.is_similar` against the ground truth
+        matrix, but only reads the watermark positions.
+
+        Args:
+            extracted_watermark (np.ndarray): Output of `extract_watermark_matrix`.
+
+        Returns:
+            float: Percentage of matching watermark values; 0.0 if the shapes do not match.
+        """
+        positions = np.asarray(self.watermark_positions)
+        if extracted_watermark.ndim != 2 or extracted_watermark.shape[1] != self.shape[2]:
+            return 0.0
+        if positions.size == 0 or positions.max() >= extracted_watermark.shape[0]:
+            return 0.0
+        matches = extracted_watermark[positions] == np.asarray(self.watermark)[:, np.newaxis]
+        return 100.0 * float(np.mean(matches))
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the record.
+
+        Returns:
+            dict[str, Any]: JSON serializable representation of the record.
+        """
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "RegistryRecord":
+        """Deserialize a record written by `to_dict`.
+
+        Args:
+            data (dict[str, Any]): The serialized record.
+
+        Returns:
+            RegistryRecord: The record.
+        """
+        return cls(**{**data, "shape": tuple(data["shape"])})
+
+
+class WatermarkRegistry:
+    """Registry of watermarked images, stored as one JSON line per record.
+
+    The whole registry is read once into memory and indexed by image id and by image shape,
+    so a lookup never touches the disk. New records are appended to the file and to the
+    indexes. Appends are serialized with a lock; use `add_many` to write a batch with a single
+    write and flush.
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike]):
+        """Open the registry, creating its directory if needed, and load its records.
+
+        Args:
+            directory (Union[str, os.PathLike]): Directory of the registry.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, RECORDS_FILENAME)
+        self._lock = threading.Lock()
+        self._by_id: dict[str, RegistryRecord] = {}
+        self._by_shape: dict[tuple[int, int, int], list[RegistryRecord]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(RegistryRecord.from_dict(json.loads(line)))
+
+    def _index(self, record: RegistryRecord) -> None:
+        previous = self._by_id.get(record.image_id)
+        if previous is not None:
+            self._by_shape[previous.shape].remove(previous)
+        self._by_id[record.image_id] = record
+        self._by_shape.setdefault(record.shape, []).append(record)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, image_id: str) -> bool:
+        return image_id in self._by_id
+
+    def get(self, image_id: str) -> Optional[RegistryRecord]:
+        """Look up a record by image id.
+
+        Args:
+            image_id (str): Identifier of the image.
+
+        Returns:
+            Optional[RegistryRecord]: The record, or None if the image is not registered.
+        """
+        return self._by_id.get(image_id)
+
+    def with_shape(self, shape: tuple[int, ...]) -> list[RegistryRecord]:
+        """List the records of images of a given shape.
+
+        Args:
+            shape (tuple[int, ...]): Image shape (H, W, C).
+
+        Returns:
+            list[RegistryRecord]: The records, oldest first.
+        """
+        return list(self._by_shape.get(tuple(shape), ()))
+
+    def add(
+        self,
+        shape: tuple[int, ...],
+        watermark: np.ndarray,
+        watermark_positions: np.ndarray,
+        alpha: float,
+        image_id: Optional[str] = None,
+        metadata: Optional[dict[str, Any]] = None,
+    ) -> RegistryRecord:
+        """Register one watermarked image.
+
+        Args:
+            shape (tuple[int, ...]): Shape (H, W, C) of the watermarked image.
+            watermark (np.ndarray): The watermark sequence.
+            watermark_positions (np.ndarray): Placement indices within the transformed space.
+            alpha (float): Embedding strength.
+            image_id (Optional[str], optional): Identifier of the image. Defaults to None
+                (a random id). Registering an existing id replaces its record.
+            metadata (Optional[dict[str, Any]], optional): Free-form information.
+                Defaults to None.
+
+        Returns:
+            RegistryRecord: The new record.
+        """
+        record = RegistryRecord(
+            image_id=image_id or uuid.uuid4().hex,
+            shape=tuple(int(size) for size in shape),
+            watermark=[int(value) for value in watermark],
+            watermark_positions=[int(position) for position in watermark_positions],
+            alpha=float(alpha),
+            metadata=dict(metadata or {}),
+        )
+        self.add_many([record])
+        return record
+
+    def add_many(self, records: Iterable[RegistryRecord]) -> None:
+        """Append a batch of records with a single write.
+
+        Args:
+            records (Iterable[RegistryRecord]): The records.
+        """
+        records = list(records)
+        if not records:
+            return
+        lines = "".join(json.dumps(record.to_dict()) + "\n" for record in records)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            for record in records:
+                self._index(record)
+
+    def best_match(
+        self, extracted_watermark: np.ndarray, shape: tuple[int, ...]
+    ) -> tuple[Optional[RegistryRecord], float]:
+        """Find the registered image whose watermark best matches an extracted watermark.
+
+        Only images of the same shape are compared.
+
+        Args:
+            extracted_watermark (np.ndarray): Output of `extract_watermark_matrix`.
+            shape (tuple[int, ...]): Shape (H, W, C) of the candidate image.
+
+        Returns:
+            tuple[Optional[RegistryRecord], float]: The best record and its similarity score,
+                or (None, 0.0) if no image of that shape is registered.
+        """
+        best, best_score = None, 0.0
+        for record in self.with_shape(shape):
+            score = record.similarity(extracted_watermark)
+            if best is None or score > best_score:
+                best, best_score = record, score
+        return best, best_score
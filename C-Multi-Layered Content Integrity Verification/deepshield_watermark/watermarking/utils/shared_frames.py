@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+"""shared_frames.py: Hand images to worker processes through shared memory instead of pickles.
+
+Sending an image to a process pool pickles it, copies it through a pipe and unpickles it in the
+worker, and the result takes the same way back. For multi-megabyte images this costs as much as
+the work itself. A `SharedFramePool` instead keeps a set of shared memory slots. The parent
+writes the image into a slot and sends the worker a small `FrameRef`, and the worker maps the
+same memory with `attach`, reading its input and writing its output in place.
+
+Slots are reference counted in the parent and go back to the pool when the last reference is
+released. The counts never leave the parent, so a crashed worker cannot leak a slot: the future
+of its task fails, and the callback releases the references as for any other error. All
+segments are unlinked when the pool is closed. If the parent dies, the multiprocessing resource
+tracker unlinks them. Create the pool before the process pool starts its workers, so that the
+workers share the resource tracker of the parent instead of starting their own, which would
+unlink the segments as soon as a worker exits. Start the workers before other threads use the
+pool, too: a worker forked while a thread is creating a segment inherits the lock of the
+resource tracker held, and blocks forever on its first `attach`.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+import numpy as np
+
+# Shared memory segments a worker keeps mapped between tasks
+ATTACH_CACHE_SIZE = 32
+
+
+@dataclass(frozen=True)
+class FrameRef:
+    """Picklable descriptor of an array held in a shared memory slot.
+
+    Attributes:
+        segment (str): Name of the shared memory segment.
+        slot (int): Index of the slot in its pool.
+        shape (tuple[int, ...]): Shape of the array.
+        dtype (str): Data type of the array.
+    """
+
+    segment: str
+    slot: int
+    shape: tuple[int, ...]
+    dtype: str
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the array in bytes."""
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+
+def _close_segment(segment: shared_memory.SharedMemory, unlink: bool = False) -> None:
+    try:
+        segment.close()
+    except BufferError:
+        # Arrays still view the mapping; it is released together with the last of them
+        pass
+    if unlink:
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+_attached: "OrderedDict[str, shared_memory.SharedMemory]" = OrderedDict()
+_attached_lock = threading.Lock()
+
+
+def attach(ref: FrameRef) -> np.ndarray:
+    """Map the array of a descriptor, e.g. inside a worker process.
+
+    Segments stay mapped for later tasks; the least recently used ones are unmapped once more
+    than `ATTACH_CACHE_SIZE` are mapped.
+
+    Args:
+        ref (FrameRef): Descriptor from `SharedFramePool.acquire`.
+
+    Returns:
+        np.ndarray: The array, sharing memory with the parent. Writes are visible to it.
+    """
+    with _attached_lock:
+        segment = _attached.get(ref.segment)
+        if segment is None:
+            if sys.version_info >= (3, 13):
+                # Only the creating pool may unlink the segment
+                segment = shared_memory.SharedMemory(name=ref.segment, track=False)
+            else:
+                segment = shared_memory.SharedMemory(name=ref.segment)
+            _attached[ref.segment] = segment
+            while len(_attached) > ATTACH_CACHE_SIZE:
+                _close_segment(_attached.popitem(last=False)[1])
+        _attached.move_to_end(ref.segment)
+    return np.ndarray(ref.shape, dtype=ref.dtype, buffer=segment.buf)
+
+
+class SharedFramePool:
+    """A bounded set of reference counted shared memory slots.
+
+    A slot grows when it is handed out for an array larger than its segment; its segment is
+    then replaced by a larger one. The number of slots bounds the number of images in flight.
+    """
+
+    def __init__(self, slots: int, slot_bytes: int = 0):
+        """Initialize the pool. Segments are created lazily.
+
+        Args:
+            slots (int): Maximum number of slots.
+            slot_bytes (int, optional): Minimum size of a new segment, e.g. the size of the
+                largest expected image, so that slots rarely need to grow. Defaults to 0.
+
+        Raises:
+            ValueError: If `slots` is smaller than 1.
+        """
+        if slots < 1:
+            raise ValueError("A shared frame pool needs at least one slot.")
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._segments: list[Optional[shared_memory.SharedMemory]] = [None] * slots
+        self._refcounts = [0] * slots
+        self._free = list(range(slots))
+        self._condition = threading.Condition()
+        self._closed = False
+        # Workers forked from now on share the tracker, see the module docstring
+        resource_tracker.ensure_running()
+
+    def acquire(
+        self, shape: tuple[int, ...], dtype: np.dtype = np.uint8, timeout: Optional[float] = None
+    ) -> FrameRef:
+        """Take a free slot for an array, waiting for one if all are in use.
+
+        Args:
+            shape (tuple[int, ...]): Shape of the array.
+            dtype (np.dtype, optional): Data type of the array. Defaults to np.uint8.
+            timeout (Optional[float], optional): Seconds to wait for a free slot.
+                Defaults to None (wait indefinitely).
+
+        Returns:
+            FrameRef: Descriptor of the slot, holding one reference.
+
+        Raises:
+            TimeoutError: If no slot became free in time.
+            RuntimeError: If the pool is closed.
+        """
+        nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._free or self._closed, timeout):
+                raise TimeoutError(f"No free shared frame slot within {timeout}s.")
+            if self._closed:
+                raise RuntimeError("The shared frame pool is closed.")
+
+            # Prefer a slot whose segment is already large enough
+            fits = [i for i in self._free if self._segment_fits(i, nbytes)]
+            slot = fits[0] if fits else self._free[-1]
+            segment = self._segments[slot]
+            if segment is None or segment.size < nbytes:
+                if segment is not None:
+                    _close_segment(segment, unlink=True)
+                size = max(nbytes, self.slot_bytes)
+                segment = shared_memory.SharedMemory(create=True, size=size)
+                self._segments[slot] = segment
+            self._free.remove(slot)
+            self._refcounts[slot] = 1
+        return FrameRef(segment.name, slot, tuple(int(size) for size in shape), np.dtype(dtype).str)
+
+    def _segment_fits(self, slot: int, nbytes: int) -> bool:
+        segment = self._segments[slot]
+        return segment is not None and segment.size >= nbytes
+
+    def array(self, ref: FrameRef) -> np.ndarray:
+        """View the array of a slot in the parent.
+
+        Args:
+            ref (FrameRef): Descriptor from `acquire`, with at least one reference held.
+
+        Returns:
+            np.ndarray: The array. It must not be used after the last reference is released.
+        """
+        segment = self._segments[ref.slot]
+        return np.ndarray(ref.shape, dtype=ref.dtype, buffer=segment.buf)
+
+    def put(self, image: np.ndarray, timeout: Optional[float] = None) -> FrameRef:
+        """Copy an array into a new slot.
+
+        Args:
+            image (np.ndarray): The array.
+            timeout (Optional[float], optional): Seconds to wait for a free slot.
+                Defaults to None (wait indefinitely).
+
+        Returns:
+            FrameRef: Descriptor of the slot, holding one reference.
+        """
+        ref = self.acquire(image.shape, image.dtype, timeout)
+        np.copyto(self.array(ref), image)
+        return ref
+
+    def retain(self, ref: FrameRef) -> None:
+        """Add a reference to a slot, e.g. before handing it to a second consumer.
+
+        Args:
+            ref (FrameRef): Descriptor of a slot that is in use.
+
+        Raises:
+            ValueError: If the slot is not in use.
+        """
+        with self._condition:
+            if self._refcounts[ref.slot] < 1:
+                raise ValueError(f"Shared frame slot {ref.slot} is not in use.")
+            self._refcounts[ref.slot] += 1
+
+    def release(self, ref: FrameRef) -> None:
+        """Drop a reference; the slot is recycled when none is left.
+
+        Args:
+            ref (FrameRef): Descriptor of a slot that is in use.
+
+        Raises:
+            ValueError: If the slot is not in use.
+        """
+        with self._condition:
+            if self._refcounts[ref.slot] < 1:
+                raise ValueError(f"Shared frame slot {ref.slot} is not in use.")
+            self._refcounts[ref.slot] -= 1
+            if self._refcounts[ref.slot] == 0:
+                self._free.append(ref.slot)
+                self._condition.notify()
+
+    @property
+    def in_use(self) -> int:
+        """Number of slots holding at least one reference."""
+        with self._condition:
+            return self.slots - len(self._free)
+
+    def close(self) -> None:
+        """Unlink all segments and wake up waiting `acquire` calls with an error."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            segments, self._segments = self._segments, [None] * self.slots
+        for segment in segments:
+            if segment is not None:
+                _close_segment(segment, unlink=True)
+
+    def __enter__(self) -> "SharedFramePool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
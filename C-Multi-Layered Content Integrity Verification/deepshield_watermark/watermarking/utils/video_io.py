@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+
+"""video_io.py: Read and write frame streams as raw RGB/YUV data or image sequences."""
+
+import os
+from typing import BinaryIO, Iterator, Sequence, Union
+
+import numpy as np
+
+from watermarking.utils.image_io import decode_rgb
+
+# Supported raw pixel formats, named as in FFmpeg (`-pix_fmt`)
+PIXEL_FORMATS = ("rgb24", "bgr24", "yuv420p")
+
+# Extensions of the frames read from a directory
+FRAME_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+RawSource = Union[str, os.PathLike, BinaryIO]
+
+
+def _import_cv2():
+    """Import OpenCV on first use; raw RGB streams do not need it."""
+    import cv2  # pylint: disable=import-outside-toplevel
+
+    return cv2
+
+
+def frame_size(width: int, height: int, pixel_format: str = "rgb24") -> int:
+    """Compute the number of bytes of one raw frame.
+
+    Args:
+        width (int): Frame width in pixels.
+        height (int): Frame height in pixels.
+        pixel_format (str, optional): One of `PIXEL_FORMATS`. Defaults to "rgb24".
+
+    Returns:
+        int: Bytes per frame.
+
+    Raises:
+        ValueError: If the pixel format is unknown, or the size is odd for "yuv420p".
+    """
+    if pixel_format in ("rgb24", "bgr24"):
+        return width * height * 3
+    if pixel_format == "yuv420p":
+        if width % 2 or height % 2:
+            raise ValueError(f"yuv420p needs an even frame size, got {width}x{height}.")
+        return width * height * 3 // 2
+    raise ValueError(f"Unknown pixel format '{pixel_format}', expected one of {PIXEL_FORMATS}.")
+
+
+def raw_to_rgb(data: bytes, width: int, height: int, pixel_format: str = "rgb24") -> np.ndarray:
+    """Convert one raw frame into an RGB array.
+
+    Args:
+        data (bytes): The raw frame, `frame_size(width, height, pixel_format)` bytes.
+        width (int): Frame width in pixels.
+        height (int): Frame height in pixels.
+        pixel_format (str, optional): One of `PIXEL_FORMATS`. Defaults to "rgb24".
+
+    Returns:
+        np.ndarray: The frame.
+            Shape: (height, width, 3)
+            Dtype: uint8
+    """
+    pixels = np.frombuffer(data, dtype=np.uint8)
+    if pixel_format == "rgb24":
+        return pixels.reshape(height, width, 3)
+    cv2 = _import_cv2()
+    if pixel_format == "bgr24":
+        return cv2.cvtColor(pixels.reshape(height, width, 3), cv2.COLOR_BGR2RGB)
+    # Planar 4:2:0 (I420): full-size Y plane followed by quarter-size U and V planes
+    return cv2.cvtColor(pixels.reshape(height * 3 // 2, width), cv2.COLOR_YUV2RGB_I420)
+
+
+def rgb_to_raw(frame: np.ndarray, pixel_format: str = "rgb24") -> np.ndarray:
+    """Convert an RGB frame into raw bytes of the given pixel format.
+
+    Args:
+        frame (np.ndarray): The (H, W, 3) uint8 frame.
+        pixel_format (str, optional): One of `PIXEL_FORMATS`. Defaults to "rgb24".
+
+    Returns:
+        np.ndarray: Contiguous uint8 array holding the raw frame.
+    """
+    frame_size(frame.shape[1], frame.shape[0], pixel_format)
+    if pixel_format == "rgb24":
+        return np.ascontiguousarray(frame)
+    cv2 = _import_cv2()
+    if pixel_format == "bgr24":
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    return cv2.cvtColor(frame, cv2.COLOR_RGB2YUV_I420)
+
+
+def read_raw_frames(
+    source: RawSource, width: int, height: int, pixel_format: str = "rgb24"
+) -> Iterator[np.ndarray]:
+    """Read a raw video stream frame by frame, e.g. the output of a capture device or of
+    `ffmpeg -f rawvideo`.
+
+    Args:
+        source (RawSource): Path to the stream, or a binary file object such as `sys.stdin.buffer`.
+        width (int): Frame width in pixels.
+        height (int): Frame height in pixels.
+        pixel_format (str, optional): One of `PIXEL_FORMATS`. Defaults to "rgb24".
+
+    Yields:
+        np.ndarray: The frames as (height, width, 3) uint8 RGB arrays.
+
+    Raises:
+        ValueError: If the stream ends in the middle of a frame.
+    """
+    size = frame_size(width, height, pixel_format)
+    owned = not hasattr(source, "read")
+    # pylint: disable-next=consider-using-with
+    stream = open(source, "rb") if owned else source
+    try:
+        while True:
+            data = stream.read(size)
+            if not data:
+                return
+            if len(data) != size:
+                raise ValueError(f"Truncated frame: got {len(data)} of {size} bytes.")
+            yield raw_to_rgb(data, width, height, pixel_format)
+    finally:
+        if owned:
+            stream.close()
+
+
+class RawFrameWriter:
+    """Write RGB frames to a raw video stream."""
+
+    def __init__(self, target: RawSource, pixel_format: str = "rgb24"):
+        """Open the stream.
+
+        Args:
+            target (RawSource): Path to the output, or a binary file object.
+            pixel_format (str, optional): One of `PIXEL_FORMATS`. Defaults to "rgb24".
+        """
+        frame_size(2, 2, pixel_format)
+        self.pixel_format = pixel_format
+        self._owned = not hasattr(target, "write")
+        # pylint: disable-next=consider-using-with
+        self._stream = open(target, "wb") if self._owned else target
+        self.frames = 0
+
+    def write(self, frame: np.ndarray) -> None:
+        """Append one frame.
+
+        Args:
+            frame (np.ndarray): The (H, W, 3) uint8 RGB frame.
+        """
+        self._stream.write(rgb_to_raw(frame, self.pixel_format).data)
+        self.frames += 1
+
+    def close(self) -> None:
+        """Flush the stream, and close it if it was opened by the writer."""
+        self._stream.flush()
+        if self._owned:
+            self._stream.close()
+
+    def __enter__(self) -> "RawFrameWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class RawFrameReader:
+    """Random access to the frames of a raw video file, reading only the requested frames."""
+
+    def __init__(
+        self, path: Union[str, os.PathLike], width: int, height: int, pixel_format: str = "rgb24"
+    ):
+        """Open the file.
+
+        Args:
+            path (Union[str, os.PathLike]): Path to the raw stream.
+            width (int): Frame width in pixels.
+            height (int): Frame height in pixels.
+            pixel_format (str, optional): One of `PIXEL_FORMATS`. Defaults to "rgb24".
+        """
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.frame_size = frame_size(width, height, pixel_format)
+        # pylint: disable-next=consider-using-with
+        self._stream = open(path, "rb")
+        self._frames = os.fstat(self._stream.fileno()).st_size // self.frame_size
+
+    def __len__(self) -> int:
+        return self._frames
+
+    def read(self, index: int) -> np.ndarray:
+        """Read one frame.
+
+        Args:
+            index (int): Index of the frame.
+
+        Returns:
+            np.ndarray: The frame as a (height, width, 3) uint8 RGB array.
+
+        Raises:
+            IndexError: If the frame does not exist.
+        """
+        if not 0 <= index < self._frames:
+            raise IndexError(f"Frame {index} out of range for {self._frames} frames.")
+        self._stream.seek(index * self.frame_size)
+        data = self._stream.read(self.frame_size)
+        return raw_to_rgb(data, self.width, self.height, self.pixel_format)
+
+    def close(self) -> None:
+        """Close the file."""
+        self._stream.close()
+
+    def __enter__(self) -> "RawFrameReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def list_frame_files(directory: Union[str, os.PathLike]) -> list[str]:
+    """List the image files of a frame-sequence directory in name order.
+
+    Args:
+        directory (Union[str, os.PathLike]): Directory holding one image per frame, named so
+            that they sort in frame order (e.g. `frame_000001.png`).
+
+    Returns:
+        list[str]: Paths of the frames.
+    """
+    names = sorted(
+        name for name in os.listdir(directory) if name.lower().endswith(FRAME_EXTENSIONS)
+    )
+    return [os.path.join(directory, name) for name in names]
+
+
+def read_frame_sequence(
+    frames: Union[str, os.PathLike, Sequence[Union[str, os.PathLike]]],
+) -> Iterator[np.ndarray]:
+    """Decode a sequence of image files frame by frame.
+
+    Args:
+        frames (Union[str, os.PathLike, Sequence[Union[str, os.PathLike]]]): Directory of frames
+            (see `list_frame_files`) or the paths of the frames in order.
+
+    Yields:
+        np.ndarray: The frames as (H, W, 3) uint8 RGB arrays.
+    """
+    if isinstance(frames, (str, os.PathLike)):
+        frames = list_frame_files(frames)
+    for path in frames:
+        yield decode_rgb(path)
+
+
+class FrameSequenceReader:
+    """Random access to the frames of a frame-sequence directory."""
+
+    def __init__(self, frames: Union[str, os.PathLike, Sequence[Union[str, os.PathLike]]]):
+        """List the frames.
+
+        Args:
+            frames (Union[str, os.PathLike, Sequence[Union[str, os.PathLike]]]): Directory of
+                frames (see `list_frame_files`) or the paths of the frames in order.
+        """
+        if isinstance(frames, (str, os.PathLike)):
+            frames = list_frame_files(frames)
+        self.paths = list(frames)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def read(self, index: int) -> np.ndarray:
+        """Decode one frame.
+
+        Args:
+            index (int): Index of the frame.
+
+        Returns:
+            np.ndarray: The frame as a (H, W, 3) uint8 RGB array.
+        """
+        return decode_rgb(self.paths[index])
+
+    def close(self) -> None:
+        """Nothing to release; present for symmetry with `RawFrameReader`."""
+
+    def __enter__(self) -> "FrameSequenceReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class FrameSequenceWriter:
+    """Write RGB frames as numbered image files."""
+
+    def __init__(self, directory: Union[str, os.PathLike], pattern: str = "frame_{:06d}.png"):
+        """Create the output directory.
+
+        Args:
+            directory (Union[str, os.PathLike]): Output directory.
+            pattern (str, optional): File name of each frame, formatted with the frame index.
+                The extension selects the codec. Defaults to "frame_{:06d}.png".
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.pattern = pattern
+        self.frames = 0
+
+    def write(self, frame: np.ndarray) -> None:
+        """Encode and write one frame.
+
+        Args:
+            frame (np.ndarray): The (H, W, 3) uint8 RGB frame.
+
+        Raises:
+            ValueError: If the frame cannot be encoded.
+        """
+        cv2 = _import_cv2()
+        path = os.path.join(self.directory, self.pattern.format(self.frames))
+        if not cv2.imwrite(path, cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)):
+            raise ValueError(f"Could not write frame {path}.")
+        self.frames += 1
+
+    def close(self) -> None:
+        """Nothing to flush; present for symmetry with `RawFrameWriter`."""
+
+    def __enter__(self) -> "FrameSequenceWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
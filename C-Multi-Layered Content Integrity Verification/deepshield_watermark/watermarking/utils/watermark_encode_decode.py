@@ -6,7 +6,64 @@ import numpy as np
 from pywt import dwt2, idwt2
 from scipy.fftpack import dct, idct
 
-from watermarking.utils.zigzag import inverse_zigzag, zig_zag
+from watermarking.utils.zigzag import zigzag_order
+
+
+def ll2_to_diagonals(LL2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Split the level 2 approximation into its two diagonal sequences, in the DCT domain.
+
+    Args:
+        LL2 (np.ndarray): Level 2 approximation coefficients, shape (rows, cols) or
+            (rows, cols, channels).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The even and odd diagonal frequencies, each of shape
+            (length,) or (length, channels).
+    """
+    # Rearrange LL2 coefficients in a zig-zag order to prepare for diagonal splitting
+    rows, cols = LL2.shape[:2]
+    zigzag_1d = LL2.reshape(rows * cols, *LL2.shape[2:])[zigzag_order(rows, cols)]
+
+    # Split zig-zagged sequence into even-indexed and odd-indexed diagonals
+    diag_even = zigzag_1d[1::2]  # elements at odd indices
+    diag_odd = zigzag_1d[0::2]  # elements at even indices
+
+    # Apply Orthogonal 1D Discrete Cosine Transform to both diagonal sets
+    diag_even_freq = dct(diag_even, norm="ortho", axis=0)
+    diag_odd_freq = dct(diag_odd, norm="ortho", axis=0)
+    return diag_even_freq, diag_odd_freq
+
+
+def diagonals_to_ll2(
+    diag_even_freq: np.ndarray, diag_odd_freq: np.ndarray, rows: int, cols: int
+) -> np.ndarray:
+    """Invert `ll2_to_diagonals`.
+
+    Args:
+        diag_even_freq (np.ndarray): Even diagonal frequencies.
+        diag_odd_freq (np.ndarray): Odd diagonal frequencies.
+        rows (int): Number of rows of the level 2 approximation.
+        cols (int): Number of columns of the level 2 approximation.
+
+    Returns:
+        np.ndarray: The level 2 approximation coefficients, shape (rows, cols) or
+            (rows, cols, channels).
+    """
+    channels = diag_even_freq.shape[1:]
+
+    # Inverse DCT on Diagonals
+    diag_even = idct(diag_even_freq, norm="ortho", axis=0)  # Inverse DCT on even freqs
+    diag_odd = idct(diag_odd_freq, norm="ortho", axis=0)  # Inverse DCT on odd freqs
+
+    # Reconstruct 1D Zig-Zag & Inverse Transformation
+    zigzag_1d = np.zeros((rows * cols, *channels), dtype=float)  # Initialize 1D array
+    zigzag_1d[1::2] = diag_even  # Interleave even frequencies
+    zigzag_1d[0::2] = diag_odd  # Interleave odd frequencies
+
+    # Inverse zigzag
+    LL2 = np.zeros((rows * cols, *channels), dtype=float)
+    LL2[zigzag_order(rows, cols)] = zigzag_1d
+    return LL2.reshape(rows, cols, *channels)  # Convert back to 2D
 
 
 def dwt2dct_encode_2d(
@@ -14,6 +71,10 @@ def dwt2dct_encode_2d(
 ) -> tuple[np.ndarray, ...]:  # Tuple containing wavelet coefficients & frequency arrays
     """Encode a 2D image using a multi-step transform process.
 
+    The transforms run along the first two axes, so all channels of a (height, width, channels)
+    image are encoded in one call, exactly as if each channel was encoded on its own. The
+    diagonals then have shape (length, channels).
+
     Args:
         image (np.ndarray): Input image data.
             - Shape: Arbitrary (height, width) or (height, width, channels)
@@ -28,21 +89,12 @@ def dwt2dct_encode_2d(
         ]
     """
     # Perform initial 2D Wavelet Transform (Level 1)
-    LL, (LH, HL, HH) = dwt2(data=image, wavelet="db1", mode="symmetric")
+    LL, (LH, HL, HH) = dwt2(data=image, wavelet="db1", mode="symmetric", axes=(0, 1))
 
     # Further decompose the Approximation Coefficients (LL) with another 2D DWT (Level 2)
-    LL2, (LH2, HL2, HH2) = dwt2(data=LL, wavelet="db1", mode="symmetric")
+    LL2, (LH2, HL2, HH2) = dwt2(data=LL, wavelet="db1", mode="symmetric", axes=(0, 1))
 
-    # Rearrange LL2 coefficients in a zig-zag order to prepare for diagonal splitting
-    zigzag_1d, _ = zig_zag(LL2)
-
-    # Split zig-zagged sequence into even-indexed and odd-indexed diagonals
-    diag_even = zigzag_1d[1::2]  # elements at odd indices
-    diag_odd = zigzag_1d[0::2]  # elements at even indices
-
-    # Apply Orthogonal 1D Discrete Cosine Transform to both diagonal sets
-    diag_even_freq = dct(diag_even, norm="ortho")
-    diag_odd_freq = dct(diag_odd, norm="ortho")
+    diag_even_freq, diag_odd_freq = ll2_to_diagonals(LL2)
 
     # Bundle results across different transformation stages
     return (LL, LH, HL, HH), (LL2, LH2, HL2, HH2), (diag_even_freq, diag_odd_freq)
@@ -61,6 +113,7 @@ def dwt2dct_decode_2d(
         coeffs2: Second set of 2D DWT coefficients (Tuple of 4 ndarrays: LL2, LH2, HL2, HH2)
         diags: Diagonal frequencies after DCT (Even, Odd)
         image_shape: The shape of the original image to resize in case of different shapes
+            (only the height and width are used)
 
     Returns:
         np.ndarray: Decoded watermarked output after IDWT
@@ -71,29 +124,20 @@ def dwt2dct_decode_2d(
     (diag_even_freq, diag_odd_freq) = diags
 
     # Extract dimensions from second level low-pass filter output
-    rows, cols = LL2.shape
-
-    # Inverse DCT on Diagonals
-    diag_even = idct(diag_even_freq, norm="ortho")  # Inverse DCT on even freqs
-    diag_odd = idct(diag_odd_freq, norm="ortho")  # Inverse DCT on odd freqs
-
-    # Reconstruct 1D Zig-Zag & Inverse Transformation
-    zigzag_1d = np.zeros(rows * cols, dtype=float)  # Initialize 1D array
-    zigzag_1d[1::2] = diag_even  # Interleave even frequencies
-    zigzag_1d[0::2] = diag_odd  # Interleave odd frequencies
-
-    # Inverse zigzag
-    LL2_watermarked = inverse_zigzag(zigzag_1d, rows, cols)  # Convert back to 2D
-    if LL2_watermarked.shape != LL2.shape:
-        LL2_watermarked = LL2_watermarked[: LL2.shape[0], : LL2.shape[1]]
+    rows, cols = LL2.shape[:2]
+    LL2_watermarked = diagonals_to_ll2(diag_even_freq, diag_odd_freq, rows, cols)
 
     # Two-Stage Inverse 2D Wavelet Transform
-    LL_watermarked = idwt2((LL2_watermarked, (LH2, HL2, HH2)), wavelet="db1", mode="symmetric")
+    LL_watermarked = idwt2(
+        (LL2_watermarked, (LH2, HL2, HH2)), wavelet="db1", mode="symmetric", axes=(0, 1)
+    )
     if LL_watermarked.shape != LL.shape:
         LL_watermarked = LL_watermarked[: LL.shape[0], : LL.shape[1]]
 
-    output_watermarked = idwt2((LL_watermarked, (LH, HL, HH)), wavelet="db1", mode="symmetric")
-    if output_watermarked.shape != image_shape:
+    output_watermarked = idwt2(
+        (LL_watermarked, (LH, HL, HH)), wavelet="db1", mode="symmetric", axes=(0, 1)
+    )
+    if output_watermarked.shape[:2] != tuple(image_shape[:2]):
         output_watermarked = output_watermarked[: image_shape[0], : image_shape[1]]
 
     return output_watermarked
@@ -2,9 +2,36 @@
 
 """zigzag.py: Perform zigzag and inverse zigzag traversal on a 2D matrix."""
 
+from functools import lru_cache
+
 import numpy as np
 
 
+@lru_cache(maxsize=32)
+def zigzag_order(rows: int, cols: int) -> np.ndarray:
+    """Compute the zigzag traversal order of a matrix as flat (row-major) indices.
+
+    The order only depends on the shape, so it is computed once per shape and shared by every
+    image of that resolution.
+
+    Parameters:
+        rows (int): Number of rows of the matrix.
+        cols (int): Number of columns of the matrix.
+
+    Returns:
+        numpy.ndarray: Read-only array of `rows * cols` flat indices; element `k` is the index of
+            the `k`-th element visited by the traversal.
+    """
+    r, c = np.indices((rows, cols))
+    diagonal = r + c
+    # Even diagonals go bottom-left to top-right (increasing column), odd diagonals go
+    # top-right to bottom-left (increasing row)
+    along = np.where(diagonal % 2 == 0, c, r)
+    order = np.lexsort((along.ravel(), diagonal.ravel()))
+    order.setflags(write=False)
+    return order
+
+
 def zig_zag(mat: np.ndarray) -> np.ndarray:
     """Perform zigzag traversal on a 2D matrix.
 
@@ -21,44 +48,13 @@ def zig_zag(mat: np.ndarray) -> np.ndarray:
         raise ValueError("Input must be a 2-dimensional array.")
 
     rows, cols = mat.shape
-    total_diagonals = rows + cols - 1  # Total number of diagonals
-
-    # Initialize the zigzag list and pattern matrix
-    zigzag_list = []  # List to store elements in zigzag order
-
-    # Matrix to track positions, Counter for tracking the index in zigzag order
-    pattern_matrix, counter = np.zeros((rows, cols)), 0
-
-    for diagonal in range(total_diagonals):
-        # Traverse upwards (bottom-left to top-right)
-        if diagonal % 2 == 0:
-            # Determine the start point of the upward diagonal
-            r = min(diagonal, rows - 1)
-            c = max(0, diagonal - rows + 1)
-
-            # Iterate over the diagonal from bottom-left to top-right
-            while r >= 0 and c < cols:
-                zigzag_list.append(mat[r, c])
-                pattern_matrix[r, c] = counter
-                counter += 1
-                r -= 1
-                c += 1
-        else:
-            # Traverse downwards (top-right to bottom-left)
-            # Determine the start point of the downward diagonal
-            r = max(0, diagonal - cols + 1)
-            c = min(diagonal, cols - 1)
-
-            # Iterate over the diagonal from top-right to bottom-left
-            while r < rows and c >= 0:
-                zigzag_list.append(mat[r, c])
-                pattern_matrix[r, c] = counter
-                counter += 1
-                r += 1
-                c -= 1
-
-    # Convert list to NumPy array
-    zigzag = np.array(zigzag_list, dtype=float)
+    order = zigzag_order(rows, cols)
+
+    zigzag = np.asarray(mat, dtype=float).ravel()[order]
+
+    # Matrix holding the position of every element in the zigzag order
+    pattern_matrix = np.zeros((rows, cols))
+    pattern_matrix.ravel()[order] = np.arange(rows * cols)
     return zigzag, pattern_matrix
 
 
@@ -78,31 +74,5 @@ def inverse_zigzag(input_array: np.ndarray, rows: int, cols: int) -> np.ndarray:
         raise ValueError("Input array size does not match the dimensions of the output matrix.")
 
     output_matrix = np.zeros((rows, cols), dtype=float)
-
-    # Total number of diagonals
-    total_diagonals = rows + cols - 1
-
-    # Pointer for the input array
-    index = 0
-
-    for diag in range(total_diagonals):
-        # Even diagonals move bottom-left to top-right
-        if diag % 2 == 0:
-            r = min(diag, rows - 1)
-            c = max(0, diag - rows + 1)
-            while r >= 0 and c < cols:
-                output_matrix[r, c] = input_array[index]
-                index += 1
-                r -= 1
-                c += 1
-        else:
-            # Odd diagonals move top-right to bottom-left
-            r = max(0, diag - cols + 1)
-            c = min(diag, cols - 1)
-            while r < rows and c >= 0:
-                output_matrix[r, c] = input_array[index]
-                index += 1
-                r += 1
-                c -= 1
-
+    output_matrix.ravel()[zigzag_order(rows, cols)] = input_array
     return output_matrix
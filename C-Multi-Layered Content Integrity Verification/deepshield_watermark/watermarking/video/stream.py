@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+"""stream.py: Watermark frame streams with pipelined decode, embed and encode stages."""
+
+import argparse
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Optional
+
+import numpy as np
+
+from watermarking.generator.sha256 import SHA256WatermarkGenerator
+from watermarking.positions.sha256 import SHA256Positions
+from watermarking.strategies.dwt_dct import DWT2DCTWatermarkMethod, EmbeddingPlan
+from watermarking.utils.key_manager import KeyStore
+from watermarking.utils.preprocess import normalize_array
+from watermarking.utils.video_io import (
+    PIXEL_FORMATS,
+    FrameSequenceWriter,
+    RawFrameWriter,
+    read_frame_sequence,
+    read_raw_frames,
+)
+
+# Marks the end of the stream in the stage queues
+_END = object()
+
+# Seconds between checks for a failed stage while blocked on a queue
+_POLL_SECONDS = 0.1
+
+
+@dataclass
+class StreamStats:
+    """Throughput of one stream.
+
+    Attributes:
+        frames (int): Number of frames written.
+        elapsed_seconds (float): Wall-clock duration of the whole stream.
+        stage_seconds (dict[str, float]): Time each stage spent working, excluding the time it
+            waited on its queues. The stage with the largest value limits the throughput.
+    """
+
+    frames: int = 0
+    elapsed_seconds: float = 0.0
+    stage_seconds: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def fps(self) -> float:
+        """Sustained frames per second over the whole stream."""
+        return self.frames / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the statistics, e.g. for a benchmark report.
+
+        Returns:
+            dict[str, Any]: The statistics, including `fps`.
+        """
+        return {
+            "frames": self.frames,
+            "elapsed_seconds": self.elapsed_seconds,
+            "fps": self.fps,
+            "stage_seconds": dict(self.stage_seconds),
+        }
+
+
+class StreamWatermarker:
+    """Embed one watermark into every frame of a stream.
+
+    Three stages run on their own threads, connected by bounded queues: decode (pulling frames
+    from the source iterable), embed, and encode (converting to uint8 and handing the frame to
+    the writer). While one frame is embedded, the next is decoded and the previous one encoded.
+    The bounded queues keep memory constant for arbitrarily long streams. Frames keep their
+    order, and one embedding plan is reused for all frames of the same resolution.
+    """
+
+    def __init__(
+        self,
+        watermark: np.ndarray,
+        watermark_positions: np.ndarray,
+        alpha: float,
+        method: Optional[DWT2DCTWatermarkMethod] = None,
+        queue_size: int = 4,
+    ):
+        """Initialize the pipeline.
+
+        Args:
+            watermark (np.ndarray): The watermark sequence, shared by all frames.
+            watermark_positions (np.ndarray): Placement indices within the transformed space.
+            alpha (float): Embedding strength.
+            method (Optional[DWT2DCTWatermarkMethod], optional): Watermarking method.
+                Defaults to None (a new `DWT2DCTWatermarkMethod`).
+            queue_size (int, optional): Maximum number of frames waiting between two stages.
+                Defaults to 4.
+        """
+        self.watermark = watermark
+        self.watermark_positions = watermark_positions
+        self.alpha = alpha
+        self.method = method or DWT2DCTWatermarkMethod()
+        self.queue_size = queue_size
+        self._plans: dict[tuple[int, ...], EmbeddingPlan] = {}
+
+    def plan(self, shape: tuple[int, int, int]) -> EmbeddingPlan:
+        """Return the embedding plan of a frame resolution, making it on first use.
+
+        Args:
+            shape (tuple[int, int, int]): Frame shape (H, W, C).
+
+        Returns:
+            EmbeddingPlan: The plan; its `ground_truth_watermark` is needed for verification.
+        """
+        plan = self._plans.get(shape)
+        if plan is None:
+            plan = self.method.make_plan(
+                shape, self.watermark, self.watermark_positions, self.alpha
+            )
+            self._plans[shape] = plan
+        return plan
+
+    def run(self, frames: Iterable[np.ndarray], write: Callable[[np.ndarray], None]) -> StreamStats:
+        """Watermark a stream until the source is exhausted.
+
+        Args:
+            frames (Iterable[np.ndarray]): Source of (H, W, C) frames. It is iterated on the
+                decode thread, so reading and decoding happen there, e.g. `read_raw_frames`.
+            write (Callable[[np.ndarray], None]): Receives each watermarked uint8 frame, in
+                order, on the encode thread, e.g. `RawFrameWriter.write`.
+
+        Returns:
+            StreamStats: Frame count, duration and per-stage busy time.
+
+        Raises:
+            Exception: The first error raised by a stage, after all stages stopped.
+        """
+        decoded: queue.Queue = queue.Queue(self.queue_size)
+        embedded: queue.Queue = queue.Queue(self.queue_size)
+        failed = threading.Event()
+        errors: list[BaseException] = []
+        stats = StreamStats(stage_seconds={"decode": 0.0, "embed": 0.0, "encode": 0.0})
+
+        def put(target: queue.Queue, item: Any) -> bool:
+            while not failed.is_set():
+                try:
+                    target.put(item, timeout=_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(source: queue.Queue) -> Any:
+            while not failed.is_set():
+                try:
+                    return source.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    pass
+            return _END
+
+        def decode() -> None:
+            iterator = iter(frames)
+            while True:
+                start = time.perf_counter()
+                frame = next(iterator, _END)
+                stats.stage_seconds["decode"] += time.perf_counter() - start
+                if not put(decoded, frame) or frame is _END:
+                    return
+
+        def embed() -> None:
+            while (frame := get(decoded)) is not _END:
+                start = time.perf_counter()
+                watermarked = self.method.embed_with_plan(frame, self.plan(frame.shape))
+                stats.stage_seconds["embed"] += time.perf_counter() - start
+                if not put(embedded, watermarked):
+                    return
+            put(embedded, _END)
+
+        def encode() -> None:
+            while (frame := get(embedded)) is not _END:
+                start = time.perf_counter()
+                write(normalize_array(frame))
+                stats.frames += 1
+                stats.stage_seconds["encode"] += time.perf_counter() - start
+
+        def guarded(stage: Callable[[], None]) -> Callable[[], None]:
+            def target() -> None:
+                try:
+                    stage()
+                except BaseException as ex:  # pylint: disable=broad-except
+                    errors.append(ex)
+                    failed.set()
+
+            return target
+
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=guarded(stage), name=f"watermark-{stage.__name__}")
+            for stage in (decode, embed, encode)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats.elapsed_seconds = time.perf_counter() - start
+
+        if errors:
+            raise errors[0]
+        return stats
+
+
+def parse_size(value: str) -> tuple[int, int]:
+    """Parse a frame size given as WIDTHxHEIGHT.
+
+    Args:
+        value (str): The size, e.g. "1920x1080".
+
+    Returns:
+        tuple[int, int]: Width and height.
+    """
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main() -> None:
+    """Watermark a raw stream or a frame directory with keys from a key directory."""
+    parser = argparse.ArgumentParser(description="Watermark a video stream.")
+    parser.add_argument("input", help="Raw stream (with --size) or directory of frames.")
+    parser.add_argument("output", help="Raw stream (with --size) or directory of frames.")
+    parser.add_argument("--size", type=parse_size, help="WIDTHxHEIGHT of a raw stream.")
+    parser.add_argument("--pixel-format", choices=PIXEL_FORMATS, default="rgb24")
+    parser.add_argument("--key-dir", default=None, help="Directory of the RSA key pair.")
+    parser.add_argument("--watermark-length", type=int, default=255)
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument(
+        "--ground-truth", default="ground_truth_watermark.npy", help="Where to save f(I)."
+    )
+    args = parser.parse_args()
+
+    if args.size is not None:
+        frames = read_raw_frames(args.input, *args.size, pixel_format=args.pixel_format)
+        writer = RawFrameWriter(args.output, args.pixel_format)
+    else:
+        frames = read_frame_sequence(args.input)
+        writer = FrameSequenceWriter(args.output)
+
+    # The watermark is the signature of the first frame, shared by the whole stream
+    private_key, public_key = KeyStore(args.key_dir).get_keys()
+    first = next(frames, None)
+    if first is None:
+        raise SystemExit("The input has no frames.")
+    watermark = SHA256WatermarkGenerator().generate(first, private_key, args.watermark_length)
+    positions = SHA256Positions().generate_positions(public_key, args.watermark_length)
+
+    watermarker = StreamWatermarker(watermark, positions, args.alpha, queue_size=args.queue_size)
+
+    def source() -> Iterable[np.ndarray]:
+        yield first
+        yield from frames
+
+    with writer:
+        stats = watermarker.run(source(), writer.write)
+    np.save(args.ground_truth, watermarker.plan(first.shape).ground_truth_watermark)
+    print(
+        f"Watermarked {stats.frames} frames in {stats.elapsed_seconds:.2f}s "
+        f"({stats.fps:.1f} frames/s), busy seconds per stage: {stats.stage_seconds}"
+    )
+
+
+if __name__ == "__main__":
+    main()